@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api import documents, chat, forms, transcribe, auth
+from app.api import documents, chat, forms, transcribe, auth, uploads
 
 api_router = APIRouter()
 
@@ -8,3 +8,4 @@ api_router.include_router(documents.router, prefix="/documents", tags=["document
 api_router.include_router(chat.router, prefix="/chat", tags=["chat"])
 api_router.include_router(transcribe.router, prefix="/transcribe", tags=["transcribe"])
 api_router.include_router(forms.router, prefix="/forms", tags=["forms"])
+api_router.include_router(uploads.router, prefix="/uploads", tags=["uploads"])
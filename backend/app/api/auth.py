@@ -1,24 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Body
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
+import hmac
 import uuid
 
 from app.api import deps
 from app.core import security, config
+from app.core.password_hasher import password_hasher, HashingOverloaded
 from app.models import models
 from app.schemas import auth as schemas
+from app.core.metrics import metrics
+from app.services.token_service import token_service
 
 router = APIRouter()
 settings = config.get_settings()
 
+
+def _busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Too many logins right now, please retry", headers={"Retry-After": "1"})
+
+
 @router.post("/register", response_model=schemas.UserResponse)
-def register_user(
+async def register_user(
     *,
-    db: Session = Depends(deps.get_db),
+    db: AsyncSession = Depends(deps.get_db),
     user_in: schemas.UserCreate
 ):
-    user = db.query(models.User).filter(models.User.email == user_in.email).first()
+    result = await db.execute(select(models.User).where(models.User.email == user_in.email))
+    user = result.scalars().first()
     if user:
         raise HTTPException(
             status_code=400,
@@ -26,20 +38,33 @@ def register_user(
         )
     if user_in.password != user_in.confirm_password:
         raise HTTPException(status_code=400, detail="Passwords do not match")
-        
+
+    # bcrypt is CPU bound - hash on the dedicated hashing pool, not on the event loop
+    try:
+        password_hash = await password_hasher.hash(user_in.password)
+    except HashingOverloaded:
+        raise _busy()
     user = models.User(
         email=user_in.email,
         full_name=user_in.full_name,
-        password_hash=security.get_password_hash(user_in.password),
+        password_hash=password_hash,
         disability_type=user_in.disability_type,
         accessibility_preferences=user_in.accessibility_preferences,
         biometric_registered=user_in.biometric_registered,
         face_id_registered=user_in.face_id_registered,
-        face_id_data=user_in.face_id_data # Save the unique token
+        # Only the digest of the unique token is stored (indexed for 1:N identification)
+        face_id_digest=security.face_signature_digest(user_in.face_id_data) if user_in.face_id_data else None
     )
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        if "ix_users_face_id_digest" not in str(e.orig):
+            raise
+        # Another account already owns this device token
+        raise HTTPException(status_code=400, detail="This biometric signature is already registered.")
+    await db.refresh(user)
     
     # Mock Email Verification
     verification_token = str(uuid.uuid4())
@@ -53,51 +78,75 @@ def register_user(
     return user
 
 @router.post("/login", response_model=schemas.Token)
-def login_access_token(
-    db: Session = Depends(deps.get_db),
+async def login_access_token(
+    db: AsyncSession = Depends(deps.get_db),
     form_data: schemas.UserLogin = Body(...) # Allow JSON body instead of Form data for accessibility/flexibility
 ):
-    user = db.query(models.User).filter(models.User.email == form_data.email).first()
-    if not user or not security.verify_password(form_data.password, user.password_hash):
+    result = await db.execute(select(models.User).where(models.User.email == form_data.email))
+    user = result.scalars().first()
+    if not user:
+        raise HTTPException(status_code=400, detail="Incorrect email or password")
+    try:
+        valid, new_hash = await password_hasher.verify_and_update(form_data.password, user.password_hash)
+    except HashingOverloaded:
+        raise _busy()
+    if not valid:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
 
+    if new_hash:
+        # Stored hash uses another PASSWORD_BCRYPT_ROUNDS - upgrade it while we have the password
+        user.password_hash = new_hash
+        await db.commit()
+        metrics.increment("password_hasher.rehashed")
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
         subject=user.id, expires_delta=access_token_expires
     )
+    refresh_token = await token_service.issue(db, user.id, method="password")
     
     # Return user data with token for frontend state
     return {
         "access_token": access_token,
         "token_type": "bearer",
         "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": refresh_token,
+        "refresh_expires_in": token_service.expires_in,
         "user": user
     }
 
 @router.post("/login/biometric", response_model=schemas.Token)
-def biometric_login(
-    db: Session = Depends(deps.get_db),
+async def biometric_login(
+    db: AsyncSession = Depends(deps.get_db),
     biometric_data: schemas.BiometricLogin = Body(...)
 ):
     """
     Authenticate using Face ID / Biometric signature.
     In a real system, this would verify a signed challenge from WebAuthn or FaceIO.
-    For this prototype, we simulate verification using a stored 'face_id_data' match.
+    For this prototype, we simulate verification using a stored signature match; signatures
+    are compared and looked up by their SHA-256 digest (unique index), so 1:N identification
+    is one index probe however many users there are.
     """
-    
+    digest = security.face_signature_digest(biometric_data.face_signature)
+
     # 2. Find User
     user = None
     if biometric_data.email:
         # 1:1 Verification (User claims identity)
-        user = db.query(models.User).filter(models.User.email == biometric_data.email).first()
+        result = await db.execute(select(models.User).where(models.User.email == biometric_data.email))
+        user = result.scalars().first()
         if not user or not user.face_id_registered:
              raise HTTPException(status_code=400, detail="Biometric auth not set up for this user")
          
+        # No signature on file (e.g. a duplicate left without a digest by migration 0007): nothing to verify against
+        if not user.face_id_digest:
+             raise HTTPException(status_code=401, detail="Biometric signature not on file. Please register this device again.")
+
         # Additional check: does the token match?
-        if user.face_id_data and user.face_id_data != biometric_data.face_signature:
+        if not hmac.compare_digest(user.face_id_digest, digest):
              # In a real system we would verify the signature, handled here by simple equality check
               if biometric_data.face_signature != "valid_signature_mock": # Backward compat for older tests
                   raise HTTPException(status_code=401, detail="Biometric mismatch")
@@ -105,12 +154,17 @@ def biometric_login(
     else:
         # 1:N Identification (System finds identity)
         # We search for the user who owns this specific 'face_signature' (token).
-        user = db.query(models.User).filter(models.User.face_id_data == biometric_data.face_signature).first()
+        result = await db.execute(
+            select(models.User).where(models.User.face_id_digest == digest)
+        )
+        user = result.scalars().first()
         
         # Fallback for old tests/mocking: if generic mock signature is sent, pick first biometric user
-        # (This allows us to keep simple tests running if needed, or we can enforce strictness)
+        # (This allows us to keep simple tests running if needed, or we can enforce strictness).
+        # Served by the partial index ix_users_face_id_registered, so it does not scan users either.
         if not user and biometric_data.face_signature == "valid_signature_mock":
-            user = db.query(models.User).filter(models.User.face_id_registered == True).first()
+            result = await db.execute(select(models.User).where(models.User.face_id_registered == True).limit(1))
+            user = result.scalars().first()
 
         if not user:
             raise HTTPException(status_code=400, detail="Biometric Identity Not Found. Please register this device.")
@@ -120,14 +174,47 @@ def biometric_login(
     access_token = security.create_access_token(
         subject=user.id, expires_delta=access_token_expires
     )
+    refresh_token = await token_service.issue(db, user.id, method="biometric")
     
     return {
         "access_token": access_token,
         "token_type": "bearer",
         "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": refresh_token,
+        "refresh_expires_in": token_service.expires_in,
         "user": user
     }
 
+@router.post("/refresh", response_model=schemas.RefreshedToken)
+async def refresh_access_token(
+    db: AsyncSession = Depends(deps.get_db),
+    data: schemas.RefreshRequest = Body(...)
+):
+    """
+    Exchange a refresh token for a new access token and a new refresh token.
+    The presented refresh token is spent; presenting it again revokes the session.
+    """
+    user_id, refresh_token = await token_service.rotate(db, data.refresh_token)
+    access_token = security.create_access_token(
+        subject=user_id, expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "expires_in": settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "refresh_token": refresh_token,
+        "refresh_expires_in": token_service.expires_in,
+    }
+
+@router.post("/logout")
+async def logout(
+    db: AsyncSession = Depends(deps.get_db),
+    data: schemas.RefreshRequest = Body(...)
+):
+    """Revoke the refresh token (and every token rotated from the same login)."""
+    await token_service.revoke(db, data.refresh_token)
+    return {"success": True}
+
 @router.get("/me", response_model=schemas.UserResponse)
 def read_users_me(
     current_user: models.User = Depends(deps.get_current_user),
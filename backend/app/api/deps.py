@@ -1,13 +1,16 @@
-from typing import Generator
+from typing import AsyncGenerator
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
-from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import AsyncSessionLocal
+from app.db.replica import replica_router, current_user_id
 from app.core import config, security
 from app.models import models
 from app.schemas import auth
+from app.services.principal_cache import Principal, principal_cache
 import json
 import base64
 
@@ -15,18 +18,12 @@ settings = config.get_settings()
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-def get_db() -> Generator:
-    db = SessionLocal()
-    try:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-async def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> models.User:
+def _token_user_id(token: str) -> str:
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
@@ -37,10 +34,59 @@ async def get_current_user(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    
-    user = db.query(models.User).filter(models.User.id == token_data.id).first()
+    return token_data.id
+
+
+def _check_active(user) -> None:
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    current_user_id.set(str(user.id))
+
+
+async def get_current_principal(
+    db: AsyncSession = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+) -> Principal:
+    """
+    The authenticated user as a lightweight Principal (id / is_active / full_name / email),
+    served from the principal cache when possible - use this unless the endpoint needs
+    the full users row.
+    """
+    user_id = _token_user_id(token)
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        row = (await db.execute(
+            select(models.User.id, models.User.is_active, models.User.full_name, models.User.email)
+            .where(models.User.id == user_id)
+        )).first()
+        if row:
+            principal = Principal(*row)
+            principal_cache.put(principal)
+    _check_active(principal)
+    return principal
+
+
+async def get_current_user(
+    db: AsyncSession = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+) -> models.User:
+    """The authenticated user's full users row (face_id_data, preferences, ...)."""
+    user_id = _token_user_id(token)
+    result = await db.execute(select(models.User).where(models.User.id == user_id))
+    user = result.scalars().first()
+    _check_active(user)
     return user
+
+
+async def get_read_db(
+    current_user: Principal = Depends(get_current_principal)
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for read-only endpoints: the read replica when one is configured and
+    fresh enough, the primary otherwise (see app/db/replica.py).
+    Never write through this session.
+    """
+    async with replica_router.session_factory(current_user.id)() as db:
+        yield db
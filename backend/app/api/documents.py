@@ -1,83 +1,179 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Body
-from typing import List
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Body, Header, BackgroundTasks, Query
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
 from app.services.document_service import document_service
 from app.services.rag_service import rag_service  # Re-enabled for search/simplify
-from app.schemas.document import Document as DocumentSchema, SearchResult
-from app.models.models import User  # Removed Document - it was conflicting with DocumentSchema
+from app.services.chat_memory import chat_memory
+from app.schemas.document import Document as DocumentSchema, DocumentPages, SearchResult
+from app.services.principal_cache import Principal
+from app.services.upload_validation import DOCUMENT_EXTENSIONS
+from app.core.config import settings
+from app.core.deadline import Deadline
 
 router = APIRouter()
 
 @router.post("/")  # Removed response_model to bypass validation issues
 async def upload_document(
     file: UploadFile = File(...),
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_principal)
 ):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file uploaded")
     
     # Check file type
-    if not file.filename.lower().endswith(('.pdf', '.txt')):
+    if not file.filename.lower().endswith(DOCUMENT_EXTENSIONS):
         raise HTTPException(status_code=400, detail="Only PDF and TXT files are supported")
 
     return await document_service.upload_document(db, file, current_user.id)
 
+@router.post("/batch")
+async def upload_batch(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_principal)
+):
+    """
+    Upload many documents at once: several PDF / TXT files, or a single .zip of them.
+    Files are validated and stored now; ingestion runs in the background with bounded
+    parallelism. Poll GET /documents/batches/{id} for progress.
+    """
+    rejected, unpacked = [], []
+    if len(files) == 1 and files[0].filename and files[0].filename.lower().endswith(".zip"):
+        unpacked, rejected = await document_service.unpack_zip(files[0])
+        files = unpacked
+    if len(files) + len(rejected) > settings.BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"Too many files (max {settings.BATCH_MAX_FILES})")
+    try:
+        batch, pending = await document_service.upload_batch(db, files, current_user.id, rejected)
+    finally:
+        for file in unpacked:
+            await file.close()
+    background_tasks.add_task(document_service.ingest_batch, pending)
+    return batch
+
+@router.get("/batches/{batch_id}")
+async def get_batch(
+    batch_id: str,
+    db: AsyncSession = Depends(deps.get_db),  # Primary: progress read from a lagging replica would stall
+    current_user: Principal = Depends(deps.get_current_principal)
+):
+    """
+    Progress of a batch upload: document counts by status, per-document status, rejected files.
+    """
+    batch = await document_service.get_batch(db, batch_id, current_user.id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
 @router.get("/", response_model=List[DocumentSchema])
 async def get_documents(
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    db: AsyncSession = Depends(deps.get_read_db),
+    current_user: Principal = Depends(deps.get_current_principal)
 ):
     return await document_service.get_documents(db, current_user.id)
 
 @router.get("/{doc_id}", response_model=DocumentSchema)
 async def get_document(
     doc_id: str,
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    include_text: bool = False,
+    db: AsyncSession = Depends(deps.get_read_db),
+    current_user: Principal = Depends(deps.get_current_principal)
 ):
-    doc = await document_service.get_document(db, doc_id, current_user.id)
+    """
+    Document metadata. The full extracted text (content_text) is only included with
+    ?include_text=true; readers load it by page range from /{doc_id}/pages.
+    """
+    doc = await document_service.get_document(db, doc_id, current_user.id, include_text=include_text)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     return doc
 
+@router.get("/{doc_id}/pages", response_model=DocumentPages)
+async def get_document_pages(
+    doc_id: str,
+    from_: int = Query(1, alias="from", ge=1),
+    to: Optional[int] = Query(None, ge=1),
+    db: AsyncSession = Depends(deps.get_read_db),
+    current_user: Principal = Depends(deps.get_current_principal)
+):
+    """
+    Text of pages from..to (1-based, inclusive). At most DOCUMENT_PAGES_MAX_RANGE pages
+    are returned per request; "to" in the response is the last one sent.
+    """
+    pages = await document_service.get_pages(db, doc_id, current_user.id, from_, to)
+    if not pages:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return pages
+
+@router.delete("/{doc_id}")
+async def delete_document(
+    doc_id: str,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_principal)
+):
+    """
+    Delete a document with its chunks and chat history. The stored file is removed
+    once no other document shares its content.
+    """
+    if not await document_service.delete_document(db, doc_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"success": True}
+
 # --- RAG Endpoints ---
 
 @router.post("/search", response_model=List[SearchResult])
 async def search_documents(
     query: str = Body(..., embed=True),
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    db: AsyncSession = Depends(deps.get_read_db),
+    current_user: Principal = Depends(deps.get_current_principal)
 ):
     """
     Semantic search across all user documents.
     """
-    # Ideally filter search by user_id inside rag_service too
-    return await rag_service.search(db, query)
+    return await rag_service.search(db, query, owner_id=current_user.id)
 
 @router.post("/{doc_id}/chat")
 async def chat_document(
     doc_id: str,
     query: str = Body(..., embed=True),
-    db: Session = Depends(deps.get_db),
-    current_user: User = Depends(deps.get_current_user)
+    x_request_timeout: str | None = Header(None),
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_principal)
 ):
     """
     Chat with a specific document using RAG + LLM.
+    Runs within CHAT_LATENCY_BUDGET_SECONDS (clients may ask for less via X-Request-Timeout);
+    on overrun the answer is built from the retrieved passages and "degraded" is true.
     """
+    deadline = Deadline.from_header(x_request_timeout, settings.CHAT_LATENCY_BUDGET_SECONDS, name="chat")
+
     # Verify doc access (basic check)
     doc = await document_service.get_document(db, doc_id, current_user.id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
         
-    response = await rag_service.chat(db, doc_id, query)
-    return {"answer": response}
+    # {"answer": ..., "cached": bool} - "cached" marks semantic answer cache hits
+    return await rag_service.chat(db, doc_id, query, user_id=current_user.id, deadline=deadline)
+
+@router.delete("/{doc_id}/chat")
+async def clear_chat_history(
+    doc_id: str,
+    db: AsyncSession = Depends(deps.get_db),
+    current_user: Principal = Depends(deps.get_current_principal)
+):
+    """
+    Forget the server-side conversation for this document.
+    """
+    cleared = await chat_memory.clear(db, current_user.id, doc_id)
+    return {"success": True, "cleared": cleared}
 
 @router.post("/simplify")
 async def simplify_text(
     text: str = Body(..., embed=True),
-    current_user: User = Depends(deps.get_current_user) # Authentication required
+    current_user: Principal = Depends(deps.get_current_principal) # Authentication required
 ):
     """
     Simplify complex text using GPT-4o.
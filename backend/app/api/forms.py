@@ -1,11 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, List, Any
 from pydantic import BaseModel
 
 from app.services.form_service import form_service
-from app.api.deps import get_db, get_current_user
-from app.models.models import User
+from app.api.deps import get_db, get_current_principal
+from app.services.principal_cache import Principal
 
 router = APIRouter()
 
@@ -30,7 +30,7 @@ class ChatSessionRequest(BaseModel):
 @router.post("/chat-session")
 async def chat_session(
     request: ChatSessionRequest,
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Handles conversational form filling logic.
@@ -45,8 +45,8 @@ async def chat_session(
 @router.post("/autofill")
 async def autofill_form(
     request: AutoFillRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Intelligently auto-fills a form based on the user's profile and context using AI.
@@ -61,8 +61,8 @@ async def autofill_form(
 @router.post("/submit")
 async def submit_form(
     request: SubmitFormRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
 ):
     """
     Saves the form submission to the database.
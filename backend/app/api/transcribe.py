@@ -1,18 +1,24 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import os
 import uuid
 import shutil
 from pydantic import BaseModel
 
-from app.api.deps import get_db, get_current_user
-from app.models.models import Transcription, User
+from app.api.deps import get_db, get_read_db, get_current_principal
+from app.db.session import SessionLocal
+from app.models.models import Transcription
+from app.services.principal_cache import Principal
 from app.services.transcription_service import TranscriptionService
 
 router = APIRouter()
 transcription_service = TranscriptionService()
 
+ALLOWED_AUDIO_EXTENSIONS = [".mp3", ".wav", ".mp4", ".m4a", ".webm", ".mpeg", ".mpga"]
+AUDIO_UPLOAD_DIR = "uploads/audio"
+
 
 # Response Models
 class TranscriptionResponse(BaseModel):
@@ -49,10 +55,14 @@ def process_transcription_task(
     transcription_id: str,
     user_id: str,
     audio_file_path: str,
-    title: str,
-    db: Session
+    title: str
 ):
-    """Background task to process transcription asynchronously."""
+    """
+    Background task to process transcription asynchronously.
+    Runs in the threadpool with its own synchronous session - the request's
+    AsyncSession is closed by the time background tasks run.
+    """
+    db = SessionLocal()
     try:
         print(f"Starting background processing for transcription {transcription_id}")
         
@@ -74,6 +84,54 @@ def process_transcription_task(
             transcription.processed = False
             transcription.summary = f"Processing failed: {str(e)}"
             db.commit()
+    finally:
+        db.close()
+
+
+async def start_transcription(
+    db: AsyncSession,
+    background_tasks: BackgroundTasks,
+    user_id: uuid.UUID,
+    file_path: str,
+    title: str
+) -> UploadResponse:
+    """
+    Creates the transcription record for an audio file saved under uploads/audio and
+    queues its processing. Shared by /upload and resumable uploads (app/api/uploads.py).
+    """
+    # Create initial database record
+    transcription_id = str(uuid.uuid4())
+    transcription = Transcription(
+        id=transcription_id,
+        user_id=user_id,
+        title=title,
+        audio_file_path=file_path,
+        transcript_text="Processing...",
+        segments=[],
+        summary=None,
+        action_items=[],
+        key_concepts=[],
+        sentiment_score=None,
+        processed=False
+    )
+    
+    db.add(transcription)
+    await db.commit()
+    
+    # Trigger background processing
+    background_tasks.add_task(
+        process_transcription_task,
+        transcription_id,
+        str(user_id),
+        file_path,
+        title
+    )
+    
+    return UploadResponse(
+        id=transcription_id,
+        message="File uploaded successfully. Processing in background.",
+        status="processing"
+    )
 
 
 @router.post("/upload", response_model=UploadResponse)
@@ -81,8 +139,8 @@ async def upload_audio(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: str | None = None,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Upload an audio file for transcription.
@@ -93,65 +151,27 @@ async def upload_audio(
     """
     try:
         # Validate file type
-        allowed_extensions = [".mp3", ".wav", ".mp4", ".m4a", ".webm", ".mpeg", ".mpga"]
         file_ext = os.path.splitext(file.filename)[1].lower()
         
-        if file_ext not in allowed_extensions:
+        if file_ext not in ALLOWED_AUDIO_EXTENSIONS:
             raise HTTPException(
                 status_code=400,
-                detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
+                detail=f"Invalid file type. Allowed: {', '.join(ALLOWED_AUDIO_EXTENSIONS)}"
             )
         
         # Create uploads/audio directory if it doesn't exist
-        upload_dir = "uploads/audio"
-        os.makedirs(upload_dir, exist_ok=True)
+        os.makedirs(AUDIO_UPLOAD_DIR, exist_ok=True)
         
         # Generate unique filename
         file_id = str(uuid.uuid4())
-        file_path = os.path.join(upload_dir, f"{file_id}{file_ext}")
+        file_path = os.path.join(AUDIO_UPLOAD_DIR, f"{file_id}{file_ext}")
         
         # Save file
         with open(file_path, "wb") as buffer:
             shutil.copyfileobj(file.file, buffer)
         
         # Use filename as title if not provided
-        if not title:
-            title = file.filename
-        
-        # Create initial database record
-        transcription_id = str(uuid.uuid4())
-        transcription = Transcription(
-            id=transcription_id,
-            user_id=current_user.id,
-            title=title,
-            audio_file_path=file_path,
-            transcript_text="Processing...",
-            segments=[],
-            summary=None,
-            action_items=[],
-            key_concepts=[],
-            sentiment_score=None,
-            processed=False
-        )
-        
-        db.add(transcription)
-        db.commit()
-        
-        # Trigger background processing
-        background_tasks.add_task(
-            process_transcription_task,
-            transcription_id,
-            str(current_user.id),
-            file_path,
-            title,
-            db
-        )
-        
-        return UploadResponse(
-            id=transcription_id,
-            message="File uploaded successfully. Processing in background.",
-            status="processing"
-        )
+        return await start_transcription(db, background_tasks, current_user.id, file_path, title or file.filename)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
@@ -161,8 +181,8 @@ async def upload_audio(
 async def transcribe_url(
     request: URLRequest,
     background_tasks: BackgroundTasks,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Provide a video URL for transcription.
@@ -195,7 +215,7 @@ async def transcribe_url(
         )
         
         db.add(transcription)
-        db.commit()
+        await db.commit()
         
         # Trigger background processing
         background_tasks.add_task(
@@ -203,8 +223,7 @@ async def transcribe_url(
             transcription_id,
             str(current_user.id),
             request.url,
-            title,
-            db
+            title
         )
         
         return UploadResponse(
@@ -219,13 +238,16 @@ async def transcribe_url(
 
 @router.get("/list", response_model=List[TranscriptionResponse])
 async def list_transcriptions(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """List all transcriptions for the current user."""
-    transcriptions = db.query(Transcription).filter(
-        Transcription.user_id == current_user.id
-    ).order_by(Transcription.created_at.desc()).all()
+    result = await db.execute(
+        select(Transcription).where(
+            Transcription.user_id == current_user.id
+        ).order_by(Transcription.created_at.desc())
+    )
+    transcriptions = result.scalars().all()
     
     return [
         TranscriptionResponse(
@@ -249,14 +271,17 @@ async def list_transcriptions(
 @router.get("/{transcription_id}", response_model=TranscriptionResponse)
 async def get_transcription(
     transcription_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Retrieve a specific transcription by ID."""
-    transcription = db.query(Transcription).filter(
-        Transcription.id == transcription_id,
-        Transcription.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(Transcription).where(
+            Transcription.id == transcription_id,
+            Transcription.user_id == current_user.id
+        )
+    )
+    transcription = result.scalars().first()
     
     if not transcription:
         raise HTTPException(status_code=404, detail="Transcription not found")
@@ -281,8 +306,8 @@ async def get_transcription(
 async def analyze_text(
     text: str,
     title: str = "Browser Transcription",
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Analyze already-transcribed text (from browser Web Speech API).
@@ -329,8 +354,8 @@ async def analyze_text(
         )
         
         db.add(transcription)
-        db.commit()
-        db.refresh(transcription)
+        await db.commit()
+        await db.refresh(transcription)
         
         return TranscriptionResponse(
             id=str(transcription.id),
@@ -353,14 +378,17 @@ async def analyze_text(
 @router.delete("/{transcription_id}")
 async def delete_transcription(
     transcription_id: str,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete a transcription and its associated audio file."""
-    transcription = db.query(Transcription).filter(
-        Transcription.id == transcription_id,
-        Transcription.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(Transcription).where(
+            Transcription.id == transcription_id,
+            Transcription.user_id == current_user.id
+        )
+    )
+    transcription = result.scalars().first()
     
     if not transcription:
         raise HTTPException(status_code=404, detail="Transcription not found")
@@ -373,7 +401,7 @@ async def delete_transcription(
             print(f"Warning: Could not delete audio file: {str(e)}")
     
     # Delete database record
-    db.delete(transcription)
-    db.commit()
+    await db.delete(transcription)
+    await db.commit()
     
     return {"message": "Transcription deleted successfully"}
@@ -0,0 +1,125 @@
+import os
+import shutil
+import uuid
+from typing import Literal
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Request
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+
+from app.api.deps import get_db, get_current_principal
+from app.api.transcribe import ALLOWED_AUDIO_EXTENSIONS, AUDIO_UPLOAD_DIR, start_transcription
+from app.services.document_service import document_service
+from app.services.principal_cache import Principal
+from app.services.storage import DiskUploadFile
+from app.services.upload_sessions import UploadSession, upload_sessions
+from app.services.upload_validation import DOCUMENT_EXTENSIONS, upload_validator
+
+router = APIRouter()
+
+# --- Request Schemas ---
+
+class CreateUploadRequest(BaseModel):
+    filename: str
+    size: int
+    target: Literal["document", "transcription"]
+    title: str | None = None
+
+class CompleteUploadRequest(BaseModel):
+    sha256: str | None = None  # Of the whole file; checked when given
+
+# --- Endpoints ---
+
+def _session(upload_id: str, current_user: Principal) -> UploadSession:
+    session = upload_sessions.get(upload_id, current_user.id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+@router.post("/")
+async def create_upload(
+    request: CreateUploadRequest,
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Start a resumable upload. Then PUT the file in `chunk_size` pieces, in any order:
+    Content-Range: bytes <start>-<end>/<size> and X-Chunk-SHA256: <hex sha256 of the piece>.
+    """
+    allowed = DOCUMENT_EXTENSIONS if request.target == "document" else tuple(ALLOWED_AUDIO_EXTENSIONS)
+    if not request.filename.lower().endswith(allowed):
+        raise HTTPException(status_code=400, detail=f"Invalid file type. Allowed: {', '.join(allowed)}")
+    if request.target == "document":
+        upload_validator.check_size(request.size)
+    session = upload_sessions.create(current_user.id, request.filename, request.size, request.target, request.title)
+    return session.status()
+
+@router.get("/{upload_id}")
+async def get_upload(
+    upload_id: str,
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Progress of an upload; after a dropped connection, re-send the chunks listed in "missing".
+    """
+    return _session(upload_id, current_user).status()
+
+@router.put("/{upload_id}")
+async def put_chunk(
+    upload_id: str,
+    request: Request,
+    content_range: str | None = Header(None),
+    x_chunk_sha256: str | None = Header(None),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Store one chunk. The body is streamed to disk; the chunk counts as received once
+    its SHA-256 matches. Re-sending a chunk replaces it.
+    """
+    session = _session(upload_id, current_user)
+    return await upload_sessions.write_chunk(session, content_range, x_chunk_sha256, request.stream())
+
+@router.post("/{upload_id}/complete")
+async def complete_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    request: CompleteUploadRequest | None = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Assemble the upload and hand it to its pipeline: returns what POST /documents/ or
+    POST /transcribe/upload would. If this fails the upload is kept and can be completed again.
+    """
+    session = _session(upload_id, current_user)
+    filename, title = session.meta["filename"], session.meta["title"]
+    async with upload_sessions.finalizing(session, request.sha256 if request else None) as path:
+        if session.meta["target"] == "document":
+            file = DiskUploadFile(await run_in_threadpool(open, path, "rb"), size=session.size, filename=filename,
+                                  headers=Headers({"content-type": "application/octet-stream"}))
+            try:
+                return await document_service.upload_document(db, file, current_user.id)
+            finally:
+                await file.close()
+
+        # Transcription: the assembled file becomes the stored audio file
+        os.makedirs(AUDIO_UPLOAD_DIR, exist_ok=True)
+        file_path = os.path.join(AUDIO_UPLOAD_DIR, f"{uuid.uuid4()}{os.path.splitext(filename)[1].lower()}")
+        shutil.move(path, file_path)
+        try:
+            return await start_transcription(db, background_tasks, current_user.id, file_path, title or filename)
+        except BaseException:
+            shutil.move(file_path, path)  # Keep the upload for another attempt
+            raise
+
+@router.delete("/{upload_id}")
+async def abort_upload(
+    upload_id: str,
+    current_user: Principal = Depends(get_current_principal)
+):
+    """
+    Abandon an upload and free its disk space.
+    """
+    upload_sessions.discard(_session(upload_id, current_user))
+    return {"success": True}
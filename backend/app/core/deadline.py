@@ -0,0 +1,70 @@
+"""
+Request deadlines - a latency budget carried through a request's stages.
+
+Each stage runs with whatever budget is left; a stage that would overrun is
+cancelled, counted under "<name>.deadline_overruns.<stage>" and surfaced as
+DeadlineExceeded so the caller can degrade instead of hanging.
+"""
+import asyncio
+import time
+from typing import Awaitable, Optional, TypeVar
+
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        super().__init__(f"Latency budget exceeded during '{stage}'")
+        self.stage = stage
+
+
+class Deadline:
+    def __init__(self, budget_seconds: float, name: str = "request"):
+        self.name = name
+        self.budget_seconds = budget_seconds
+        self.started_at = time.monotonic()
+        self.expires_at = self.started_at + budget_seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    async def run(self, stage: str, awaitable: Awaitable[T], fraction: float = 1.0) -> T:
+        """
+        Await a stage within the remaining budget (or a fraction of it, to keep
+        time in hand for later stages).
+        """
+        timeout = self.remaining() * fraction
+        stage_started = time.monotonic()
+        try:
+            if timeout <= 0:
+                raise asyncio.TimeoutError()
+            return await asyncio.wait_for(awaitable, timeout=timeout)
+        except asyncio.TimeoutError:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()  # Never started because the budget was already spent
+            metrics.increment(f"{self.name}.deadline_overruns.{stage}")
+            raise DeadlineExceeded(stage)
+        finally:
+            metrics.observe(f"{self.name}.stage.{stage}", time.monotonic() - stage_started)
+
+    @classmethod
+    def from_header(cls, header_value: Optional[str], default_seconds: float, name: str = "request") -> "Deadline":
+        """
+        Clients may ask for a tighter budget via a header (seconds); they can never extend the default.
+        """
+        budget = default_seconds
+        if header_value:
+            try:
+                budget = min(default_seconds, max(0.1, float(header_value)))
+            except ValueError:
+                pass
+        return cls(budget, name=name)
@@ -0,0 +1,101 @@
+"""
+Dedicated, bounded executor for bcrypt.
+
+bcrypt is deliberately slow CPU work (~250 ms at cost 12). Run through
+run_in_threadpool it competes with every sync route and file operation for
+the shared AnyIO threadpool; during a login storm it can starve them all.
+Hashing gets its own PASSWORD_HASH_WORKERS threads instead (bcrypt releases
+the GIL, so they use separate cores), and at most PASSWORD_HASH_MAX_QUEUE
+jobs may wait for one - beyond that callers get HashingOverloaded (503)
+rather than an ever-growing queue of requests that will time out anyway.
+
+Queue depth, wait and hash times are on /metrics ("password_hasher").
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from app.core import security
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class HashingOverloaded(Exception):
+    """Too many password hash / verify jobs are already queued."""
+
+
+class PasswordHasher:
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._running = 0
+        self._queued = 0
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._queued >= self.max_queue:
+                metrics.increment("password_hasher.rejected")
+                raise HashingOverloaded()
+            self._queued += 1
+            queued = self._queued
+        metrics.set_gauge("password_hasher.queue_depth", queued)
+
+    def _run(self, fn, args, submitted: float):
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            queued = self._queued
+        metrics.set_gauge("password_hasher.queue_depth", queued)
+        metrics.observe("password_hasher.wait", time.perf_counter() - submitted)
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            metrics.observe("password_hasher.hash", time.perf_counter() - started)
+            with self._lock:
+                self._running -= 1
+
+    def _release_cancelled(self, future) -> None:
+        """A job cancelled while still queued (its caller went away) never reaches _run."""
+        if not future.cancelled():
+            return
+        with self._lock:
+            self._queued -= 1
+            queued = self._queued
+        metrics.set_gauge("password_hasher.queue_depth", queued)
+        metrics.increment("password_hasher.cancelled")
+
+    async def _submit(self, fn, *args):
+        self._admit()
+        future = self._executor.submit(self._run, fn, args, time.perf_counter())
+        future.add_done_callback(self._release_cancelled)
+        # Cancelling the caller (client disconnect, timeout) cancels the job if it has not started
+        return await asyncio.wrap_future(future)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(security.get_password_hash, password)
+
+    async def verify(self, password: str, password_hash: str) -> bool:
+        return await self._submit(security.verify_password, password, password_hash)
+
+    async def verify_and_update(self, password: str, password_hash: str) -> tuple[bool, Optional[str]]:
+        """(valid, new hash) - a new hash is returned when the stored one was made with another cost."""
+        return await self._submit(security.verify_and_update, password, password_hash)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": self._queued,
+                "max_queue": self.max_queue,
+                "bcrypt_rounds": settings.PASSWORD_BCRYPT_ROUNDS,
+            }
+
+
+password_hasher = PasswordHasher(workers=settings.PASSWORD_HASH_WORKERS, max_queue=settings.PASSWORD_HASH_MAX_QUEUE)
+metrics.register_collector("password_hasher", password_hasher.stats)
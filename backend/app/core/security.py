@@ -2,13 +2,22 @@ from datetime import datetime, timedelta
 from typing import Optional, Any
 from passlib.context import CryptContext
 from jose import jwt
+import hashlib
 import json
 import base64
 from app.core.config import get_settings
 
 settings = get_settings()
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# min = max = default rounds: hashes made with any other cost "need update" and are
+# rehashed on the next successful login (see verify_and_update)
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
 
 ALGORITHM = "HS256"
 
@@ -27,3 +36,11 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+def verify_and_update(plain_password: str, hashed_password: str) -> tuple[bool, Optional[str]]:
+    """(valid, new hash) - new hash is set when the stored one uses an outdated cost."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+def face_signature_digest(signature: str) -> str:
+    """SHA-256 hex of a biometric signature - what users.face_id_digest stores and is looked up by."""
+    return hashlib.sha256(signature.encode()).hexdigest()
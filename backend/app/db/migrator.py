@@ -0,0 +1,412 @@
+"""
+Versioned schema migrations.
+
+Migrations live in backend/migrations/versions as NNNN_<name>.py modules that
+define upgrade(op) and, where reversible, downgrade(op). Applied versions are
+recorded in the schema_migrations table together with a checksum of the file,
+so every environment can be brought to the same schema with `python migrate.py`.
+
+A migration runs inside a single transaction unless it sets
+`transactional = False`, which is required for online operations that
+PostgreSQL cannot run in a transaction block (CREATE INDEX CONCURRENTLY) or
+that must commit as they go (batched backfills). Non-transactional migrations
+must be safe to re-run after a partial failure.
+
+Every statement runs under a lock_timeout, so DDL that cannot get its lock
+fails fast instead of queueing behind live traffic and blocking it.
+"""
+import hashlib
+import importlib.util
+import re
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from app.core.config import settings
+from app.db.pool import pooler_mode
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "migrations" / "versions"
+
+# pg_advisory_lock key: only one runner may apply migrations at a time
+ADVISORY_LOCK_KEY = 7_340_034
+
+_FILENAME = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration:
+    def __init__(self, path: Path):
+        match = _FILENAME.match(path.name)
+        if not match:
+            raise MigrationError(f"{path.name}: migration files must be named NNNN_<name>.py")
+
+        self.path = path
+        self.version = int(match.group(1))
+        self.name = match.group(2)
+        self.checksum = hashlib.sha256(path.read_bytes()).hexdigest()
+
+        spec = importlib.util.spec_from_file_location(f"migrations.v{self.version:04d}", path)
+        self.module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.module)
+
+        if not hasattr(self.module, "upgrade"):
+            raise MigrationError(f"{path.name}: missing upgrade(op)")
+        self.transactional = getattr(self.module, "transactional", True)
+        self.reversible = hasattr(self.module, "downgrade")
+
+    @property
+    def label(self) -> str:
+        return f"{self.version:04d}_{self.name}"
+
+
+class Operations:
+    """
+    The `op` object passed to upgrade() / downgrade().
+    """
+
+    def __init__(self, conn, transactional: bool):
+        self.conn = conn
+        self.transactional = transactional
+
+    def execute(self, sql: str, params: Optional[dict] = None):
+        return self.conn.execute(text(sql), params or {})
+
+    def lock_timeout(self, value: str) -> None:
+        """Overrides the runner's lock_timeout for the rest of this migration."""
+        scope = "LOCAL" if self.transactional else "SESSION"
+        self.conn.execute(text(f"SET {scope} lock_timeout = '{value}'"))
+
+    def add_column(self, table: str, column: str, definition: str) -> None:
+        # Without a volatile default this is a catalog-only change on PostgreSQL 11+
+        self.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {definition}")
+
+    def index_is_invalid(self, name: str) -> bool:
+        return bool(self.execute("""
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = :name AND NOT i.indisvalid
+        """, {"name": name}).scalar())
+
+    def create_index_concurrently(self, name: str, definition: str, unique: bool = False) -> None:
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS <name> ON <definition>.
+        Tables stay readable and writable during the build. An invalid index left
+        behind by an interrupted build is dropped and rebuilt.
+        """
+        self._require_autocommit("create_index_concurrently")
+        if self.index_is_invalid(name):
+            print(f"  {name}: invalid leftover from an interrupted build, dropping")
+            self.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        self.execute(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+        print(f"  ✓ index {name}")
+
+    def drop_index_concurrently(self, name: str) -> None:
+        self._require_autocommit("drop_index_concurrently")
+        self.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        print(f"  ✓ dropped index {name}")
+
+    def backfill(
+        self,
+        table: str,
+        set_clause: str,
+        where: str,
+        params: Optional[dict] = None,
+        key: str = "id",
+        batch_size: Optional[int] = None,
+        pause_seconds: Optional[float] = None,
+    ) -> int:
+        """
+        UPDATE <table> SET <set_clause> for rows matching <where>, batch_size rows
+        per transaction with a pause between batches, so row locks are short-lived
+        and replicas / autovacuum can keep up.
+
+        `where` must stop matching a row once it has been updated
+        (e.g. "owner_id IS NULL"), otherwise the backfill never finishes.
+        """
+        self._require_autocommit("backfill")
+        batch_size = batch_size or settings.MIGRATION_BACKFILL_BATCH_SIZE
+        pause_seconds = settings.MIGRATION_BACKFILL_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+
+        sql = text(f"""
+            UPDATE {table} SET {set_clause}
+            WHERE {key} IN (
+                SELECT {key} FROM {table} WHERE {where}
+                LIMIT :_batch_size FOR UPDATE SKIP LOCKED
+            )
+        """)
+        total = 0
+        while True:
+            # Each batch is its own transaction (the connection is in autocommit mode)
+            updated = self.conn.execute(sql, {**(params or {}), "_batch_size": batch_size}).rowcount
+            if not updated:
+                break
+            total += updated
+            print(f"  {table}: backfilled {total} rows")
+            if pause_seconds:
+                time.sleep(pause_seconds)
+        return total
+
+    def copy_in_batches(
+        self,
+        source: str,
+        target: str,
+        columns: List[str],
+        select_list: Optional[List[str]] = None,
+        where: str = "TRUE",
+        key: str = "id",
+        batch_size: Optional[int] = None,
+        pause_seconds: Optional[float] = None,
+    ) -> int:
+        """
+        INSERT INTO <target> (columns) SELECT select_list FROM <source> in <key> order,
+        batch_size rows per transaction. Source rows are locked FOR SHARE while they are
+        copied, so a concurrent UPDATE / DELETE waits for the batch to commit (and a
+        mirror trigger on the source then sees the copied row). Rows already present
+        in the target are skipped.
+        """
+        self._require_autocommit("copy_in_batches")
+        batch_size = batch_size or settings.MIGRATION_BACKFILL_BATCH_SIZE
+        pause_seconds = settings.MIGRATION_BACKFILL_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+        column_list = ", ".join(columns)
+        selected = ", ".join(select_list or columns)
+
+        def batch_sql(after_key: bool):
+            condition = f"({where}) AND {key} > :_last" if after_key else where
+            return text(f"""
+                WITH batch AS (
+                    SELECT {key} AS _key, {selected} FROM {source}
+                    WHERE {condition} ORDER BY {key} LIMIT :_batch_size FOR SHARE
+                ), copied AS (
+                    INSERT INTO {target} ({column_list})
+                    SELECT {column_list} FROM batch ON CONFLICT DO NOTHING
+                )
+                SELECT (SELECT _key FROM batch ORDER BY _key DESC LIMIT 1), (SELECT count(*) FROM batch)
+            """)
+
+        total, last = 0, None
+        while True:
+            params = {"_batch_size": batch_size}
+            if last is not None:
+                params["_last"] = last
+            last_key, count = self.conn.execute(batch_sql(last is not None), params).one()
+            if not count:
+                break
+            total += count
+            last = last_key
+            print(f"  {source} -> {target}: copied {total} rows")
+            if pause_seconds:
+                time.sleep(pause_seconds)
+        return total
+
+    def create_partitioned_index_concurrently(self, name: str, parent: str, partitions: List[str], definition: str) -> None:
+        """
+        Builds an index on a partitioned table without blocking writes: an invalid
+        parent index ON ONLY the parent, CONCURRENTLY on each partition, then each
+        partition index is attached (the parent becomes valid once all are attached).
+        `definition` is everything after the table name, e.g. "(document_id, chunk_index)".
+        """
+        self._require_autocommit("create_partitioned_index_concurrently")
+        self.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {parent} {definition}")
+        for partition in partitions:
+            child = f"{partition}_{name}"
+            self.create_index_concurrently(child, f"{partition} {definition}")
+            attached = self.execute("""
+                SELECT 1 FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE c.relname = :child
+            """, {"child": child}).scalar()
+            if not attached:
+                self.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+
+    @contextmanager
+    def atomic(self):
+        """An explicit short transaction inside a non-transactional migration (e.g. a table swap)."""
+        self._require_autocommit("atomic")
+        self.conn.exec_driver_sql("BEGIN")
+        try:
+            yield
+        except Exception:
+            self.conn.exec_driver_sql("ROLLBACK")
+            raise
+        self.conn.exec_driver_sql("COMMIT")
+
+    def _require_autocommit(self, operation: str) -> None:
+        if self.transactional:
+            raise MigrationError(f"{operation} needs a migration with transactional = False")
+
+
+class MigrationRunner:
+    def __init__(self, database_url: Optional[str] = None, directory: Path = MIGRATIONS_DIR):
+        # Advisory locks and SET are session state, so migrations need a direct
+        # (or session-mode pooler) connection rather than the transaction pooler
+        self.database_url = database_url or settings.MIGRATION_DATABASE_URL or settings.DATABASE_URL
+        self.directory = directory
+        self.engine = create_engine(self.database_url, poolclass=NullPool)
+
+    def discover(self) -> List[Migration]:
+        migrations = sorted(
+            (Migration(path) for path in self.directory.glob("[0-9]*.py")),
+            key=lambda m: m.version
+        )
+        versions = [m.version for m in migrations]
+        if len(versions) != len(set(versions)):
+            raise MigrationError("Duplicate migration version numbers")
+        return migrations
+
+    def _ensure_table(self, conn) -> None:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR NOT NULL,
+                checksum VARCHAR(64) NOT NULL,
+                duration_ms INTEGER,
+                applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            )
+        """))
+
+    def applied(self, conn) -> Dict[int, dict]:
+        rows = conn.execute(text(
+            "SELECT version, name, checksum, applied_at FROM schema_migrations ORDER BY version"
+        )).mappings()
+        return {row["version"]: dict(row) for row in rows}
+
+    def _lock(self):
+        if pooler_mode(self.database_url) == "transaction":
+            print("[WARNING] Running migrations through a transaction pooler; set MIGRATION_DATABASE_URL "
+                  "to the direct connection (port 5432) so the advisory lock holds.")
+        conn = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        self._ensure_table(conn)
+        return conn
+
+    def _unlock(self, conn) -> None:
+        try:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        finally:
+            conn.close()
+
+    def _run(self, migration: Migration, direction: str) -> None:
+        started = time.perf_counter()
+
+        if migration.transactional:
+            conn = self.engine.connect()
+            conn.begin()
+        else:
+            conn = self.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+
+        try:
+            scope = "LOCAL" if migration.transactional else "SESSION"
+            conn.execute(text(f"SET {scope} lock_timeout = '{settings.MIGRATION_LOCK_TIMEOUT}'"))
+
+            op = Operations(conn, migration.transactional)
+            getattr(migration.module, direction)(op)
+
+            if direction == "upgrade":
+                conn.execute(text("""
+                    INSERT INTO schema_migrations (version, name, checksum, duration_ms)
+                    VALUES (:version, :name, :checksum, :duration_ms)
+                """), {
+                    "version": migration.version,
+                    "name": migration.name,
+                    "checksum": migration.checksum,
+                    "duration_ms": int((time.perf_counter() - started) * 1000),
+                })
+            else:
+                conn.execute(
+                    text("DELETE FROM schema_migrations WHERE version = :version"),
+                    {"version": migration.version}
+                )
+
+            if migration.transactional:
+                conn.commit()
+        except Exception:
+            if migration.transactional:
+                conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def upgrade(self, target: Optional[int] = None) -> List[Migration]:
+        """Applies pending migrations up to and including `target` (default: all)."""
+        migrations = self.discover()
+        done = []
+        conn = self._lock()
+        try:
+            applied = self.applied(conn)
+            self._warn_changed(migrations, applied)
+            for migration in migrations:
+                if migration.version in applied or (target is not None and migration.version > target):
+                    continue
+                print(f"→ Applying {migration.label}")
+                self._run(migration, "upgrade")
+                done.append(migration)
+                print(f"✓ Applied {migration.label}")
+        finally:
+            self._unlock(conn)
+        return done
+
+    def downgrade(self, target: int) -> List[Migration]:
+        """Reverts applied migrations newer than `target`, newest first."""
+        migrations = {m.version: m for m in self.discover()}
+        done = []
+        conn = self._lock()
+        try:
+            applied = self.applied(conn)
+            for version in sorted(applied, reverse=True):
+                if version <= target:
+                    break
+                migration = migrations.get(version)
+                if migration is None:
+                    raise MigrationError(f"Applied migration {version:04d} has no file to downgrade with")
+                if not migration.reversible:
+                    raise MigrationError(f"{migration.label} is irreversible (no downgrade)")
+                print(f"→ Reverting {migration.label}")
+                self._run(migration, "downgrade")
+                done.append(migration)
+                print(f"✓ Reverted {migration.label}")
+        finally:
+            self._unlock(conn)
+        return done
+
+    def status(self) -> List[dict]:
+        migrations = self.discover()
+        with self.engine.connect() as conn:
+            self._ensure_table(conn)
+            conn.commit()
+            applied = self.applied(conn)
+
+        rows = []
+        for migration in migrations:
+            row = applied.get(migration.version)
+            if row is None:
+                state = "pending"
+            elif row["checksum"] != migration.checksum:
+                state = "changed"
+            else:
+                state = "applied"
+            rows.append({
+                "version": migration.version,
+                "name": migration.name,
+                "state": state,
+                "applied_at": row["applied_at"] if row else None,
+            })
+        known = {m.version for m in migrations}
+        for version, row in applied.items():
+            if version not in known:
+                rows.append({"version": version, "name": row["name"], "state": "missing", "applied_at": row["applied_at"]})
+        return sorted(rows, key=lambda r: r["version"])
+
+    @staticmethod
+    def _warn_changed(migrations: List[Migration], applied: Dict[int, dict]) -> None:
+        for migration in migrations:
+            row = applied.get(migration.version)
+            if row and row["checksum"] != migration.checksum:
+                print(f"[WARNING] {migration.label} was edited after it was applied; "
+                      "add a new migration instead of changing an applied one.")
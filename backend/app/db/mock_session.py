@@ -1,152 +1,1039 @@
+"""
+In-memory database backend for offline tests and benchmarks (USE_MOCK_DB=true).
+
+MockAsyncSession / MockSession implement the parts of AsyncSession / Session the
+services use, and evaluate real SQLAlchemy statements against MOCK_DB_STORE:
+
+- select() of entities, columns and labelled expressions, with where(), join()
+  (explicit or foreign-key inferred, inner / outer), order_by(), limit(), offset()
+- delete() / update() / insert() statements (including INSERT ... SELECT), plus
+  text("INSERT INTO ...") as used by document_service
+- the legacy query(Model).filter(...).first() API used by background jobs
+- pgvector operators (<->, <=>, <#>) computed brute force with NumPy
+
+Every table keeps a primary-key map plus hash indexes that are built on demand
+for columns used in equality filters / joins and maintained on commit, so hot
+lookups stay O(1) regardless of table size. Unique constraints and ON DELETE
+CASCADE are enforced.
+
+Deliberate simplifications: there is one shared store and no isolation - objects
+are shared between sessions, DML statements apply immediately, and rollback only
+discards pending add() / delete() calls.
+"""
+import copy
+import operator
+import re
 import uuid
-from typing import Any, List, Type, TypeVar, Optional
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import exc, inspect, select as sa_select
+from pgvector.sqlalchemy import Vector
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import elements, functions, operators
+from sqlalchemy.sql.dml import Delete, Insert, Update
+from sqlalchemy.sql.selectable import Select
+
+from app.db.base import Base
+
+
+class MockTable:
+    """Rows of one table: primary-key map + on-demand hash indexes."""
+
+    def __init__(self, table):
+        self.table = table
+        self.mapper = _mapper_for(table)
+        self.pk_keys = [self.mapper.get_property_by_column(c).key for c in table.primary_key.columns]
+        self.rows: Dict[Any, Any] = {}
+        self.indexes: Dict[str, Dict[Any, set]] = {}
+        self._indexed: Dict[Any, Dict[str, Any]] = {}  # pk -> {attribute: value currently in the indexes}
+        self.unique_sets = [  # (constraint / index name, attributes)
+            (constraint.name or f"{table.name}_key", [self.mapper.get_property_by_column(c).key for c in constraint.columns])
+            for constraint in table.constraints
+            if constraint.__class__.__name__ == "UniqueConstraint"
+        ] + [
+            (f"{table.name}_{c.name}_key", [self.mapper.get_property_by_column(c).key])
+            for c in table.columns if c.unique
+        ] + [
+            (index.name, [self.mapper.get_property_by_column(c).key for c in index.columns])
+            for index in table.indexes
+            if index.unique and len(index.columns)
+        ]
+
+    def pk(self, obj):
+        values = tuple(getattr(obj, key) for key in self.pk_keys)
+        return values[0] if len(values) == 1 else values
+
+    def _add_to_index(self, attr: str, pk, value) -> None:
+        try:
+            self.indexes[attr].setdefault(value, set()).add(pk)
+        except TypeError:  # Unhashable (JSON) values are never index keys
+            pass
+
+    def ensure_index(self, attr: str) -> Dict[Any, set]:
+        if attr not in self.indexes:
+            self.indexes[attr] = {}
+            for pk, obj in self.rows.items():
+                value = getattr(obj, attr, None)
+                self._indexed.setdefault(pk, {})[attr] = value
+                self._add_to_index(attr, pk, value)
+        return self.indexes[attr]
+
+    def lookup(self, attr: str, value) -> List[Any]:
+        if attr in self.pk_keys and len(self.pk_keys) == 1:
+            obj = self.rows.get(value)
+            return [obj] if obj is not None else []
+        try:
+            pks = self.ensure_index(attr).get(value, ())
+        except TypeError:
+            return [obj for obj in self.rows.values() if getattr(obj, attr, None) == value]
+        return [self.rows[pk] for pk in pks]
+
+    def check_unique(self, obj) -> None:
+        pk = self.pk(obj)
+        for name, attrs in self.unique_sets:
+            values = [getattr(obj, attr, None) for attr in attrs]
+            if any(v is None for v in values):
+                continue
+            clashes = {self.pk(o) for o in self.lookup(attrs[0], values[0])
+                       if all(getattr(o, a, None) == v for a, v in zip(attrs, values))}
+            if clashes - {pk}:
+                raise exc.IntegrityError(
+                    f"INSERT INTO {self.table.name}", None,
+                    Exception(f'duplicate key value violates unique constraint "{name}" on {self.table.name}({", ".join(attrs)})')
+                )
+
+    def insert(self, obj) -> None:
+        pk = self.pk(obj)
+        if pk in self.rows and self.rows[pk] is not obj:
+            raise exc.IntegrityError(
+                f"INSERT INTO {self.table.name}", None,
+                Exception(f"duplicate key value violates {self.table.name}_pkey")
+            )
+        self.check_unique(obj)
+        self.rows[pk] = obj
+        self.reindex(obj)
+
+    def reindex(self, obj) -> None:
+        pk = self.pk(obj)
+        indexed = self._indexed.setdefault(pk, {})
+        for attr, index in self.indexes.items():
+            value = getattr(obj, attr, None)
+            if attr in indexed:
+                old = indexed[attr]
+                if old == value:
+                    continue
+                try:
+                    index.get(old, set()).discard(pk)
+                except TypeError:
+                    pass
+            indexed[attr] = value
+            self._add_to_index(attr, pk, value)
+
+    def remove(self, obj) -> bool:
+        pk = self.pk(obj)
+        if self.rows.pop(pk, None) is None:
+            return False
+        for attr, value in self._indexed.pop(pk, {}).items():
+            try:
+                self.indexes[attr].get(value, set()).discard(pk)
+            except TypeError:
+                pass
+        return True
+
+
+class MockStore:
+    def __init__(self):
+        self.tables: Dict[str, MockTable] = {}
+
+    def table(self, table) -> MockTable:
+        if table.name not in self.tables:
+            self.tables[table.name] = MockTable(table)
+        return self.tables[table.name]
+
+    def clear(self) -> None:
+        self.tables.clear()
+
+
+# Global in-memory store, shared by every mock session in the process
+MOCK_DB_STORE = MockStore()
+
+
+def reset_mock_db():
+    MOCK_DB_STORE.clear()
+
+
+# --- Helpers ---
+
+_mappers: Dict[str, Any] = {}
+
+
+def _mapper_for(table):
+    if table.name not in _mappers:
+        for mapper in Base.registry.mappers:
+            _mappers[mapper.local_table.name] = mapper
+    return _mappers[table.name]
+
+
+def _table_of(target):
+    """Table for a mapped class, an (annotated) Table or a Join target."""
+    if isinstance(target, type):
+        return inspect(target).local_table
+    table = getattr(target, "__table__", None)
+    if table is not None:
+        return table
+    return target
+
+
+def _coerce(column, value):
+    """
+    Normalises a value to what the column would return from Postgres:
+    UUID columns -> uuid.UUID, vector columns -> float32 numpy arrays (as pgvector returns them).
+    """
+    if value is None or column is None:
+        return value
+    if isinstance(column.type, UUID) and getattr(column.type, "as_uuid", True) and isinstance(value, str):
+        try:
+            return uuid.UUID(value)
+        except ValueError:
+            return value
+    if isinstance(column.type, Vector) and not isinstance(value, np.ndarray):
+        return np.asarray(value, dtype=np.float32)
+    return value
+
+
+def _column_of(expr):
+    """The table column behind an expression, or None."""
+    if hasattr(expr, "__clause_element__"):
+        expr = expr.__clause_element__()
+    while isinstance(expr, (elements.Label, elements.Grouping)):
+        expr = expr.element
+    if isinstance(expr, elements.ColumnClause) and getattr(expr, "table", None) is not None:
+        return expr
+    return None
+
+
+_default_plans: Dict[str, list] = {}
+
+
+def _default_plan(table) -> list:
+    """(attribute, column, default factory or None) per column, worked out once per table."""
+    if table.name not in _default_plans:
+        mapper, plan = _mapper_for(table), []
+        for column in table.columns:
+            factory = None
+            if column.default is not None and not column.default.is_sequence:
+                default = column.default
+                if default.is_callable:
+                    factory = lambda default=default: default.arg(None)
+                elif default.is_scalar:
+                    factory = lambda default=default: copy.deepcopy(default.arg)
+            elif column.server_default is not None:
+                text_default = str(getattr(column.server_default, "arg", "")).lower()
+                if "now" in text_default:
+                    factory = lambda: datetime.now(timezone.utc)
+                elif text_default in ("true", "false"):
+                    factory = lambda value=text_default == "true": value
+            plan.append((mapper.get_property_by_column(column).key, column, factory))
+        _default_plans[table.name] = plan
+    return _default_plans[table.name]
+
+
+def _apply_defaults(obj) -> None:
+    for attr, column, factory in _default_plan(obj.__table__):
+        current = getattr(obj, attr, None)
+        value = factory() if current is None and factory is not None else current
+        value = _coerce(column, value)
+        if value is not current:
+            setattr(obj, attr, value)
+
+
+def _vector(value):
+    if value is None:
+        return None
+    return np.asarray(value, dtype=np.float32)
+
+
+def _l2(a, b):
+    return float(np.linalg.norm(a - b))
+
+
+def _cosine(a, b):
+    denom = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return 1.0 - float(np.dot(a, b)) / denom if denom else None
+
+
+def _neg_inner(a, b):
+    return -float(np.dot(a, b))
+
+
+VECTOR_OPS = {"<->": _l2, "<=>": _cosine, "<#>": _neg_inner}
+
+
+def _like(value, pattern, case_insensitive=False):
+    if value is None or pattern is None:
+        return None
+    regex = "^" + re.escape(pattern).replace("%", ".*").replace("_", ".") + "$"
+    return re.match(regex, value, re.IGNORECASE if case_insensitive else 0) is not None
+
+
+def _null_safe(fn):
+    def apply(a, b):
+        if a is None or b is None:
+            return None
+        return fn(a, b)
+    return apply
+
+
+BINARY_OPS = {
+    operators.eq: _null_safe(operator.eq),
+    operators.ne: _null_safe(operator.ne),
+    operators.lt: _null_safe(operator.lt),
+    operators.le: _null_safe(operator.le),
+    operators.gt: _null_safe(operator.gt),
+    operators.ge: _null_safe(operator.ge),
+    operators.add: _null_safe(operator.add),
+    operators.sub: _null_safe(operator.sub),
+    operators.mul: _null_safe(operator.mul),
+    operators.truediv: _null_safe(operator.truediv),
+    operators.concat_op: _null_safe(operator.add),
+    operators.is_: lambda a, b: a is b or a == b,
+    operators.is_not: lambda a, b: not (a is b or a == b),
+    operators.in_op: lambda a, b: None if a is None else a in b,
+    operators.not_in_op: lambda a, b: None if a is None else a not in b,
+    operators.like_op: lambda a, b: _like(a, b),
+    operators.ilike_op: lambda a, b: _like(a, b, case_insensitive=True),
+    operators.not_like_op: lambda a, b: None if _like(a, b) is None else not _like(a, b),
+}
+
+def _not(value):
+    return None if value is None else not value
+
+
+FUNCTIONS = {
+    "lower": lambda v: v.lower() if v is not None else None,
+    "upper": lambda v: v.upper() if v is not None else None,
+    "length": lambda v: len(v) if v is not None else None,
+    "coalesce": lambda *vs: next((v for v in vs if v is not None), None),
+    "now": lambda: datetime.now(timezone.utc),
+    "gen_random_uuid": lambda: uuid.uuid4(),
+}
+
+
+class _Row:
+    """One candidate row during query evaluation: table name -> mapped object."""
+    __slots__ = ("objects", "computed")
+
+    def __init__(self, objects: Dict[str, Any]):
+        self.objects = objects
+        self.computed: Dict[int, Any] = {}
+
+
+def _attr_key(column) -> str:
+    """Mapped attribute name of a table column (they can differ, e.g. metadata_ -> "metadata")."""
+    return _mapper_for(column.table).get_property_by_column(column.table.c[column.key]).key
+
+
+def _and(values) -> Optional[bool]:
+    result = True
+    for v in values:
+        if v is False:
+            return False
+        if v is None:
+            result = None
+    return result
+
+
+def _or(values) -> Optional[bool]:
+    result = False
+    for v in values:
+        if v is True:
+            return True
+        if v is None:
+            result = None
+    return result
+
+
+def _compile(expr, params: Optional[dict] = None):
+    """
+    Turns an expression into a function of one _Row, once per statement, so evaluating it
+    over many rows does not re-inspect the expression tree each time.
+    """
+    if hasattr(expr, "__clause_element__"):
+        expr = expr.__clause_element__()
+
+    if isinstance(expr, elements.BindParameter):
+        value = params[expr.key] if params and expr.key in params else expr.effective_value
+        return lambda row: value
+    if isinstance(expr, elements.Null):
+        return lambda row: None
+    if isinstance(expr, elements.True_):
+        return lambda row: True
+    if isinstance(expr, elements.False_):
+        return lambda row: False
+    if isinstance(expr, (elements.Label, elements.Grouping, elements._label_reference)):
+        return _compile(expr.element, params)
+    if isinstance(expr, elements.ColumnClause) and getattr(expr, "table", None) is not None:
+        table_name, attr = expr.table.name, _attr_key(expr)
+
+        def column(row):
+            obj = row.objects.get(table_name)
+            return None if obj is None else getattr(obj, attr)
+        return column
+    if isinstance(expr, elements.BooleanClauseList) or (
+        isinstance(expr, elements.ClauseList) and expr.operator in (operators.and_, operators.or_)
+    ):
+        fns = [_compile(c, params) for c in expr.clauses]
+        combine = _and if expr.operator is operators.and_ else _or
+        return lambda row: combine(fn(row) for fn in fns)
+    if isinstance(expr, elements.UnaryExpression):
+        inner = _compile(expr.element, params)
+        if expr.operator is operators.inv:
+            return lambda row: _not(inner(row))
+        if expr.operator is operators.neg:
+            return lambda row: _null_safe(operator.neg)(inner(row))
+        return inner  # asc / desc / nulls modifiers only matter for ordering
+    if isinstance(expr, elements.BinaryExpression):
+        left, right = _compile(expr.left, params), _compile(expr.right, params)
+        opstring = getattr(expr.operator, "opstring", None)
+        if opstring in VECTOR_OPS:
+            key, distance = id(expr), VECTOR_OPS[opstring]
+
+            def vector_op(row):
+                if key in row.computed:  # Batch-computed by _precompute_vectors
+                    return row.computed[key]
+                a, b = _vector(left(row)), _vector(right(row))
+                return None if a is None or b is None else distance(a, b)
+            return vector_op
+        fn = BINARY_OPS.get(expr.operator)
+        if fn is None:
+            raise NotImplementedError(f"MockSession: unsupported operator {expr.operator}")
+        column = _column_of(expr.left)
+        if column is not None and isinstance(column.type, UUID):
+            raw_right = right
+
+            def right(row):
+                value = raw_right(row)
+                return [_coerce(column, v) for v in value] if isinstance(value, (list, tuple)) else _coerce(column, value)
+        if isinstance(expr.right, elements.BindParameter):
+            constant = right(None)
+            return lambda row: fn(left(row), constant)
+        return lambda row: fn(left(row), right(row))
+    if isinstance(expr, functions.FunctionElement):
+        fn = FUNCTIONS.get(expr.name.lower())
+        if fn is None:
+            raise NotImplementedError(f"MockSession: unsupported function {expr.name}()")
+        args = [_compile(c, params) for c in expr.clauses]
+        return lambda row: fn(*[arg(row) for arg in args])
+    if isinstance(expr, elements.Cast):
+        return _compile(expr.clause, params)
+    raise NotImplementedError(f"MockSession: unsupported expression {type(expr).__name__}")
+
+
+def _evaluate(expr, row: _Row, params: Optional[dict] = None):
+    return _compile(expr, params)(row)
+
+
+def _conjuncts(clause) -> list:
+    if clause is None:
+        return []
+    if isinstance(clause, elements.BooleanClauseList) and clause.operator is operators.and_:
+        out = []
+        for c in clause.clauses:
+            out.extend(_conjuncts(c))
+        return out
+    return [clause]
+
+
+def _equality_lookups(clause, table, params=None) -> list:
+    """(conjunct, attribute, value) for `table.col == <constant>` conjuncts, usable as index lookups."""
+    lookups = []
+    for conjunct in _conjuncts(clause):
+        if not isinstance(conjunct, elements.BinaryExpression) or conjunct.operator is not operators.eq:
+            continue
+        for col_side, value_side in ((conjunct.left, conjunct.right), (conjunct.right, conjunct.left)):
+            column = _column_of(col_side)
+            if column is None or column.table.name != table.name or _column_of(value_side) is not None:
+                continue
+            if isinstance(value_side, (elements.BindParameter, elements.True_, elements.False_)):
+                value = _coerce(column, _evaluate(value_side, _Row({}), params))
+                lookups.append((conjunct, _attr_key(column), value))
+            break
+    return lookups
+
+
+def _candidates(mock_table: MockTable, clause, params=None) -> tuple:
+    """
+    Rows of a table that can match `clause`, narrowed with the most selective hash index,
+    and the conjuncts still to be checked (the one answered by the index is not).
+    """
+    conjuncts = _conjuncts(clause)
+    lookups = _equality_lookups(clause, mock_table.table, params)
+    if not lookups:
+        return list(mock_table.rows.values()), conjuncts
+    matches = [(mock_table.lookup(attr, value), conjunct) for conjunct, attr, value in lookups]
+    best, used = min(matches, key=lambda m: len(m[0]))
+    return list(best), [c for c in conjuncts if c is not used]
+
+
+def _filter(rows: list, conjuncts: list, params=None) -> list:
+    for conjunct in conjuncts:
+        predicate = _compile(conjunct, params)
+        rows = [r for r in rows if predicate(r) is True]
+    return rows
+
+
+def _join_onclause(joined_tables: list, target):
+    """Infers the join condition from foreign keys, like Query.join(Model)."""
+    for table in joined_tables:
+        # (column on the already-joined side, column on the target)
+        for fk in target.foreign_keys:
+            if fk.column.table.name == table.name:
+                return fk.column, fk.parent
+        for fk in table.foreign_keys:
+            if fk.column.table.name == target.name:
+                return fk.parent, fk.column
+    raise exc.InvalidRequestError(f"MockSession: cannot infer how to join {target.name}")
+
+
+# --- Results ---
+
+class MockRow(tuple):
+    def __new__(cls, values, keys):
+        row = super().__new__(cls, values)
+        row._fields = tuple(keys)
+        return row
+
+    @property
+    def _mapping(self) -> dict:
+        return dict(zip(self._fields, self))
+
+    def __getattr__(self, name):
+        try:
+            return self[self._fields.index(name)]
+        except ValueError:
+            raise AttributeError(name)
+
+
+class MockScalarResult:
+    def __init__(self, values: list):
+        self._values = values
+
+    def all(self) -> list:
+        return list(self._values)
+
+    def first(self):
+        return self._values[0] if self._values else None
+
+    def one(self):
+        if len(self._values) != 1:
+            raise exc.NoResultFound() if not self._values else exc.MultipleResultsFound()
+        return self._values[0]
 
-# Global in-memory store
-# key: Table/Class Name, value: List of objects
-MOCK_DB_STORE = {}
+    def one_or_none(self):
+        if len(self._values) > 1:
+            raise exc.MultipleResultsFound()
+        return self.first()
+
+    def unique(self):
+        seen, values = set(), []
+        for v in self._values:
+            if id(v) not in seen:
+                seen.add(id(v))
+                values.append(v)
+        return MockScalarResult(values)
+
+    def __iter__(self):
+        return iter(self._values)
+
+
+class MockResult:
+    def __init__(self, rows: Optional[list] = None, keys: Optional[list] = None, rowcount: int = -1):
+        self._rows = [MockRow(r, keys or []) for r in (rows or [])]
+        self._keys = keys or []
+        self.rowcount = rowcount if rowcount >= 0 else len(self._rows)
+
+    def keys(self) -> list:
+        return list(self._keys)
+
+    def scalars(self) -> MockScalarResult:
+        return MockScalarResult([r[0] for r in self._rows])
+
+    def all(self) -> list:
+        return list(self._rows)
+
+    fetchall = all
+
+    def first(self):
+        return self._rows[0] if self._rows else None
+
+    def one(self):
+        if len(self._rows) != 1:
+            raise exc.NoResultFound() if not self._rows else exc.MultipleResultsFound()
+        return self._rows[0]
+
+    def one_or_none(self):
+        if len(self._rows) > 1:
+            raise exc.MultipleResultsFound()
+        return self.first()
+
+    def scalar(self):
+        return self._rows[0][0] if self._rows else None
+
+    def scalar_one(self):
+        return self.one()[0]
+
+    def scalar_one_or_none(self):
+        row = self.one_or_none()
+        return row[0] if row is not None else None
+
+    def mappings(self) -> MockScalarResult:
+        return MockScalarResult([r._mapping for r in self._rows])
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+# --- Statement execution ---
+
+_TEXT_INSERT = re.compile(
+    r"^\s*INSERT\s+INTO\s+(\w+)\s*\(([^)]*)\)\s*VALUES\s*\(([^)]*)\)\s*;?\s*$", re.IGNORECASE | re.DOTALL
+)
+
+
+class _MockSessionCore:
+    def __init__(self, store: MockStore = None):
+        self.store = store or MOCK_DB_STORE
+        self.info: Dict[str, Any] = {}
+        self._pending: Dict[int, Any] = {}  # id -> object, in add() order
+        self._deleted: List[Any] = []
+        self._seen: Dict[int, Any] = {}
+
+    # Unit of work
+
+    def add(self, obj) -> None:
+        self._pending[id(obj)] = obj
+
+    def add_all(self, objs) -> None:
+        for obj in objs:
+            self.add(obj)
+
+    def _delete(self, obj) -> None:
+        if id(obj) in self._pending:
+            del self._pending[id(obj)]
+        else:
+            self._deleted.append(obj)
+
+    def _flush(self) -> None:
+        for obj in self._deleted:
+            self._delete_row(self.store.table(obj.__table__), obj)
+        self._deleted = []
+
+        for obj in self._pending.values():
+            mock_table = self.store.table(obj.__table__)
+            if mock_table.pk(obj) is not None and mock_table.rows.get(mock_table.pk(obj)) is obj:
+                continue
+            _apply_defaults(obj)
+            mock_table.insert(obj)
+            self._seen[id(obj)] = obj
+        self._pending = {}
+
+        # Objects loaded or added through this session may have been modified in place
+        for obj in self._seen.values():
+            mock_table = self.store.table(obj.__table__)
+            if mock_table.rows.get(mock_table.pk(obj)) is obj:
+                mock_table.check_unique(obj)
+                mock_table.reindex(obj)
+
+    def _commit(self) -> None:
+        self._flush()
+
+    def _rollback(self) -> None:
+        self._pending = {}
+        self._deleted = []
+
+    def _close(self) -> None:
+        self._rollback()
+        self._seen = {}
+
+    def _get(self, model, pk):
+        mock_table = self.store.table(inspect(model).local_table)
+        column = mock_table.table.primary_key.columns[0]
+        obj = mock_table.rows.get(_coerce(column, pk))
+        if obj is not None:
+            self._seen[id(obj)] = obj
+        return obj
+
+    def _delete_row(self, mock_table: MockTable, obj) -> None:
+        if not mock_table.remove(obj):
+            return
+        # ON DELETE CASCADE
+        for other in Base.metadata.sorted_tables:
+            for fk in other.foreign_keys:
+                if fk.column.table.name == mock_table.table.name and (fk.ondelete or "").upper() == "CASCADE":
+                    child_table = self.store.table(other)
+                    parent_value = getattr(obj, _mapper_for(mock_table.table).get_property_by_column(fk.column).key)
+                    child_attr = _mapper_for(other).get_property_by_column(fk.parent).key
+                    for child in list(child_table.lookup(child_attr, parent_value)):
+                        self._delete_row(child_table, child)
+
+    # Statements
+
+    def _execute(self, statement, params: Optional[dict] = None) -> MockResult:
+        if isinstance(statement, Select):
+            return self._select(statement, params)
+        if isinstance(statement, Delete):
+            return self._dml_delete(statement, params)
+        if isinstance(statement, Update):
+            return self._dml_update(statement, params)
+        if isinstance(statement, Insert):
+            return self._dml_insert(statement, params)
+        if isinstance(statement, elements.TextClause):
+            return self._text(statement, params or {})
+        raise NotImplementedError(f"MockSession: unsupported statement {type(statement).__name__}")
+
+    def _rows_for(self, statement, params) -> List[_Row]:
+        descriptions = statement.column_descriptions
+        joins = getattr(statement, "_setup_joins", ())
+        join_tables = {_table_of(j[0]).name for j in joins}
+
+        base_tables = []
+        for d in descriptions:
+            entity = d.get("entity")
+            if entity is None:
+                continue
+            table = inspect(entity).local_table
+            if table.name not in join_tables and all(t.name != table.name for t in base_tables):
+                base_tables.append(table)
+        if not base_tables:
+            raise NotImplementedError("MockSession: select() without a mapped entity")
+
+        where = statement.whereclause
+        first = self.store.table(base_tables[0])
+        name = first.table.name
+        candidates, remaining = _candidates(first, where, params)
+        rows = [_Row({name: obj}) for obj in candidates]
+
+        # Additional FROM entities without a join: cross product
+        for table in base_tables[1:]:
+            others, _ = _candidates(self.store.table(table), where, params)
+            rows = [_Row({**r.objects, table.name: o}) for r in rows for o in others]
+
+        joined = list(base_tables)
+        for target, onclause, _from, flags in joins:
+            target_table = _table_of(target)
+            if onclause is not None and not isinstance(onclause, elements.BinaryExpression):
+                onclause = getattr(onclause, "expression", onclause)  # relationship attribute
+            if onclause is not None and (
+                not isinstance(onclause, elements.BinaryExpression) or onclause.operator is not operators.eq
+            ):
+                raise NotImplementedError("MockSession: only single-column equality joins are supported")
+            if onclause is None:
+                left_col, right_col = _join_onclause(joined, target_table)
+            else:
+                left_col, right_col = _column_of(onclause.left), _column_of(onclause.right)
+                if left_col.table.name == target_table.name:
+                    left_col, right_col = right_col, left_col
+            mock_target = self.store.table(target_table)
+            right_attr, left_value = _attr_key(right_col), _compile(left_col)
+            target_name = target_table.name
+
+            joined_rows = []
+            for row in rows:
+                value = left_value(row)
+                matches = mock_target.lookup(right_attr, value) if value is not None else []
+                for match in matches:
+                    joined_row = _Row(dict(row.objects))
+                    joined_row.objects[target_name] = match
+                    joined_rows.append(joined_row)
+                if not matches and flags.get("isouter"):
+                    joined_rows.append(_Row({**row.objects, target_name: None}))
+            rows = joined_rows
+            joined.append(target_table)
+
+        return _filter(rows, remaining, params)
+
+    def _precompute_vectors(self, expr, rows: List[_Row], params) -> None:
+        """Batch-evaluates a pgvector distance for all rows with one NumPy call."""
+        inner = expr.__clause_element__() if hasattr(expr, "__clause_element__") else expr
+        while isinstance(inner, (elements.Label, elements.Grouping, elements._label_reference, elements.UnaryExpression)):
+            inner = inner.element
+        opstring = getattr(getattr(inner, "operator", None), "opstring", None)
+        if not isinstance(inner, elements.BinaryExpression) or opstring not in VECTOR_OPS or not rows:
+            return
+        if id(inner) in rows[0].computed:  # Selected and ordered by: computed once
+            return
+        query = _vector(_evaluate(inner.right, rows[0], params))
+        left = _compile(inner.left, params)
+        vectors = [left(r) for r in rows]
+        present = [i for i, v in enumerate(vectors) if v is not None]
+        scores = [None] * len(rows)
+        if query is not None and present:
+            matrix = np.stack([vectors[i] for i in present]).astype(np.float32, copy=False)
+            if opstring == "<->":
+                values = np.linalg.norm(matrix - query, axis=1)
+            elif opstring == "<#>":
+                values = -(matrix @ query)
+            else:
+                norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+                values = 1.0 - (matrix @ query) / np.where(norms == 0, np.nan, norms)
+            for i, value in zip(present, values.tolist()):
+                scores[i] = None if value != value else value  # NaN -> NULL
+        for row, score in zip(rows, scores):
+            row.computed[id(inner)] = score
+
+    def _select(self, statement: Select, params) -> MockResult:
+        rows = self._rows_for(statement, params)
+        descriptions = statement.column_descriptions
+
+        for d in descriptions:
+            if not isinstance(d["expr"], type):
+                self._precompute_vectors(d["expr"], rows, params)
+        order_by = list(getattr(statement, "_order_by_clauses", ()))
+        for clause in order_by:
+            self._precompute_vectors(clause, rows, params)
+
+        # Stable sort, least significant key first. NULLs sort as larger than any value,
+        # like Postgres: last for ASC, first for DESC
+        for clause in reversed(order_by):
+            descending = False
+            inner = clause
+            if isinstance(inner, elements._label_reference):
+                inner = inner.element
+            if isinstance(inner, elements.UnaryExpression) and inner.modifier in (operators.desc_op, operators.asc_op):
+                descending = inner.modifier is operators.desc_op
+                inner = inner.element
+            key = _compile(inner, params)
+            keyed = [(key(r), r) for r in rows]
+            non_null = sorted((k for k in keyed if k[0] is not None), key=lambda k: k[0], reverse=descending)
+            nulls = [k for k in keyed if k[0] is None]
+            rows = [r for _, r in (nulls + non_null if descending else non_null + nulls)]
+
+        offset = statement._offset or 0
+        limit = statement._limit
+        rows = rows[offset:offset + limit if limit is not None else None]
+
+        # Entities project as the stored object, anything else as its value
+        projections = [
+            (inspect(d["expr"]).local_table.name, None) if isinstance(d["expr"], type) else (None, _compile(d["expr"], params))
+            for d in descriptions
+        ]
+        out = []
+        for row in rows:
+            values = []
+            for table_name, value in projections:
+                if table_name is not None:
+                    obj = row.objects.get(table_name)
+                    if obj is not None:
+                        self._seen[id(obj)] = obj
+                    values.append(obj)
+                else:
+                    values.append(value(row))
+            out.append(tuple(values))
+        return MockResult(out, [d["name"] for d in descriptions])
+
+    def _dml_targets(self, statement, params) -> tuple:
+        table = statement.table
+        mock_table = self.store.table(table)
+        candidates, remaining = _candidates(mock_table, statement.whereclause, params)
+        rows = _filter([_Row({table.name: obj}) for obj in candidates], remaining, params)
+        return mock_table, [r.objects[table.name] for r in rows], rows
+
+    def _dml_delete(self, statement: Delete, params) -> MockResult:
+        mock_table, objs, _ = self._dml_targets(statement, params)
+        for obj in objs:
+            self._delete_row(mock_table, obj)
+        return MockResult(rowcount=len(objs))
+
+    def _dml_update(self, statement: Update, params) -> MockResult:
+        mock_table, objs, rows = self._dml_targets(statement, params)
+        mapper = mock_table.mapper
+        for obj, row in zip(objs, rows):
+            new_values = {
+                mapper.get_property_by_column(mock_table.table.c[column.key]).key: _coerce(column, _evaluate(value, row, params))
+                for column, value in statement._values.items()
+            }
+            for attr, value in new_values.items():
+                setattr(obj, attr, value)
+            mock_table.check_unique(obj)
+            mock_table.reindex(obj)
+        return MockResult(rowcount=len(objs))
+
+    def _insert_values(self, table, values: dict) -> None:
+        mapper = _mapper_for(table)
+        obj = mapper.class_()
+        for column in table.columns:
+            if column.key in values:
+                setattr(obj, mapper.get_property_by_column(column).key, _coerce(column, values[column.key]))
+        _apply_defaults(obj)
+        self.store.table(table).insert(obj)
+
+    def _dml_insert(self, statement: Insert, params) -> MockResult:
+        table = statement.table
+        if statement.select is not None:  # INSERT ... SELECT
+            names = [c.key if hasattr(c, "key") else c for c in statement._select_names]
+            rows = [dict(zip(names, r)) for r in self._select(statement.select, params).all()]
+            for values in rows:
+                self._insert_values(table, values)
+            return MockResult(rowcount=len(rows))
+        rows = statement._multi_values[0] if getattr(statement, "_multi_values", None) else None
+        if rows is None:
+            values = {column.key: _evaluate(value, _Row({}), params) for column, value in (statement._values or {}).items()}
+            rows = [values] if values else []
+            if params:
+                rows = params if isinstance(params, list) else [params]
+        else:
+            rows = [{(c.key if hasattr(c, "key") else c): _evaluate(v, _Row({}), params) for c, v in r.items()}
+                    for r in rows]
+        for values in rows:
+            self._insert_values(table, values)
+        return MockResult(rowcount=len(rows))
+
+    def _text(self, statement: elements.TextClause, params: dict) -> MockResult:
+        match = _TEXT_INSERT.match(statement.text)
+        if not match:
+            raise NotImplementedError(f"MockSession: only simple text INSERTs are supported, got: {statement.text.strip()[:60]}")
+        table_name, columns, placeholders = match.groups()
+        table = Base.metadata.tables[table_name]
+        names = [c.strip() for c in columns.split(",")]
+        values = {}
+        for name, placeholder in zip(names, [p.strip() for p in placeholders.split(",")]):
+            values[name] = params.get(placeholder[1:]) if placeholder.startswith(":") else placeholder.strip("'")
+        self._insert_values(table, values)
+        return MockResult(rowcount=1)
 
-T = TypeVar("T")
 
 class MockQuery:
-    def __init__(self, model_class: Type[T], session: "MockSession"):
+    """Legacy Session.query() API, built on select()."""
+
+    def __init__(self, model_class, session: "MockSession"):
         self.model_class = model_class
         self.session = session
-        self.model_name = model_class.__name__
-        self._filters = []
-        
-        # Initialize store for this model if not exists
-        if self.model_name not in MOCK_DB_STORE:
-            MOCK_DB_STORE[self.model_name] = []
-            
+        self._stmt = sa_select(model_class)
+
     def filter(self, *expressions) -> "MockQuery":
-        # Start with all records
-        records = MOCK_DB_STORE[self.model_name]
-        
-        # Rough approximation of SQLAlchemy filter
-        # limitation: this mock only supports basic equality checks if passed a bool expression
-        # usually sqlalchemy filters are like User.email == "..."
-        # We need a way to capture these. 
-        # For this simple mock, we might need to rely on the fact that we can iterate and check
-        # But `expressions` are BinaryExpressions in SQLA.
-        # To make this strictly a MOCK without depending on SQLA internals is hard if the calling code uses SQLA expressions.
-        # APPROACH: The calling code does: .filter(models.User.email == user_in.email)
-        # We can't easily evaluate that SQLA expression against a plain object without keeping the SQLA instrumentation.
-        
-        # HOWEVER, we can monkey-patch or use a simpler approach if we modify how we call it?
-        # No, the requirement is "without affecting existing functionality" (too much).
-        
-        # Alternative Deep Implementation:
-        # We actually receive a BinaryExpression.
-        # We can inspect `expression.left`, `expression.operator`, `expression.right`.
-        
-        self._filters.extend(expressions)
+        self._stmt = self._stmt.where(*expressions)
         return self
 
-    def _execute_filters(self, records: List[Any]) -> List[Any]:
-        results = []
-        for record in records:
-            match = True
-            for expression in self._filters:
-                # This is the tricky part: evaluating SQLAlchemy expression against a python object
-                # For now, let's try a simplified approach:
-                # If we assume the expression is simple like `Model.field == value`
-                # We can try to extract the field name and value.
-                
-                try:
-                    # Very hacky way to extract data from BinaryExpression
-                    # left is InstrumentedAttribute, right is the value
-                    if hasattr(expression, 'left') and hasattr(expression, 'right'):
-                        field_name = expression.left.key
-                        target_value = expression.right.value
-                        
-                        record_value = getattr(record, field_name, None)
-                        # Handle basic string vs UUID comparison if needed
-                        if str(record_value) != str(target_value):
-                             match = False
-                             break
-                    # Handle .is_ (e.g., is_active is True) ???
-                    # SQLA `is_` usually creates a specialized operator.
-                    
-                except Exception as e:
-                    print(f"MockQuery Filter Error: {e}")
-                    pass
-            
-            if match:
-                results.append(record)
-        return results
+    def filter_by(self, **kwargs) -> "MockQuery":
+        self._stmt = self._stmt.filter_by(**kwargs)
+        return self
 
-    def first(self) -> Optional[T]:
-        records = MOCK_DB_STORE[self.model_name]
-        filtered = self._execute_filters(records)
-        return filtered[0] if filtered else None
+    def join(self, *args, **kwargs) -> "MockQuery":
+        self._stmt = self._stmt.join(*args, **kwargs)
+        return self
 
-    def all(self) -> List[T]:
-        records = MOCK_DB_STORE[self.model_name]
-        return self._execute_filters(records)
+    def order_by(self, *clauses) -> "MockQuery":
+        self._stmt = self._stmt.order_by(*clauses)
+        return self
 
-class MockSession:
-    def __init__(self):
-        self.new_objects = []
-        self.deleted_objects = []
-        
-    def query(self, model_class: Type[T]) -> MockQuery:
+    def limit(self, n: int) -> "MockQuery":
+        self._stmt = self._stmt.limit(n)
+        return self
+
+    def offset(self, n: int) -> "MockQuery":
+        self._stmt = self._stmt.offset(n)
+        return self
+
+    def all(self) -> list:
+        return self.session.execute(self._stmt).scalars().all()
+
+    def first(self):
+        return self.session.execute(self._stmt.limit(1)).scalars().first()
+
+    def one(self):
+        return self.session.execute(self._stmt).scalars().one()
+
+    def count(self) -> int:
+        return len(self.all())
+
+    def delete(self) -> int:
+        objs = self.all()
+        for obj in objs:
+            self.session.delete(obj)
+        self.session.flush()
+        return len(objs)
+
+
+class MockSession(_MockSessionCore):
+    """Stand-in for a synchronous Session (SessionLocal)."""
+
+    def query(self, model_class) -> MockQuery:
         return MockQuery(model_class, self)
-        
-    def add(self, obj: Any):
-        self.new_objects.append(obj)
-        
-    def delete(self, obj: Any):
-        # Find and remove from global store immediately or on commit?
-        # For simplicity, on commit
-        self.deleted_objects.append(obj)
-        
-    def commit(self):
-        # Persist new objects to global store
-        for obj in self.new_objects:
-            model_name = type(obj).__name__
-            if model_name not in MOCK_DB_STORE:
-                MOCK_DB_STORE[model_name] = []
-            
-            # Generate ID if missing (common for auto-increment/uuid)
-                import uuid
-                obj.id = str(uuid.uuid4())
-            
-            # Populate defaults if missing (created_at, is_active, etc.)
-            # This mimics server_default or standard default behavior
-            if hasattr(obj, '__table__'):
-                for col in obj.__table__.columns:
-                     val = getattr(obj, col.name, None)
-                     if val is None:
-                         if col.default is not None:
-                             # Python-side default
-                             if callable(col.default.arg):
-                                 setattr(obj, col.name, col.default.arg(None))
-                             else:
-                                 setattr(obj, col.name, col.default.arg)
-                         elif col.server_default is not None:
-                             # Server-side default (approximate for common cases)
-                             if "now" in str(col.server_default).lower():
-                                 from datetime import datetime
-                                 setattr(obj, col.name, datetime.now())
-                             elif "true" in str(col.server_default).lower():
-                                 setattr(obj, col.name, True)
-                             elif "false" in str(col.server_default).lower():
-                                 setattr(obj, col.name, False)
-                             
-            MOCK_DB_STORE[model_name].append(obj)
-            
-        self.new_objects = []
-        
-        # Remove deleted objects
-        # (Implementation skipped for now as we don't strictly need delete for this task)
-
-    def refresh(self, obj: Any):
-        # In a real DB, this reloads attributes. In memory, obj is already the reference.
-        pass
-
-    def close(self):
-        pass
-
-# Helper to clear/init store
-def reset_mock_db():
-    MOCK_DB_STORE.clear()
+
+    def execute(self, statement, params: Optional[dict] = None) -> MockResult:
+        return self._execute(statement, params)
+
+    def scalar(self, statement, params: Optional[dict] = None):
+        return self._execute(statement, params).scalar()
+
+    def scalars(self, statement, params: Optional[dict] = None) -> MockScalarResult:
+        return self._execute(statement, params).scalars()
+
+    def get(self, model, pk):
+        return self._get(model, pk)
+
+    def delete(self, obj) -> None:
+        self._delete(obj)
+
+    def flush(self) -> None:
+        self._flush()
+
+    def commit(self) -> None:
+        self._commit()
+
+    def rollback(self) -> None:
+        self._rollback()
+
+    def refresh(self, obj) -> None:
+        pass  # Objects are the stored rows themselves
+
+    def close(self) -> None:
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class MockAsyncSession(_MockSessionCore):
+    """Stand-in for AsyncSession (AsyncSessionLocal)."""
+
+    async def execute(self, statement, params: Optional[dict] = None) -> MockResult:
+        return self._execute(statement, params)
+
+    async def scalar(self, statement, params: Optional[dict] = None):
+        return self._execute(statement, params).scalar()
+
+    async def scalars(self, statement, params: Optional[dict] = None) -> MockScalarResult:
+        return self._execute(statement, params).scalars()
+
+    async def get(self, model, pk):
+        return self._get(model, pk)
+
+    async def delete(self, obj) -> None:
+        self._delete(obj)
+
+    async def flush(self) -> None:
+        self._flush()
+
+    async def commit(self) -> None:
+        self._commit()
+
+    async def rollback(self) -> None:
+        self._rollback()
+
+    async def refresh(self, obj) -> None:
+        pass  # Objects are the stored rows themselves
+
+    async def close(self) -> None:
+        self._close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
@@ -0,0 +1,140 @@
+"""
+Connection pool configuration and statistics.
+
+All engines are built from the DB_POOL_* settings. In PgBouncer / Supabase
+transaction-pooler mode (DB_POOLER_MODE=transaction, or "auto" on port 6543)
+server-side prepared statements are disabled, since a transaction pooler may
+hand every transaction a different backend connection.
+
+Pools are instrumented so /metrics shows checked-out connections, overflow,
+checkout wait time and timeouts per engine, which is what you need to size
+DB_POOL_SIZE against the number of workers.
+"""
+import threading
+import time
+import uuid
+from typing import Dict
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record(self, waited: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+
+# engine name -> stats / engine (engine.pool is read at scrape time, since dispose() replaces it)
+_stats: Dict[str, PoolStats] = {}
+_engines: Dict[str, object] = {}
+
+
+class _TimedCheckoutMixin:
+    """Measures how long each checkout waited for a free connection."""
+    stats_name = "default"
+
+    def _do_get(self):
+        stats = _stats.setdefault(self.stats_name, PoolStats())
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            stats.record(time.perf_counter() - started, timed_out=True)
+            raise
+        stats.record(time.perf_counter() - started)
+        return conn
+
+
+class InstrumentedQueuePool(_TimedCheckoutMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(_TimedCheckoutMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pooler_mode(database_url: str) -> str:
+    """'transaction' when talking to a transaction pooler (PgBouncer / Supabase :6543), else 'session'."""
+    mode = settings.DB_POOLER_MODE.lower()
+    if mode == "auto":
+        return "transaction" if ":6543" in database_url else "session"
+    return mode
+
+
+def engine_options(name: str, database_url: str, is_async: bool = False) -> dict:
+    """
+    Keyword arguments for create_engine / create_async_engine.
+    """
+    pool_class = InstrumentedAsyncAdaptedQueuePool if is_async else InstrumentedQueuePool
+    # Subclass per engine so each pool reports under its own name
+    pool_class = type(f"{pool_class.__name__}_{name}", (pool_class,), {"stats_name": name})
+
+    options = {
+        "poolclass": pool_class,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+    if pooler_mode(database_url) == "transaction":
+        if is_async:
+            # asyncpg prepares every statement by default; a transaction pooler may route the
+            # EXECUTE to a backend that never saw the PREPARE. Disable both statement caches and
+            # give any remaining prepared statement a unique name.
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+            }
+        # psycopg2 never uses server-side prepared statements. Session state (SET, advisory
+        # locks, LISTEN, startup "options") does not survive a transaction pooler either, so
+        # nothing on the request path relies on it.
+
+    return options
+
+
+def register_pool(name: str, engine) -> None:
+    """Track an engine's pool and expose its statistics on /metrics."""
+    _engines[name] = engine
+    _stats.setdefault(name, PoolStats())
+
+
+def pool_statistics() -> dict:
+    data = {}
+    for name, engine in list(_engines.items()):
+        pool = engine.pool
+        stats = _stats.setdefault(name, PoolStats())
+        data[name] = {
+            "pooler_mode": pooler_mode(str(engine.url)),
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "checkouts": stats.checkouts,
+            "timeouts": stats.timeouts,
+            "wait_avg_ms": round(stats.wait_total / stats.checkouts * 1000, 3) if stats.checkouts else 0.0,
+            "wait_max_ms": round(stats.wait_max * 1000, 3),
+        }
+    return data
+
+
+metrics.register_collector("db_pool", pool_statistics)
@@ -0,0 +1,191 @@
+"""
+Per-request database instrumentation.
+
+A sampled request (DB_QUERY_STATS_SAMPLE_RATE) gets a RequestQueryStats in a
+context variable; cursor hooks on every Engine (sync and async alike) then add
+each statement's duration to it. After the response:
+
+- totals go to /metrics ("db_queries" collector and db.* counters / timings),
+- statements slower than DB_SLOW_QUERY_MS are logged,
+- a statement pattern run DB_N_PLUS_ONE_THRESHOLD times or more within the
+  request is reported as a likely N+1,
+- with DB_QUERY_STATS_HEADER=true the response carries an X-DB-Stats header,
+  and a request sending "X-DB-Stats: 1" is always sampled.
+
+Unsampled requests only pay for one context variable lookup per statement.
+"""
+import random
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+HEADER = "X-DB-Stats"
+MAX_PATTERNS = 500  # Bound on the process-wide statement table
+
+_CAST = re.compile(r"::\w+(?:\s+WITH(?:OUT)?\s+TIME\s+ZONE)?(?:\[\])?", re.IGNORECASE)
+_PARAM = re.compile(r"\$\d+|%\([^)]*\)s|%s|\?|(?<!:):\w+|\b\d+\b|'(?:[^']|'')*'")
+_PARAM_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize(statement: str) -> str:
+    """Statement text with literals / bind parameters replaced by ?, so repeats share one pattern."""
+    pattern = _PARAM.sub("?", _CAST.sub("", _SPACE.sub(" ", statement).strip()))
+    return _PARAM_LIST.sub("(?)", pattern)
+
+
+class RequestQueryStats:
+    def __init__(self):
+        self.queries = 0
+        self.total_seconds = 0.0
+        self.patterns: Dict[str, List[float]] = {}  # pattern -> durations
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.queries += 1
+        self.total_seconds += seconds
+        self.patterns.setdefault(normalize(statement), []).append(seconds)
+
+    def slowest(self, n: int = 3) -> List[tuple]:
+        samples = [(max(durations), pattern) for pattern, durations in self.patterns.items()]
+        return sorted(samples, reverse=True)[:n]
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Patterns run at least `threshold` times - likely N+1 loops."""
+        return {p: len(d) for p, d in self.patterns.items() if len(d) >= threshold}
+
+    def header(self, threshold: int) -> str:
+        slowest = self.slowest(1)
+        return (
+            f"queries={self.queries};time_ms={self.total_seconds * 1000:.1f};"
+            f"slowest_ms={slowest[0][0] * 1000 if slowest else 0:.1f};"
+            f"n_plus_one={len(self.repeated(threshold))}"
+        )
+
+
+_current: ContextVar[Optional[RequestQueryStats]] = ContextVar("request_query_stats", default=None)
+
+
+class QueryStatsRecorder:
+    """Sampling decision plus the process-wide aggregate behind the "db_queries" collector."""
+
+    def __init__(self, sample_rate: float, slow_query_ms: float, n_plus_one_threshold: int):
+        self.sample_rate = sample_rate
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self._statements: Dict[str, dict] = {}  # pattern -> count / total / max / n_plus_one
+
+    def should_sample(self, forced: bool = False) -> bool:
+        return forced or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def start(self) -> tuple:
+        stats = RequestQueryStats()
+        return stats, _current.set(stats)
+
+    def finish(self, stats: RequestQueryStats, token, label: str) -> None:
+        _current.reset(token)
+        metrics.increment("db.requests_sampled")
+        metrics.increment("db.queries", stats.queries)
+        metrics.observe("db.request_time", stats.total_seconds)
+
+        repeated = stats.repeated(self.n_plus_one_threshold)
+        for pattern, count in repeated.items():
+            metrics.increment("db.n_plus_one")
+            print(f"Likely N+1 in {label}: {count}x {pattern[:200]}")
+        for seconds, pattern in stats.slowest(len(stats.patterns)):
+            if seconds * 1000 < self.slow_query_ms:
+                break
+            metrics.increment("db.slow_queries")
+            print(f"Slow query in {label} ({seconds * 1000:.0f} ms): {pattern[:200]}")
+
+        with self._lock:
+            for pattern, durations in stats.patterns.items():
+                entry = self._statements.get(pattern)
+                if entry is None:
+                    if len(self._statements) >= MAX_PATTERNS:
+                        # Make room by forgetting the least-run pattern
+                        del self._statements[min(self._statements, key=lambda p: self._statements[p]["count"])]
+                    entry = self._statements[pattern] = {
+                        "count": 0, "total_seconds": 0.0, "max_seconds": 0.0, "n_plus_one": 0
+                    }
+                entry["count"] += len(durations)
+                entry["total_seconds"] += sum(durations)
+                entry["max_seconds"] = max(entry["max_seconds"], max(durations))
+                if pattern in repeated:
+                    entry["n_plus_one"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            statements = [dict(entry, statement=pattern) for pattern, entry in self._statements.items()]
+
+        def summary(entry: dict) -> dict:
+            return {
+                "statement": entry["statement"][:300],
+                "count": entry["count"],
+                "avg_ms": round(entry["total_seconds"] / entry["count"] * 1000, 3),
+                "max_ms": round(entry["max_seconds"] * 1000, 3),
+                "n_plus_one_requests": entry["n_plus_one"],
+            }
+
+        return {
+            "sample_rate": self.sample_rate,
+            "slow_query_ms": self.slow_query_ms,
+            "n_plus_one_threshold": self.n_plus_one_threshold,
+            "slowest": [summary(e) for e in sorted(statements, key=lambda e: e["max_seconds"], reverse=True)[:10]],
+            "n_plus_one": [summary(e) for e in sorted(statements, key=lambda e: e["n_plus_one"], reverse=True)[:10]
+                           if e["n_plus_one"]],
+        }
+
+
+query_stats = QueryStatsRecorder(
+    sample_rate=settings.DB_QUERY_STATS_SAMPLE_RATE,
+    slow_query_ms=settings.DB_SLOW_QUERY_MS,
+    n_plus_one_threshold=settings.DB_N_PLUS_ONE_THRESHOLD
+)
+metrics.register_collector("db_queries", query_stats.stats)
+
+
+async def query_stats_middleware(request, call_next):
+    forced = settings.DB_QUERY_STATS_HEADER and request.headers.get(HEADER) == "1"
+    if not query_stats.should_sample(forced):
+        return await call_next(request)
+
+    stats, token = query_stats.start()
+    try:
+        response = await call_next(request)
+    finally:
+        query_stats.finish(stats, token, f"{request.method} {request.url.path}")
+    if settings.DB_QUERY_STATS_HEADER:
+        response.headers[HEADER] = stats.header(query_stats.n_plus_one_threshold)
+    return response
+
+
+# --- Cursor hooks (the async engines' sync_engine is an Engine too) ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("query_started")
+    if stats is not None and started:
+        stats.record(statement, time.perf_counter() - started.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _forget_failed(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
@@ -0,0 +1,143 @@
+"""
+Read-replica routing.
+
+Read-only endpoints (search, document / transcription list and get) take their
+session from get_read_db, which uses the DATABASE_REPLICA_URL engine unless:
+
+- no replica is configured,
+- the replica's lag is unknown or above REPLICA_MAX_LAG_SECONDS, or
+- the current user committed a write within REPLICA_READ_YOUR_WRITES_SECONDS
+  (or the measured lag, if larger), so they always see their own writes.
+
+Writes are detected by hooks on every ORM Session (flushes and INSERT / UPDATE /
+DELETE statements) and attributed to the user id that get_current_user stores in
+a context variable. Background tasks inherit that context, so an ingestion that
+finishes after the response also counts. Tracking is per worker process: a
+follow-up request served by another worker is only protected by the lag limit.
+"""
+import asyncio
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.db import session as db_session
+
+# Set by deps.get_current_user for the rest of the request (and its background tasks)
+current_user_id: ContextVar[Optional[str]] = ContextVar("current_user_id", default=None)
+
+LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+""")
+
+
+class ReplicaRouter:
+    def __init__(self, read_your_writes_seconds: float, max_lag_seconds: float):
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_seconds: Optional[float] = None  # None until measured, or when the replica is unreachable
+        self._last_write: Dict[str, float] = {}  # user id -> monotonic time of their last commit
+
+    @property
+    def enabled(self) -> bool:
+        return db_session.ReplicaSessionLocal is not None
+
+    def _window(self) -> float:
+        return max(self.read_your_writes_seconds, self.lag_seconds or 0.0)
+
+    def record_write(self, user_id: str) -> None:
+        now = time.monotonic()
+        self._last_write[user_id] = now
+        if len(self._last_write) > 10000:
+            window = self._window()
+            self._last_write = {u: t for u, t in self._last_write.items() if now - t < window}
+
+    def use_replica(self, user_id=None) -> bool:
+        if not self.enabled:
+            return False
+        if self.lag_seconds is None or self.lag_seconds > self.max_lag_seconds:
+            metrics.increment("db.reads.primary_replica_lagging")
+            return False
+        last = self._last_write.get(str(user_id)) if user_id else None
+        if last is not None and time.monotonic() - last < self._window():
+            metrics.increment("db.reads.primary_read_your_writes")
+            return False
+        metrics.increment("db.reads.replica")
+        return True
+
+    def session_factory(self, user_id=None):
+        return db_session.ReplicaSessionLocal if self.use_replica(user_id) else db_session.AsyncSessionLocal
+
+    async def measure_lag(self) -> Optional[float]:
+        try:
+            async with db_session.replica_async_engine.connect() as conn:
+                lag = float((await conn.execute(LAG_QUERY)).scalar() or 0.0)
+        except Exception as e:
+            print(f"Replica lag check failed: {e}")
+            lag = None
+        self.lag_seconds = lag
+        metrics.set_gauge("db.replica_lag_seconds", -1.0 if lag is None else lag)
+        return lag
+
+    async def run_lag_monitor(self, interval: float) -> None:
+        while True:
+            await self.measure_lag()
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "lag_seconds": self.lag_seconds,
+            "max_lag_seconds": self.max_lag_seconds,
+            "read_your_writes_seconds": self._window(),
+            "recent_writers": len(self._last_write),
+        }
+
+
+replica_router = ReplicaRouter(
+    read_your_writes_seconds=settings.REPLICA_READ_YOUR_WRITES_SECONDS,
+    max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS
+)
+metrics.register_collector("db_replica", replica_router.stats)
+
+
+# --- Write tracking (sync and async sessions share the Session events) ---
+
+def _is_write(state) -> bool:
+    if state.is_insert or state.is_update or state.is_delete:
+        return True
+    statement = state.statement
+    return isinstance(statement, TextClause) and statement.text.lstrip()[:6].upper() != "SELECT"
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_write_statement(state):
+    if _is_write(state):
+        state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _record_commit(session):
+    if session.info.pop("wrote", False):
+        user_id = current_user_id.get()
+        if user_id:
+            replica_router.record_write(user_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_rolled_back(session, previous_transaction):
+    session.info.pop("wrote", None)
@@ -1,18 +1,78 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.db.pool import engine_options, register_pool
 
 # Create the SQLAlchemy engine
-# pool_pre_ping=True helps prevent connection dropping issues
+# Pool sizing / pre-ping / pooler mode come from the DB_POOL_* settings (see app/db/pool.py)
+# Synchronous engine: used by scripts, migrations and background jobs that run in worker threads
 engine = create_engine(
-    settings.DATABASE_URL, 
-    pool_pre_ping=True
+    settings.DATABASE_URL,
+    **engine_options("primary_sync", settings.DATABASE_URL)
 )
+register_pool("primary_sync", engine)
 
 # Create a SessionLocal class
 # Each instance of this class will be a database session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def to_async_url(database_url: str):
+    """
+    Rewrites a postgres:// / postgresql:// URL for the asyncpg driver.
+    asyncpg does not understand libpq's 'sslmode' parameter, so it is mapped to 'ssl'.
+    """
+    url = make_url(database_url)
+    if url.drivername in ("postgres", "postgresql", "postgresql+psycopg2", "postgresql+psycopg"):
+        url = url.set(drivername="postgresql+asyncpg")
+    query = dict(url.query)
+    if "sslmode" in query:
+        query["ssl"] = query.pop("sslmode")
+        url = url.set(query=query)
+    return url
+
+
+# Async engine: used by the API request path so DB I/O never blocks the event loop
+async_engine = create_async_engine(
+    to_async_url(settings.DATABASE_URL),
+    **engine_options("primary", settings.DATABASE_URL, is_async=True)
+)
+register_pool("primary", async_engine.sync_engine)
+
+# expire_on_commit=False: attributes stay readable after commit without an implicit
+# (and, under asyncio, illegal) lazy reload
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+# Offline mode: sessions run against the in-memory store instead (engines are never connected)
+if settings.USE_MOCK_DB:
+    from app.db.mock_session import MockSession, MockAsyncSession
+    SessionLocal = MockSession
+    AsyncSessionLocal = MockAsyncSession
+
+# Optional read replica: read-only endpoints are routed here by app/db/replica.py
+replica_async_engine = None
+ReplicaSessionLocal = None
+if settings.DATABASE_REPLICA_URL and not settings.USE_MOCK_DB:
+    replica_async_engine = create_async_engine(
+        to_async_url(settings.DATABASE_REPLICA_URL),
+        **engine_options("replica", settings.DATABASE_REPLICA_URL, is_async=True)
+    )
+    register_pool("replica", replica_async_engine.sync_engine)
+
+    ReplicaSessionLocal = async_sessionmaker(
+        bind=replica_async_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False
+    )
+
 def get_db():
     """
     Dependency to get a database session for API requests.
@@ -23,3 +83,4 @@ def get_db():
         yield db
     finally:
         db.close()
+
@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,7 +14,7 @@ app = FastAPI(
 
 # Database initialization moved to init_db.py script
 # This prevents pgvector extension errors on startup
-# Run: python init_db.py before starting the server
+# Run: python init_db.py (or python migrate.py upgrade) before starting the server
 from app.db.session import engine
 from app.models import models
 
@@ -37,6 +38,10 @@ from fastapi import Request
 from fastapi.responses import JSONResponse
 import traceback
 
+# Sampled per-request query count / DB time / N+1 detection (see app/db/query_stats.py)
+from app.db.query_stats import query_stats_middleware
+app.middleware("http")(query_stats_middleware)
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     error_msg = f"Global Error: {str(exc)}\n{traceback.format_exc()}"
@@ -66,8 +71,30 @@ app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
 async def health_check():
     return {"status": "healthy"}
 
+from app.core.metrics import metrics
+
+@app.get("/metrics")
+async def get_metrics():
+    """In-process counters, timings and collector stats for this worker."""
+    return metrics.snapshot()
+
+from app.db.replica import replica_router
+from app.core.config import settings
+
 @app.on_event("startup")
 async def startup_db():
     print("--- ACCESS.AI BACKEND STARTED ---")
     print("Database: Connected")
+    if replica_router.enabled:
+        # Reads stay on the primary until the first lag measurement succeeds
+        app.state.replica_lag_monitor = asyncio.create_task(
+            replica_router.run_lag_monitor(settings.REPLICA_LAG_CHECK_INTERVAL)
+        )
+        print("Read replica: enabled")
     print("---------------------------------")
+
+@app.on_event("shutdown")
+async def shutdown_storage():
+    from app.services.storage import storage_service
+    # Close the pooled keep-alive connections to the storage backend
+    await storage_service.aclose()
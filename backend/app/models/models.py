@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Float, Integer
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Text, Float, Integer, BigInteger, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.sql import func
@@ -24,7 +24,8 @@ class User(Base):
     # Auth & Security
     biometric_registered = Column(Boolean, default=False)
     face_id_registered = Column(Boolean, default=False)
-    face_id_data = Column(Text, nullable=True) # Storing face encoding/data (encrypted ideally)
+    face_id_data = Column(Text, nullable=True) # Legacy raw signature; new registrations only store the digest
+    face_id_digest = Column(String(64), nullable=True) # SHA-256 hex of the signature (security.face_signature_digest)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -40,7 +41,7 @@ class Document(Base):
     title = Column(String, nullable=False)
     file_path = Column(String, nullable=False) # Local path or S3 URL
     file_type = Column(String, nullable=False) # pdf, txt, etc.
-    content_text = Column(Text, nullable=True) # Extracted raw text
+    content_text = Column(Text, nullable=True) # Extracted raw text (legacy; new documents keep it per page in document_pages)
     
     # RAG Metadata
     status = Column(String, default="processing")
@@ -49,9 +50,64 @@ class Document(Base):
     
     # Vector Embedding for Semantic Search (1536 dims for OpenAI text-embedding-3-small)
     embedding = Column(Vector(1536))
+
+    # Stored file, shared with every other document of the same content (NULL for legacy uploads)
+    blob_sha256 = Column(String(64), ForeignKey("blobs.sha256"), nullable=True)
+
+    # Batch upload this document came in with, if any (progress: GET /documents/batches/{id})
+    batch_id = Column(UUID(as_uuid=True), ForeignKey("upload_batches.id"), nullable=True)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class Blob(Base):
+    """
+    One stored file per distinct content (SHA-256), shared by all documents with that content.
+    See app/services/blob_service.py.
+    """
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    file_path = Column(String, nullable=False)  # Local path or storage URL
+    file_type = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # Documents pointing here; 0 = garbage
+
+    # Document whose extracted text and embedded chunks are copied to new duplicates
+    # (plain column: documents.blob_sha256 already references this table)
+    ingested_document_id = Column(UUID(as_uuid=True), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class DocumentPage(Base):
+    """
+    Extracted text of one page of a document, for range reads
+    (GET /documents/{id}/pages?from=&to=) without loading the whole text.
+    """
+    __tablename__ = "document_pages"
+    __table_args__ = (
+        # Also serves the range reads: WHERE document_id = ? AND page_number BETWEEN ? AND ?
+        UniqueConstraint("document_id", "page_number", name="uq_document_pages_document_page"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+    page_number = Column(Integer, nullable=False)  # 1-based, as in chunk citations
+    text_content = Column(Text, nullable=False)
+
+class UploadBatch(Base):
+    """
+    One batch upload (POST /documents/batch). Progress is aggregated from the status of
+    its documents; files rejected before storage are listed here.
+    """
+    __tablename__ = "upload_batches"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    total = Column(Integer, nullable=False)  # Files received, accepted or not
+    rejected = Column(JSONB, default=[])  # [{filename: "...", detail: "..."}]
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class AccessDocumentChunk(Base):
     """
     Stores chunks of text from documents and their vector embeddings.
@@ -70,6 +126,10 @@ class AccessDocumentChunk(Base):
     # Metadata for citations (e.g. page number)
     page_number = Column(Integer, nullable=True)
 
+    # Denormalised documents.user_id: tenant filter for search and the hash-partition key
+    # when CHUNK_PARTITIONS > 0 (see migrations/versions/0005_partition_document_chunks.py)
+    owner_id = Column(UUID(as_uuid=True), nullable=True)
+
 class FormSubmission(Base):
     """
     Stores AI-extracted form data.
@@ -120,3 +180,79 @@ class Transcription(Base):
     processed = Column(Boolean, default=False)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ChatSession(Base):
+    """
+    Server-side memory for document chat, one row per (user, document).
+    Recent turns are kept verbatim; older turns are folded into a rolling summary.
+    """
+    __tablename__ = "chat_sessions"
+    __table_args__ = (
+        UniqueConstraint("user_id", "document_id", name="uq_chat_sessions_user_document"),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
+
+    summary = Column(Text, nullable=True)  # Rolling summary of turns no longer kept verbatim
+    turns = Column(JSONB, default=[])  # [{question: "...", answer: "..."}] most recent last
+    turn_count = Column(Integer, default=0)  # Total turns ever, including summarised ones
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class RefreshToken(Base):
+    """
+    Long-lived refresh tokens, stored as SHA-256 hashes.
+    Every refresh rotates the token; all tokens issued from one login share a family_id,
+    so reuse of an already-rotated token revokes the whole family.
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    token_hash = Column(String(64), unique=True, nullable=False)  # hex SHA-256 of the token
+    family_id = Column(UUID(as_uuid=True), nullable=False, index=True)
+
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+    replaced_by = Column(UUID(as_uuid=True), nullable=True)  # The token this one was rotated into
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+# --- Secondary indexes for hot list / join / lookup queries ---
+# Created online by migrations/versions/0003_hot_query_indexes.py (CREATE INDEX CONCURRENTLY)
+
+# Document list: WHERE user_id = ? ORDER BY created_at DESC
+Index("ix_documents_user_id_created_at", Document.user_id, Document.created_at.desc())
+
+# Blob reference lookups (next chunk-set holder on delete): WHERE blob_sha256 = ?
+Index("ix_documents_blob_sha256", Document.blob_sha256)
+
+# Batch progress: WHERE batch_id = ?
+Index("ix_documents_batch_id", Document.batch_id)
+
+# Transcription list: WHERE user_id = ? ORDER BY created_at DESC
+Index("ix_transcriptions_user_id_created_at", Transcription.user_id, Transcription.created_at.desc())
+
+# RAG retrieval / chunk cascade: WHERE document_id = ?
+Index("ix_document_chunks_document_id", AccessDocumentChunk.document_id, AccessDocumentChunk.chunk_index)
+
+# Tenant-scoped search: WHERE owner_id = ?
+Index("ix_document_chunks_owner_id", AccessDocumentChunk.owner_id)
+
+# Form history: WHERE user_id = ? ORDER BY created_at DESC
+Index("ix_form_submissions_user_id_created_at", FormSubmission.user_id, FormSubmission.created_at.desc())
+
+# Biometric 1:N identification: WHERE face_id_digest = ? (fixed-length btree, one user per signature)
+Index(
+    "ix_users_face_id_digest",
+    User.face_id_digest,
+    unique=True,
+    postgresql_where=User.face_id_digest.isnot(None)
+)
+
+# Biometric fallback: first user WHERE face_id_registered
+Index("ix_users_face_id_registered", User.id, postgresql_where=User.face_id_registered == True)
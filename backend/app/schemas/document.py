@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
 from typing import Optional, List
 
@@ -16,11 +16,22 @@ class Document(DocumentBase):
     pages: Optional[int] = None
     summary: Optional[str] = None
     file_path: Optional[str] = None  # Changed from 'url' to match ORM
-    content_text: Optional[str] = None  # Added content_text for Smart View
+    content_text: Optional[str] = None  # Full text, only with ?include_text=true (Smart View reads /pages)
 
     class Config:
         from_attributes = True
 
+class PageText(BaseModel):
+    page_number: int
+    text: str
+
+class DocumentPages(BaseModel):
+    document_id: str
+    page_count: int  # 0 while the document is processing
+    from_: int = Field(alias="from")
+    to: Optional[int] = None  # Last page returned
+    pages: List[PageText]
+
 class SearchResult(BaseModel):
     id: str
     document_id: str
@@ -0,0 +1,158 @@
+"""
+Semantic Answer Cache - reuses chat answers for near-identical questions.
+
+Entries are scoped to a (doc_id, document version) pair and matched on the
+cosine similarity of the query embedding. Each entry expires after a TTL and
+the cache evicts least-recently-used entries once it is full.
+
+A bucket keeps its query embeddings normalised, as the rows of one NumPy
+matrix, so a lookup scores the whole bucket with one matrix-vector product
+instead of a Python loop over 1536-dim lists.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+def _unit(vector: List[float]) -> np.ndarray:
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else v
+
+
+class CachedAnswer:
+    __slots__ = ("query", "response", "created_at", "expires_at")
+
+    def __init__(self, query: str, response: Dict, ttl: float):
+        self.query = query
+        self.response = response
+        self.created_at = time.monotonic()
+        self.expires_at = self.created_at + ttl
+
+
+class _Bucket:
+    """The answers of one (doc_id, version): row i of vectors / expires_at belongs to ids[i]."""
+
+    def __init__(self, dims: int):
+        self.ids: List[int] = []
+        self.entries: Dict[int, CachedAnswer] = {}
+        self.vectors = np.empty((0, dims), dtype=np.float32)  # Unit-length query embeddings
+        self.expires_at = np.empty(0)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entry_id: int, entry: CachedAnswer, unit_vector: np.ndarray) -> None:
+        self.ids.append(entry_id)
+        self.entries[entry_id] = entry
+        self.vectors = np.vstack([self.vectors, unit_vector])
+        self.expires_at = np.append(self.expires_at, entry.expires_at)
+
+    def remove(self, entry_ids: List[int]) -> None:
+        drop = set(entry_ids)
+        keep = [i for i, entry_id in enumerate(self.ids) if entry_id not in drop]
+        self.ids = [self.ids[i] for i in keep]
+        for entry_id in drop:
+            self.entries.pop(entry_id, None)
+        self.vectors = self.vectors[keep]
+        self.expires_at = self.expires_at[keep]
+
+
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1000,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._buckets: Dict[Tuple[str, str], _Bucket] = {}
+        # Global LRU order across all buckets: entry_id -> bucket key
+        self._lru: "OrderedDict[int, Tuple[str, str]]" = OrderedDict()
+        self._next_id = 0
+
+    def lookup(self, doc_id: str, version: str, vector: List[float]) -> Optional[Dict]:
+        """Return the cached response for the most similar query, if above threshold."""
+        key = (str(doc_id), version)
+        now = time.monotonic()
+        query = _unit(vector)
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            expired = [bucket.ids[i] for i in np.flatnonzero(bucket.expires_at <= now)] if bucket else []
+            if expired:
+                self._remove(expired, key)
+                bucket = self._buckets.get(key)
+            if not bucket:
+                metrics.increment("answer_cache.misses")
+                return None
+
+            scores = bucket.vectors @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                metrics.increment("answer_cache.misses")
+                return None
+
+            best_id = bucket.ids[best]
+            self._lru.move_to_end(best_id)
+            metrics.increment("answer_cache.hits")
+            return bucket.entries[best_id].response
+
+    def store(self, doc_id: str, version: str, query: str, vector: List[float], response: Dict) -> None:
+        key = (str(doc_id), version)
+        unit_vector = _unit(vector)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            bucket = self._buckets.setdefault(key, _Bucket(len(unit_vector)))
+            bucket.add(entry_id, CachedAnswer(query, response, self.ttl_seconds), unit_vector)
+            self._lru[entry_id] = key
+
+            while len(self._lru) > self.max_entries:
+                oldest_id, oldest_key = next(iter(self._lru.items()))
+                self._remove([oldest_id], oldest_key)
+                metrics.increment("answer_cache.evictions")
+
+    def invalidate(self, doc_id: str) -> None:
+        """Drop every cached answer for a document (all versions)."""
+        doc_id = str(doc_id)
+        with self._lock:
+            for key in [k for k in self._buckets if k[0] == doc_id]:
+                self._remove(list(self._buckets[key].ids), key)
+
+    def _remove(self, entry_ids: List[int], key: Tuple[str, str]) -> None:
+        # Caller must hold the lock
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.remove(entry_ids)
+            if not bucket:
+                del self._buckets[key]
+        for entry_id in entry_ids:
+            self._lru.pop(entry_id, None)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._lru),
+                "documents": len({k[0] for k in self._buckets}),
+                "max_entries": self.max_entries,
+                "similarity_threshold": self.similarity_threshold,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+answer_cache = SemanticAnswerCache(
+    similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+)
+metrics.register_collector("answer_cache", answer_cache.stats)
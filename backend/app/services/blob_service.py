@@ -0,0 +1,119 @@
+"""
+Blob Service - content-addressed storage for uploaded files.
+
+Uploads are hashed (SHA-256) while being streamed from the request's spool
+file, before anything is stored. Each distinct content is stored once, named
+<sha256>.<ext>, and described by a Blob row whose ref_count is the number of
+documents pointing at it. The blob also records the first document ingested
+from it (ingested_document_id). A duplicate upload copies that document's
+extracted text and embedded chunks instead of parsing and embedding the file
+again (see DocumentService.upload_document).
+
+Deleting a document releases its reference. A blob with no references left is
+deleted together with its stored object.
+
+Created / reused / collected counts are on /metrics ("blobs.*").
+"""
+import uuid
+from typing import Optional, Tuple
+
+from fastapi import UploadFile
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.metrics import metrics
+from app.models.models import Blob, Document as DocumentModel
+from app.services.storage import UploadStream, storage_service
+
+
+class BlobService:
+    async def hash_upload(self, file: UploadFile) -> Tuple[str, int]:
+        """(sha256, size) of an upload, read in STORAGE_CHUNK_SIZE chunks from its local spool file."""
+        stream = UploadStream(file)
+        async for _ in stream:
+            pass
+        return stream.sha256, stream.size
+
+    async def get(self, db: AsyncSession, sha256: str) -> Optional[Blob]:
+        result = await db.execute(select(Blob).where(Blob.sha256 == sha256))
+        return result.scalars().first()
+
+    async def acquire(self, db: AsyncSession, sha256: str, file: UploadFile, file_ext: str) -> Blob:
+        """
+        Takes a reference to the blob with this content, storing the file first if the
+        content is new. Commits.
+        """
+        while True:
+            # Atomic increment: blocks behind a concurrent collect() of the same blob
+            result = await db.execute(
+                update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count + 1)
+            )
+            if result.rowcount:
+                await db.commit()
+                metrics.increment("blobs.reused")
+                return await self.get(db, sha256)
+            await db.rollback()
+
+            stored = await storage_service.upload(file, f"{sha256}.{file_ext}")
+            blob = Blob(sha256=sha256, file_path=stored.path, file_type=file_ext, size=stored.size, ref_count=1)
+            db.add(blob)
+            try:
+                await db.commit()
+            except IntegrityError:
+                # The same content was uploaded concurrently (same object name): reference theirs
+                await db.rollback()
+                continue
+            metrics.increment("blobs.created")
+            return blob
+
+    async def mark_ingested(self, db: AsyncSession, sha256: str, doc_id: str) -> None:
+        """Records doc_id as the source of text and chunks for future duplicates, unless there already is one."""
+        await db.execute(
+            update(Blob)
+            .where(Blob.sha256 == sha256, Blob.ingested_document_id.is_(None))
+            .values(ingested_document_id=doc_id)
+        )
+        await db.commit()
+
+    async def release(self, db: AsyncSession, sha256: str, doc_id: uuid.UUID) -> None:
+        """
+        Drops the reference held by doc_id, in the caller's transaction (the document delete),
+        then collects the blob if nothing references it any more.
+        """
+        await db.execute(update(Blob).where(Blob.sha256 == sha256).values(ref_count=Blob.ref_count - 1))
+        blob = await self.get(db, sha256)
+        if blob is not None and blob.ingested_document_id == doc_id:
+            # Hand the chunk set over to another ready document with the same content, if any
+            result = await db.execute(
+                select(DocumentModel.id)
+                .where(DocumentModel.blob_sha256 == sha256, DocumentModel.id != doc_id, DocumentModel.status == "ready")
+                .limit(1)
+            )
+            blob.ingested_document_id = result.scalars().first()
+        await db.commit()
+        await self.collect(db, sha256)
+
+    async def collect(self, db: AsyncSession, sha256: str) -> bool:
+        """Deletes the blob and its stored object if its ref_count is 0. Returns whether it did."""
+        result = await db.execute(
+            select(Blob).where(Blob.sha256 == sha256, Blob.ref_count <= 0).with_for_update()
+        )
+        blob = result.scalars().first()
+        if blob is None:
+            await db.rollback()
+            return False
+        # The row lock is held until commit, so a concurrent acquire() waits and then stores the file again
+        try:
+            await storage_service.delete(blob.file_path)
+        except Exception as e:
+            print(f"Blob GC Error ({sha256}): {e}")
+            await db.rollback()
+            return False
+        await db.delete(blob)
+        await db.commit()
+        metrics.increment("blobs.collected")
+        return True
+
+
+blob_service = BlobService()
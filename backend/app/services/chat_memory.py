@@ -0,0 +1,127 @@
+"""
+Chat Memory Service - bounded server-side conversation memory for document chat.
+
+Each (user, document) pair has one ChatSession row. The most recent turns are
+kept verbatim within CHAT_MEMORY_TOKEN_BUDGET; older turns are folded into a
+rolling summary capped at CHAT_MEMORY_SUMMARY_TOKENS, so both the stored state
+and the prompt stay bounded however long the conversation runs.
+"""
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.models import ChatSession
+from app.services.context_packer import ContextPacker
+
+# summarize(previous_summary, turns_to_fold) -> new summary
+Summarizer = Callable[[Optional[str], List[Dict]], Awaitable[str]]
+
+
+class ChatMemoryService:
+    def __init__(self, token_budget: int, summary_tokens: int):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.counter = ContextPacker(model_name=settings.LLM_MODEL, token_budget=token_budget)
+
+    async def get_session(self, db: AsyncSession, user_id: uuid.UUID, doc_id: str) -> Optional[ChatSession]:
+        result = await db.execute(
+            select(ChatSession).where(
+                ChatSession.user_id == user_id,
+                ChatSession.document_id == doc_id
+            )
+        )
+        return result.scalars().first()
+
+    def has_history(self, session: Optional[ChatSession]) -> bool:
+        return bool(session and (session.turns or session.summary))
+
+    def turn_tokens(self, turn: Dict) -> int:
+        return self.counter.count_tokens(turn.get("question", "")) + self.counter.count_tokens(turn.get("answer", ""))
+
+    def transcript(self, session: Optional[ChatSession]) -> str:
+        """Plain-text view of the memory, used for question condensing."""
+        if not self.has_history(session):
+            return ""
+        lines = []
+        if session.summary:
+            lines.append(f"Summary of earlier conversation: {session.summary}")
+        for turn in session.turns or []:
+            lines.append(f"User: {turn['question']}")
+            lines.append(f"Assistant: {turn['answer']}")
+        return "\n".join(lines)
+
+    async def record_turn(
+        self,
+        db: AsyncSession,
+        user_id: uuid.UUID,
+        doc_id: str,
+        question: str,
+        answer: str,
+        summarize: Summarizer
+    ) -> ChatSession:
+        while True:
+            session = await self.get_session(db, user_id, doc_id)
+            created = session is None
+            if created:
+                session = ChatSession(user_id=user_id, document_id=doc_id, turns=[], turn_count=0)
+                db.add(session)
+            await self._append(session, question, answer, summarize)
+            try:
+                await db.commit()
+                return session
+            except IntegrityError:
+                # A concurrent first question (double submit, second tab) created the session
+                # first: append to that one instead
+                await db.rollback()
+                if not created:
+                    raise
+
+    async def _append(self, session: ChatSession, question: str, answer: str, summarize: Summarizer) -> None:
+        turns = list(session.turns or [])
+        turns.append({"question": question, "answer": answer})
+
+        # Fold the oldest turns into the summary until the verbatim window fits the budget.
+        # The newest turn is always kept verbatim.
+        to_fold = []
+        while len(turns) > 1 and sum(self.turn_tokens(t) for t in turns) > self.token_budget:
+            to_fold.append(turns.pop(0))
+
+        if to_fold:
+            try:
+                summary = await summarize(session.summary, to_fold)
+            except Exception as e:
+                print(f"Chat memory summarisation failed, keeping a truncated transcript: {e}")
+                folded = " ".join(f"Q: {t['question']} A: {t['answer']}" for t in to_fold)
+                summary = f"{session.summary or ''} {folded}".strip()
+            session.summary = self._cap_summary(summary)
+
+        # Reassign (not mutate) so SQLAlchemy detects the JSONB change
+        session.turns = turns
+        session.turn_count = (session.turn_count or 0) + 1
+
+    def _cap_summary(self, summary: str) -> str:
+        """Keeps the most recent part of an over-long summary within the summary budget."""
+        if self.counter.count_tokens(summary) <= self.summary_tokens:
+            return summary
+        words = summary.split()
+        while words and self.counter.count_tokens(" ".join(words)) > self.summary_tokens:
+            words = words[max(1, len(words) // 8):]
+        return " ".join(words)
+
+    async def clear(self, db: AsyncSession, user_id: uuid.UUID, doc_id: str) -> bool:
+        session = await self.get_session(db, user_id, doc_id)
+        if not session:
+            return False
+        await db.delete(session)
+        await db.commit()
+        return True
+
+
+chat_memory = ChatMemoryService(
+    token_budget=settings.CHAT_MEMORY_TOKEN_BUDGET,
+    summary_tokens=settings.CHAT_MEMORY_SUMMARY_TOKENS
+)
@@ -0,0 +1,99 @@
+"""
+Context Packer - fits retrieved snippets into a fixed token budget.
+
+Snippets are added greedily in order of relevance. A snippet that does not fit
+whole is trimmed at a sentence boundary so the prompt never exceeds the budget.
+"""
+import re
+from typing import List, Optional
+
+import tiktoken
+
+from app.schemas.document import SearchResult
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+SNIPPET_SEPARATOR = "\n\n"
+
+
+class PackedContext:
+    def __init__(self, text: str, tokens: int, results: List[SearchResult], trimmed: int):
+        self.text = text
+        self.tokens = tokens
+        self.results = results  # Snippets that made it into the context (possibly trimmed)
+        self.trimmed = trimmed
+
+
+class ContextPacker:
+    def __init__(self, model_name: str, token_budget: int, min_snippet_tokens: int = 32):
+        self.model_name = model_name
+        self.token_budget = token_budget
+        self.min_snippet_tokens = min_snippet_tokens
+        self._encoding = None
+
+    @property
+    def encoding(self) -> Optional["tiktoken.Encoding"]:
+        if self._encoding is None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(self.model_name)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                # Encoding files could not be loaded (e.g. offline); fall back to an estimate
+                print(f"Tiktoken unavailable, estimating token counts: {e}")
+                self._encoding = False
+        return self._encoding or None
+
+    def count_tokens(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding is None:
+            return max(1, len(text) // 4)
+        return len(self.encoding.encode(text))
+
+    def format_snippet(self, result: SearchResult, snippet: Optional[str] = None) -> str:
+        return f"[Page {result.page}] {snippet if snippet is not None else result.snippet}"
+
+    def trim_to_sentences(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of whole sentences that fits in max_tokens."""
+        kept = []
+        used = 0
+        for sentence in SENTENCE_BOUNDARY.split(text.strip()):
+            cost = self.count_tokens(sentence if not kept else " " + sentence)
+            if used + cost > max_tokens:
+                break
+            kept.append(sentence)
+            used += cost
+        return " ".join(kept)
+
+    def pack(self, results: List[SearchResult]) -> PackedContext:
+        blocks: List[str] = []
+        packed: List[SearchResult] = []
+        used = 0
+        trimmed = 0
+        separator_tokens = self.count_tokens(SNIPPET_SEPARATOR)
+
+        for result in sorted(results, key=lambda r: r.relevance, reverse=True):
+            overhead = separator_tokens if blocks else 0
+            remaining = self.token_budget - used - overhead
+            if remaining < self.min_snippet_tokens:
+                break
+
+            block = self.format_snippet(result)
+            cost = self.count_tokens(block)
+            if cost > remaining:
+                prefix_tokens = self.count_tokens(self.format_snippet(result, ""))
+                snippet = self.trim_to_sentences(result.snippet, remaining - prefix_tokens)
+                if not snippet:
+                    continue
+                block = self.format_snippet(result, snippet)
+                cost = self.count_tokens(block)
+                if cost > remaining:
+                    continue
+                result = result.model_copy(update={"snippet": snippet})
+                trimmed += 1
+
+            blocks.append(block)
+            packed.append(result)
+            used += cost + overhead
+
+        return PackedContext(SNIPPET_SEPARATOR.join(blocks), used, packed, trimmed)
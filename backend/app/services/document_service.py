@@ -1,70 +1,81 @@
-import shutil
+import asyncio
 import os
+import tempfile
 import uuid
+import zipfile
 from datetime import datetime
 from fastapi import UploadFile, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 import uuid
+from app.core.config import settings
+from app.core.metrics import metrics
 from app.models.models import Document as DocumentModel  # ORM model, NOT Pydantic schema
+from app.models.models import DocumentPage, UploadBatch
+from app.services.upload_validation import DOCUMENT_EXTENSIONS
 # Removed circular import - rag_service will be called via background task instead
 
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
 # In-memory store for MVP (replace with DB later)
 documents_db = []
 
+# Document metadata without the extracted text (which can be megabytes): lists and get_document
+_METADATA_COLUMNS = (
+    DocumentModel.id, DocumentModel.title, DocumentModel.file_type, DocumentModel.status,
+    DocumentModel.created_at, DocumentModel.pages, DocumentModel.summary, DocumentModel.file_path,
+)
+
 class DocumentService:
-    async def upload_document(self, db: Session, file: UploadFile, user_id: uuid.UUID) -> dict:
-        # 1. Save File to Storage (Supabase)
+    def __init__(self):
+        # Batch ingestion (ingest_batch) runs at most this many documents at once per worker
+        self._ingest_slots = asyncio.Semaphore(settings.BATCH_INGEST_CONCURRENCY)
+
+    async def upload_document(self, db: AsyncSession, file: UploadFile, user_id: uuid.UUID) -> dict:
+        # 1. Validate the content (type, size, PDF structure) before storing anything
         file_id = str(uuid.uuid4())
         file_ext = file.filename.split(".")[-1]
         
-        # Use storage service
+        from app.services.upload_validation import upload_validator
+        await upload_validator.validate(file, file_ext)
+        
+        # 2. Hash the upload and store it once per distinct content (see blob_service)
+        from app.services.blob_service import blob_service
         try:
-            from app.services.storage import storage_service
-            # If storage credentials are not set, this might fail or fallback if we added logic
-            # But assumes env vars are set for production/render
-            if storage_service.supabase:
-                file_path = await storage_service.upload_file(file, f"{file_id}.{file_ext}")
-            else:
-                # Fallback to local for dev if no supabase keys (optional, but safer to stick to one)
-                print("WARNING: Supabase not configured, using local storage (files will be lost on restart)")
-                file_path = f"{UPLOAD_DIR}/{file_id}.{file_ext}"
-                with open(file_path, "wb") as buffer:
-                    # Reset file position just in case
-                    await file.seek(0)
-                    shutil.copyfileobj(file.file, buffer)
+            sha256, size = await blob_service.hash_upload(file)
+            blob = await blob_service.acquire(db, sha256, file, file_ext)
+            file_path = blob.file_path
+            print(f"Stored {file.filename}: {size} bytes, sha256 {sha256}")
         except Exception as e:
             print(f"Storage Error: {e}")
             raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
             
-        # 2. Save Metadata to DB using RAW SQL (bypass ORM entirely)
+        # 3. Save Metadata to DB using RAW SQL (bypass ORM entirely)
         from sqlalchemy import text
         from datetime import datetime
         
-        db.execute(text("""
-            INSERT INTO documents (id, user_id, title, file_path, file_type, status, created_at)
-            VALUES (:id, :user_id, :title, :file_path, :file_type, :status, :created_at)
-        """), {
-            "id": file_id,
-            "user_id": str(user_id),
-            "title": file.filename,
-            "file_path": file_path,
-            "file_type": file_ext,
-            "status": "ready",
-            "created_at": datetime.now()
-        })
-        db.commit()
-        
-        # 3. Trigger RAG Ingestion in Background
-        # Import here to avoid circular dependency
-        from app.services.rag_service import rag_service
         try:
-            await rag_service.ingest_document(db, file_id)
-        except Exception as e:
-            print(f"RAG Ingestion Error: {e}")
-            # Don't fail upload if ingestion fails
+            await db.execute(text("""
+                INSERT INTO documents (id, user_id, title, file_path, file_type, status, blob_sha256, created_at)
+                VALUES (:id, :user_id, :title, :file_path, :file_type, :status, :blob_sha256, :created_at)
+            """), {
+                "id": file_id,
+                "user_id": str(user_id),
+                "title": file.filename,
+                "file_path": file_path,
+                "file_type": file_ext,
+                "status": "ready",
+                "blob_sha256": sha256,
+                "created_at": datetime.now()
+            })
+            await db.commit()
+        except Exception:
+            # No document holds the blob reference taken above: give it back so the blob can be collected
+            await db.rollback()
+            await blob_service.release(db, sha256, file_id)
+            raise
+        
+        # 4. Trigger RAG Ingestion in Background
+        await self._ingest(db, file_id, sha256, file_ext)
         
         # Return dict instead of ORM model
         return {
@@ -76,10 +87,177 @@ class DocumentService:
             "created_at": datetime.now().isoformat()  # Convert to ISO string
         }
 
-    async def get_documents(self, db: Session, user_id: uuid.UUID) -> list[dict]:
-        docs = db.query(DocumentModel).filter(DocumentModel.user_id == user_id).order_by(DocumentModel.created_at.desc()).all()
-        # Convert ORM objects to dicts
-        return [{
+    async def _ingest(self, db: AsyncSession, doc_id: str, sha256: str, file_ext: str) -> None:
+        # Import here to avoid circular dependency
+        from app.services.blob_service import blob_service
+        from app.services.rag_service import rag_service
+        # Same content already ingested: copy its text and chunks, no model calls
+        blob = await blob_service.get(db, sha256)
+        if blob and blob.ingested_document_id and blob.file_type.lower() == file_ext.lower():
+            if await rag_service.copy_ingestion(db, blob.ingested_document_id, doc_id):
+                metrics.increment("blobs.ingestion_copies")
+                return
+        try:
+            if await rag_service.ingest_document(db, doc_id):
+                await blob_service.mark_ingested(db, sha256, doc_id)
+        except Exception as e:
+            print(f"RAG Ingestion Error: {e}")
+            # Don't fail upload if ingestion fails
+
+    async def unpack_zip(self, archive: UploadFile) -> tuple[list[UploadFile], list[dict]]:
+        """
+        Members of a zip archive as spooled UploadFiles (the caller closes them), plus
+        rejections for members that are not PDF / TXT. Directories and macOS metadata are skipped.
+        """
+        def unpack():
+            files, rejected = [], []
+            try:
+                zf = zipfile.ZipFile(archive.file)
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{archive.filename} is not a valid zip archive")
+            with zf:
+                members = [
+                    info for info in zf.infolist()
+                    if not info.is_dir() and "__MACOSX/" not in info.filename
+                    and not os.path.basename(info.filename).startswith(".")
+                ]
+                if len(members) > settings.BATCH_MAX_FILES:
+                    raise HTTPException(status_code=413, detail=f"Too many files (max {settings.BATCH_MAX_FILES})")
+                for info in members:
+                    name = os.path.basename(info.filename)
+                    if not name.lower().endswith(DOCUMENT_EXTENSIONS):
+                        rejected.append({"filename": name, "detail": "Only PDF and TXT files are supported"})
+                        continue
+                    # Copy at most one byte over the cap: declared sizes in the archive can lie
+                    spool = tempfile.SpooledTemporaryFile(max_size=settings.STORAGE_CHUNK_SIZE)
+                    with zf.open(info) as member:
+                        left = settings.DOCUMENT_MAX_BYTES + 1
+                        while left > 0:
+                            block = member.read(min(settings.STORAGE_CHUNK_SIZE, left))
+                            if not block:
+                                break
+                            spool.write(block)
+                            left -= len(block)
+                    size = spool.tell()
+                    spool.seek(0)
+                    files.append(UploadFile(spool, size=size, filename=name))
+            return files, rejected
+
+        await archive.seek(0)
+        return await run_in_threadpool(unpack)
+
+    async def upload_batch(
+        self, db: AsyncSession, files: list[UploadFile], user_id: uuid.UUID, rejected: list[dict] | None = None
+    ) -> tuple[dict, list]:
+        """
+        Validates, hashes and stores many files, then inserts the batch and all its documents
+        rows in one statement. Returns the batch progress and the (doc_id, sha256, file_ext)
+        list to pass to ingest_batch, which is left to the caller (a background task).
+        """
+        from app.db import session as db_session
+        from app.services.blob_service import blob_service
+        from app.services.upload_validation import upload_validator
+
+        rejected = list(rejected or [])
+        total = len(files) + len(rejected)  # Including zip members refused by unpack_zip
+        valid = []
+        for file in files:
+            file_ext = file.filename.split(".")[-1]
+            try:
+                if not file.filename.lower().endswith(DOCUMENT_EXTENSIONS):
+                    raise HTTPException(status_code=400, detail="Only PDF and TXT files are supported")
+                await upload_validator.validate(file, file_ext)
+            except HTTPException as e:
+                rejected.append({"filename": file.filename, "detail": e.detail})
+                continue
+            sha256, _ = await blob_service.hash_upload(file)
+            valid.append((file, file_ext, sha256))
+
+        # Storage transfers in parallel; each needs its own session for the blob row
+        slots = asyncio.Semaphore(settings.STORAGE_MAX_CONCURRENCY)
+
+        async def store(file: UploadFile, file_ext: str, sha256: str):
+            async with slots:
+                async with db_session.AsyncSessionLocal() as blob_db:
+                    return await blob_service.acquire(blob_db, sha256, file, file_ext)
+
+        blobs = await asyncio.gather(*(store(*item) for item in valid), return_exceptions=True)
+
+        batch_id = uuid.uuid4()
+        rows, pending = [], []
+        for (file, file_ext, sha256), blob in zip(valid, blobs):
+            if isinstance(blob, Exception):
+                print(f"Storage Error: {blob}")
+                rejected.append({"filename": file.filename, "detail": f"File upload failed: {blob}"})
+                continue
+            doc_id = uuid.uuid4()
+            rows.append({
+                "id": doc_id,
+                "user_id": user_id,
+                "title": file.filename,
+                "file_path": blob.file_path,
+                "file_type": file_ext,
+                "status": "processing",
+                "blob_sha256": sha256,
+                "batch_id": batch_id,
+            })
+            pending.append((str(doc_id), sha256, file_ext))
+
+        try:
+            db.add(UploadBatch(id=batch_id, user_id=user_id, total=total, rejected=rejected))
+            await db.flush()
+            if rows:
+                await db.execute(insert(DocumentModel), rows)
+            await db.commit()
+        except Exception:
+            # No document holds the blob references taken above: give them back so the blobs can be collected
+            await db.rollback()
+            for row in rows:
+                await blob_service.release(db, row["blob_sha256"], row["id"])
+            raise
+        metrics.increment("batches.created")
+        metrics.increment("batches.documents", len(rows))
+        return await self.get_batch(db, str(batch_id), user_id), pending
+
+    async def ingest_batch(self, pending: list) -> None:
+        """
+        Ingests a batch's documents, each with its own session, at most BATCH_INGEST_CONCURRENCY
+        at a time across all batches in this worker.
+        """
+        from app.db import session as db_session
+
+        async def ingest(doc_id: str, sha256: str, file_ext: str):
+            async with self._ingest_slots:
+                async with db_session.AsyncSessionLocal() as db:
+                    await self._ingest(db, doc_id, sha256, file_ext)
+
+        await asyncio.gather(*(ingest(*item) for item in pending))
+
+    async def get_batch(self, db: AsyncSession, batch_id: str, user_id: uuid.UUID) -> dict | None:
+        result = await db.execute(
+            select(UploadBatch).where(UploadBatch.id == batch_id, UploadBatch.user_id == user_id)
+        )
+        batch = result.scalars().first()
+        if not batch:
+            return None
+        docs = (await db.execute(
+            select(DocumentModel.id, DocumentModel.title, DocumentModel.status).where(DocumentModel.batch_id == batch.id)
+        )).all()
+        counts = {"processing": 0, "ready": 0, "error": 0}
+        for doc in docs:
+            counts[doc.status or "ready"] = counts.get(doc.status or "ready", 0) + 1
+        return {
+            "id": str(batch.id),
+            "total": batch.total,
+            "accepted": len(docs),
+            "rejected": batch.rejected or [],
+            "counts": counts,
+            "done": counts["processing"] == 0,
+            "documents": [{"id": str(doc.id), "title": doc.title, "status": doc.status or "ready"} for doc in docs],
+        }
+
+    def _metadata(self, doc) -> dict:
+        return {
             "id": str(doc.id),
             "title": doc.title,
             "file_type": doc.file_type,
@@ -88,25 +266,107 @@ class DocumentService:
             "pages": doc.pages,
             "summary": doc.summary,
             "file_path": doc.file_path
-        } for doc in docs]
+        }
 
-    async def get_document(self, db: Session, doc_id: str, user_id: uuid.UUID) -> dict | None:
-        doc = db.query(DocumentModel).filter(DocumentModel.id == doc_id, DocumentModel.user_id == user_id).first()
+    async def get_documents(self, db: AsyncSession, user_id: uuid.UUID) -> list[dict]:
+        result = await db.execute(
+            select(*_METADATA_COLUMNS).where(DocumentModel.user_id == user_id).order_by(DocumentModel.created_at.desc())
+        )
+        return [self._metadata(doc) for doc in result.all()]
+
+    async def get_document(self, db: AsyncSession, doc_id: str, user_id: uuid.UUID, include_text: bool = False) -> dict | None:
+        """
+        Document metadata. The extracted text is only loaded with include_text; readers
+        fetch it a few pages at a time instead (get_pages).
+        """
+        result = await db.execute(
+            select(*_METADATA_COLUMNS).where(DocumentModel.id == doc_id, DocumentModel.user_id == user_id)
+        )
+        doc = result.first()
         if not doc:
             return None
-        
-        print(f"DEBUG: Fetching doc {doc_id}. Content length: {len(doc.content_text) if doc.content_text else 0}")
-        
+
+        document = self._metadata(doc)
+        if include_text:
+            pages = await self._page_rows(db, doc.id)
+            document["content_text"] = "\n\n".join(p.text_content for p in pages) if pages \
+                else await self._legacy_text(db, doc.id)
+        return document
+
+    async def get_pages(self, db: AsyncSession, doc_id: str, user_id: uuid.UUID, first: int = 1, last: int | None = None) -> dict | None:
+        """
+        Text of pages first..last (1-based, inclusive) of a document, at most
+        DOCUMENT_PAGES_MAX_RANGE of them: "to" in the result is the last page returned (None if none).
+        Documents ingested before per-page storage are one page holding all their text.
+        """
+        result = await db.execute(
+            select(DocumentModel.id, DocumentModel.pages).where(DocumentModel.id == doc_id, DocumentModel.user_id == user_id)
+        )
+        doc = result.first()
+        if not doc:
+            return None
+        if last is not None and last < first:
+            raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+
+        limit = first + settings.DOCUMENT_PAGES_MAX_RANGE - 1
+        last = min(last, limit) if last else limit
+        page_count = doc.pages or 0
+        pages = [
+            {"page_number": p.page_number, "text": p.text_content}
+            for p in await self._page_rows(db, doc.id, first, last)
+        ]
+        if not pages and page_count:
+            legacy_text = await self._legacy_text(db, doc.id)
+            if legacy_text is not None:
+                page_count = 1
+                pages = [{"page_number": 1, "text": legacy_text}] if first == 1 else []
+        metrics.increment("documents.pages_served", len(pages))
         return {
-            "id": str(doc.id),
-            "title": doc.title,
-            "file_type": doc.file_type,
-            "status": doc.status or "ready",
-            "created_at": doc.created_at.isoformat() if doc.created_at else datetime.now().isoformat(),
-            "pages": doc.pages,
-            "summary": doc.summary,
-            "file_path": doc.file_path,
-            "content_text": doc.content_text # Added content_text
+            "document_id": str(doc.id),
+            "page_count": page_count,
+            "from": first,
+            "to": pages[-1]["page_number"] if pages else None,
+            "pages": pages,
         }
 
+    async def _page_rows(self, db: AsyncSession, doc_id, first: int = 1, last: int | None = None) -> list:
+        query = select(DocumentPage.page_number, DocumentPage.text_content).where(
+            DocumentPage.document_id == doc_id, DocumentPage.page_number >= first
+        )
+        if last is not None:
+            query = query.where(DocumentPage.page_number <= last)
+        return (await db.execute(query.order_by(DocumentPage.page_number))).all()
+
+    async def _legacy_text(self, db: AsyncSession, doc_id) -> str | None:
+        """Whole text of a document ingested before per-page storage (documents.content_text)."""
+        result = await db.execute(select(DocumentModel.content_text).where(DocumentModel.id == doc_id))
+        return result.scalar()
+
+    async def delete_document(self, db: AsyncSession, doc_id: str, user_id: uuid.UUID) -> bool:
+        """
+        Deletes a document with its chunks and chat sessions (ON DELETE CASCADE) and releases
+        its stored file: shared blobs lose a reference, legacy per-document files are removed.
+        """
+        result = await db.execute(
+            select(DocumentModel).where(DocumentModel.id == doc_id, DocumentModel.user_id == user_id)
+        )
+        doc = result.scalars().first()
+        if not doc:
+            return False
+
+        from app.services.answer_cache import answer_cache
+        from app.services.blob_service import blob_service
+        from app.services.storage import storage_service
+        await db.delete(doc)
+        if doc.blob_sha256:
+            await blob_service.release(db, doc.blob_sha256, doc.id)  # Commits the delete
+        else:
+            await db.commit()
+            try:
+                await storage_service.delete(doc.file_path)
+            except Exception as e:
+                print(f"Storage Error: {e}")
+        answer_cache.invalidate(str(doc.id))
+        return True
+
 document_service = DocumentService()
@@ -0,0 +1,235 @@
+"""
+Download Cache - local disk copies of remote (Supabase) document objects.
+
+Ingestion, re-ingestion and per-page work read a local copy of the stored
+file. Instead of downloading it to a temp file every time, copies are kept
+under DOWNLOAD_CACHE_DIR:
+
+    objects/<sha256 of content>   the bytes, content-addressed (shared by equal files)
+    refs/<sha256 of url>.json     url -> content sha256, size, ETag
+    locks/                        flock files
+    tmp/                          downloads in progress
+
+Every use revalidates with a conditional GET (If-None-Match with the stored
+ETag, or the Content-Length against the stored size when the server sends no
+ETag), so an unchanged object costs one request with no body.
+
+Writes are atomic (tmp file + os.replace). Locks are fcntl.flock, so they hold
+across uvicorn worker processes: one worker at a time fills or revalidates a
+given URL, and a copy in use holds a shared lock that eviction respects. Once
+the objects exceed DOWNLOAD_CACHE_MAX_BYTES, least recently used ones (mtime
+is bumped on every use) are evicted. DOWNLOAD_CACHE_MAX_BYTES=0 disables the
+cache.
+
+Hits (revalidated copies) / misses / evictions are on /metrics ("download_cache").
+"""
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+class FileLock:
+    """flock on a lock file; blocking waits happen in the threadpool, not on the event loop."""
+
+    def __init__(self, path: str, shared: bool = False):
+        self.path = path
+        self.mode = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        self.fd: Optional[int] = None
+
+    def try_acquire(self) -> bool:
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self.fd, self.mode | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            os.close(self.fd)
+            self.fd = None
+            return False
+
+    async def acquire(self) -> None:
+        if self.try_acquire():
+            return
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        await run_in_threadpool(fcntl.flock, self.fd, self.mode)
+
+    def release(self) -> None:
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class DownloadCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        if self.enabled:
+            for sub in ("objects", "refs", "locks", "tmp"):
+                os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _object(self, sha256: str) -> str:
+        return os.path.join(self.root, "objects", sha256)
+
+    def _ref(self, key: str) -> str:
+        return os.path.join(self.root, "refs", f"{key}.json")
+
+    def _lock(self, name: str, shared: bool = False) -> FileLock:
+        return FileLock(os.path.join(self.root, "locks", f"{name}.lock"), shared)
+
+    async def _hold(self, sha256: str) -> Optional[FileLock]:
+        """Shared lock on an object, so eviction leaves it alone. None if the object is not there."""
+        lock = self._lock(f"object-{sha256}", shared=True)
+        await lock.acquire()
+        if os.path.exists(self._object(sha256)):
+            return lock
+        lock.release()
+        return None
+
+    def _read_ref(self, key: str) -> Optional[dict]:
+        try:
+            with open(self._ref(key)) as f:
+                ref = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # The object may have been evicted (or be damaged) since the ref was written
+        try:
+            if os.path.getsize(self._object(ref["sha256"])) != ref["size"]:
+                return None
+        except OSError:
+            return None
+        return ref
+
+    def _write_ref(self, key: str, ref: dict) -> None:
+        fd, tmp = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+        with os.fdopen(fd, "w") as f:
+            json.dump(ref, f)
+        os.replace(tmp, self._ref(key))
+
+    @asynccontextmanager
+    async def open(self, location: str, fetch: Callable[..., Awaitable]):
+        """
+        Yields a local path holding the current content of `location`.
+        fetch(dest_path, etag, size) downloads into dest_path (conditionally,
+        given the cached copy's etag / size) and returns a storage.Download.
+        The path is only guaranteed to exist inside the `async with` block.
+        """
+        key = hashlib.sha256(location.encode()).hexdigest()
+        added = 0
+        object_lock = None
+        # One filler per URL across workers; the object lock is taken before this one is released
+        async with self._lock(f"ref-{key}"):
+            ref = self._read_ref(key)
+            if ref:
+                object_lock = await self._hold(ref["sha256"])
+                if object_lock is None:
+                    ref = None  # Evicted before we got the lock
+            fd, tmp = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+            os.close(fd)
+            try:
+                result = await fetch(tmp, ref["etag"] if ref else None, ref["size"] if ref else None)
+                if result.not_modified and ref:
+                    metrics.increment("download_cache.hits")
+                else:
+                    metrics.increment("download_cache.misses")
+                    if object_lock is not None:
+                        object_lock.release()
+                    ref = {"sha256": result.sha256, "size": result.size, "etag": result.etag, "url": location}
+                    object_lock = self._lock(f"object-{ref['sha256']}", shared=True)
+                    await object_lock.acquire()
+                    if os.path.exists(self._object(ref["sha256"])):
+                        metrics.increment("download_cache.deduplicated")  # Same content under another URL
+                    else:
+                        os.replace(tmp, self._object(ref["sha256"]))
+                        added = result.size
+                    self._write_ref(key, ref)
+            except BaseException:
+                if object_lock is not None:
+                    object_lock.release()
+                raise
+            finally:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+
+        path = self._object(ref["sha256"])
+        try:
+            os.utime(path)  # Last use, for LRU eviction
+            yield path
+        finally:
+            object_lock.release()
+            if added:
+                await run_in_threadpool(self.evict)
+
+    def _objects(self) -> list:
+        entries = []
+        with os.scandir(os.path.join(self.root, "objects")) as it:
+            for entry in it:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.name))
+        return entries
+
+    def evict(self) -> int:
+        """Removes least recently used objects (skipping ones in use) until under max_bytes. Returns bytes freed."""
+        evict_lock = self._lock("evict")
+        if not evict_lock.try_acquire():
+            return 0  # Another worker is already evicting
+        freed = 0
+        try:
+            entries = self._objects()
+            total = sum(size for _, size, _ in entries)
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                object_lock = self._lock(f"object-{name}")
+                if not object_lock.try_acquire():
+                    continue  # Being read right now
+                try:
+                    os.unlink(self._object(name))
+                except FileNotFoundError:
+                    pass
+                finally:
+                    object_lock.release()
+                total -= size
+                freed += size
+                metrics.increment("download_cache.evictions")
+        finally:
+            evict_lock.release()
+        return freed
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        entries = self._objects()
+        return {
+            "enabled": True,
+            "dir": self.root,
+            "objects": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+download_cache = DownloadCache(root=settings.DOWNLOAD_CACHE_DIR, max_bytes=settings.DOWNLOAD_CACHE_MAX_BYTES)
+metrics.register_collector("download_cache", download_cache.stats)
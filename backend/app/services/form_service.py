@@ -1,6 +1,7 @@
 from typing import List, Dict
 
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.models import FormSubmission, User
 from app.services.rag_service import rag_service  # Reuse RAG for embeddings/LLM access if needed, or direct OpenAI
 import json
@@ -56,12 +57,13 @@ class FormService:
             self.openai_client = OpenAI(api_key=openai_key)
             self.async_client = AsyncOpenAI(api_key=openai_key)
             print("Forms: Using OpenAI")
-    async def autofill_form(self, form_id: str, fields: List[Dict], user_id: str, db: Session) -> Dict[str, str]:
+    async def autofill_form(self, form_id: str, fields: List[Dict], user_id: str, db: AsyncSession) -> Dict[str, str]:
         """
         Uses AI to intelligently fill form fields based on user profile and past context.
         """
         # 1. Fetch User Context
-        user = db.query(User).filter(User.id == user_id).first()
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalars().first()
         if not user:
             return {}
 
@@ -129,7 +131,7 @@ class FormService:
 
         return ai_data
 
-    async def submit_form(self, form_id: str, data: Dict, user_id: str, db: Session):
+    async def submit_form(self, form_id: str, data: Dict, user_id: str, db: AsyncSession):
         """
         Persists the form submission to the database.
         """
@@ -140,8 +142,8 @@ class FormService:
             status="pending"
         )
         db.add(submission)
-        db.commit()
-        db.refresh(submission)
+        await db.commit()
+        await db.refresh(submission)
         
         return {
             "status": "success", 
@@ -0,0 +1,120 @@
+"""
+Principal Cache - authenticated user lookups without a users query per request.
+
+get_current_principal resolves a token's user id to a Principal (id, active flag,
+name, email) instead of the full users row, so the auth path never loads
+face_id_data or the JSONB preferences. Principals are cached per worker process
+for PRINCIPAL_CACHE_TTL_SECONDS, least-recently-used entries are evicted once
+PRINCIPAL_CACHE_MAX_ENTRIES is reached.
+
+Entries are invalidated when a User is updated or deleted through the ORM in
+this process (at flush and again after commit, so a lookup racing the commit
+cannot re-cache the old row), and the whole cache is cleared by bulk
+UPDATE / DELETE statements on users. Changes made by other workers are picked
+up when the TTL expires.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.models import User
+
+
+class Principal:
+    """The authenticated user as the API layer needs it - what get_current_user used to load in full."""
+    __slots__ = ("id", "is_active", "full_name", "email")
+
+    def __init__(self, id: uuid.UUID, is_active: bool, full_name: str, email: str):
+        self.id = id
+        self.is_active = is_active
+        self.full_name = full_name
+        self.email = email
+
+
+class PrincipalCache:
+    def __init__(self, ttl_seconds: float = 60, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # user id -> (principal, expires_at)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_entries > 0
+
+    def get(self, user_id) -> Optional[Principal]:
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                metrics.increment("principal_cache.misses")
+                return None
+            self._entries.move_to_end(key)
+        metrics.increment("principal_cache.hits")
+        return entry[0]
+
+    def put(self, principal: Principal) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[str(principal.id)] = (principal, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(str(principal.id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id) -> None:
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        return {"size": size, "max_entries": self.max_entries, "ttl_seconds": self.ttl_seconds}
+
+
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES
+)
+metrics.register_collector("principal_cache", principal_cache.stats)
+
+
+# --- Invalidation ---
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target):
+    principal_cache.invalidate(target.id)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_users", set()).add(str(target.id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for user_id in session.info.pop("changed_users", ()):
+        principal_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_rolled_back(session, previous_transaction):
+    session.info.pop("changed_users", None)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _clear_on_bulk_write(state):
+    if (state.is_update or state.is_delete) and state.bind_mapper is not None and state.bind_mapper.class_ is User:
+        principal_cache.clear()
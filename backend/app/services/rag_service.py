@@ -1,14 +1,23 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import select, insert, func, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
-from app.models.models import Document as DocumentModel, AccessDocumentChunk
+from app.models.models import Document as DocumentModel, DocumentPage, AccessDocumentChunk
 from app.schemas.document import SearchResult
 from langchain_community.document_loaders import PyPDFLoader, TextLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+from langchain_core.documents import Document as LoadedPage
+from app.services.answer_cache import answer_cache
+from app.services.singleflight import llm_flight, embedding_flight, fingerprint
+from app.services.context_packer import ContextPacker
+from app.services.chat_memory import chat_memory
+from app.core.metrics import metrics
+from app.core.deadline import Deadline, DeadlineExceeded
 import uuid
 import os
+import time
 
 class RagService:
     def __init__(self):
@@ -30,7 +39,9 @@ class RagService:
                 api_version=settings.AZURE_OPENAI_API_VERSION,
                 azure_deployment=settings.AZURE_OPENAI_DEPLOYMENT,
                 temperature=0,
-                max_tokens=500
+                max_tokens=500,
+                timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS,
+                max_retries=1
             )
         else:
             self.llm = ChatOpenAI(
@@ -38,50 +49,66 @@ class RagService:
                 model_name=settings.LLM_MODEL, # Use configured model
                 temperature=0,
                 openai_api_base=base_url,
-                max_tokens=500 # Limit output to avoid credit errors
+                max_tokens=500, # Limit output to avoid credit errors
+                timeout=settings.LLM_REQUEST_TIMEOUT_SECONDS,
+                max_retries=1
             )
 
-    async def ingest_document(self, db: Session, doc_id: str):
+        self.context_packer = ContextPacker(
+            model_name=settings.LLM_MODEL,
+            token_budget=settings.CHAT_CONTEXT_TOKEN_BUDGET
+        )
+
+        # (provider, model, temperature, max_tokens) - part of the coalescing key
+        self.llm_fingerprint = (
+            settings.MODEL_PROVIDER,
+            settings.AZURE_OPENAI_DEPLOYMENT if settings.MODEL_PROVIDER == "azure_openai" else settings.LLM_MODEL,
+            0,
+            500,
+        )
+
+    async def _invoke_llm(self, messages: list):
+        """
+        Calls the LLM, sharing one upstream request between identical concurrent prompts.
+        """
+        key = fingerprint(self.llm_fingerprint, [(m.type, m.content) for m in messages])
+        return await llm_flight.do(key, lambda: self.llm.ainvoke(messages))
+
+    async def _embed_query(self, text: str) -> list[float]:
+        """
+        Embeds text, sharing one upstream request between identical concurrent inputs.
+        """
+        key = fingerprint("text-embedding-3-small", text)
+        return await embedding_flight.do(key, lambda: self.embeddings.aembed_query(text))
+
+    async def ingest_document(self, db: AsyncSession, doc_id: str) -> bool:
         """
         Loads document, splits text, generates embeddings, and saves chunks to DB.
+        Returns whether the document ended up ready.
         """
         # 1. Fetch Document Metadata
-        db_doc = db.query(DocumentModel).filter(DocumentModel.id == doc_id).first()
+        result = await db.execute(select(DocumentModel).where(DocumentModel.id == doc_id))
+        db_doc = result.scalars().first()
         if not db_doc:
             print(f"Error: Document {doc_id} not found.")
-            return
+            return False
 
         print(f"Start Ingestion: {db_doc.title}")
         
         try:
             # 2. Load File
-            current_file_path = db_doc.file_path
-            is_temp_file = False
-            
-            # If path is a URL (Supabase), download to temp first
-            if current_file_path.startswith("http"):
-                try:
-                    from app.services.storage import storage_service
-                    file_ext = db_doc.file_type or "pdf"
-                    current_file_path = storage_service.download_file_to_temp(current_file_path, file_ext)
-                    is_temp_file = True
-                    print(f"Downloaded remote file to: {current_file_path}")
-                except Exception as e:
-                    print(f"Failed to download remote file: {e}")
-                    raise e
-
-            try:
+            # Remote (Supabase) files come from the local download cache, revalidated against the bucket
+            from app.services.storage import storage_service
+            async with storage_service.local_copy(db_doc.file_path, db_doc.file_type or "pdf") as current_file_path:
                 if db_doc.file_type.lower() == "pdf":
                     loader = PyPDFLoader(current_file_path)
                 else:
                     loader = TextLoader(current_file_path)
                     
-                raw_docs = loader.load()
-            finally:
-                # Cleanup temp file if we created one
-                if is_temp_file and os.path.exists(current_file_path):
-                    os.unlink(current_file_path)
-                    print("Cleaned up temp file")
+                # PDF parsing is CPU/disk bound - keep it off the event loop
+                raw_docs = await run_in_threadpool(loader.load)
+            if db_doc.file_type.lower() != "pdf":
+                raw_docs = self._paginate_text(raw_docs)
             
             # 3. Split Text
             text_splitter = RecursiveCharacterTextSplitter(
@@ -95,7 +122,7 @@ class RagService:
             # 4. Generate Embeddings & Save Chunks
             for i, chunk in enumerate(chunks):
                 # Calculate embedding vector
-                vector = self.embeddings.embed_query(chunk.page_content)
+                vector = await self._embed_query(chunk.page_content)
                 
                 # Create Chunk Record
                 db_chunk = AccessDocumentChunk(
@@ -103,39 +130,116 @@ class RagService:
                     chunk_index=i,
                     text_content=chunk.page_content,
                     embedding=vector,
-                    page_number=chunk.metadata.get("page", 0) + 1 # PyPDF is 0-indexed
+                    page_number=chunk.metadata.get("page", 0) + 1, # PyPDF is 0-indexed
+                    owner_id=db_doc.user_id
                 )
                 db.add(db_chunk)
             
-            # Update Document Status and Content
-            full_text = "\n\n".join([doc.page_content for doc in raw_docs])
-            db_doc.content_text = full_text
+            # Page text for the reader, read by range (GET /documents/{id}/pages)
+            for i, page in enumerate(raw_docs):
+                db.add(DocumentPage(document_id=doc_id, page_number=i + 1, text_content=page.page_content))
+
+            # Update Document Status
             db_doc.status = "ready"
             db_doc.pages = len(raw_docs)
-            db.commit()
+            await db.commit()
+            answer_cache.invalidate(doc_id)
             print(f"Ingestion Complete: {db_doc.title}")
+            return True
 
         except Exception as e:
             print(f"Ingestion Failed: {e}")
+            await db.rollback()
             db_doc.status = "error"
-            db.commit()
+            await db.commit()
+            return False
 
-    async def search(self, db: Session, query: str, doc_id: str = None) -> list[SearchResult]:
+    def _paginate_text(self, raw_docs: list) -> list:
+        """
+        Cuts plain text into pages of about TEXT_PAGE_CHARS characters, ending at a paragraph,
+        line or sentence break where there is one, so text files page (and cite) like PDFs.
+        """
+        size = settings.TEXT_PAGE_CHARS
+        pages = []
+        for doc in raw_docs:
+            remaining = doc.page_content
+            while remaining:
+                cut = len(remaining)
+                if cut > size:
+                    for sep in ("\n\n", "\n", ". "):
+                        i = remaining.rfind(sep, 0, size)
+                        if i > 0:
+                            cut = i + len(sep)
+                            break
+                    else:
+                        cut = size
+                pages.append(LoadedPage(page_content=remaining[:cut], metadata={**doc.metadata, "page": len(pages)}))
+                remaining = remaining[cut:]
+        return pages or raw_docs
+
+    async def copy_ingestion(self, db: AsyncSession, source_doc_id: str, doc_id: str) -> bool:
+        """
+        Gives doc_id the extracted text and embedded chunks of source_doc_id (an already
+        ingested document with the same file content) - no parsing, no embedding calls.
+        Chunks and pages are copied by INSERT ... SELECT, chunks re-keyed to the new document's owner.
+        Returns False if the source is no longer there or not ready.
+        """
+        source = (await db.execute(
+            select(DocumentModel).where(DocumentModel.id == source_doc_id, DocumentModel.status == "ready")
+        )).scalars().first()
+        db_doc = (await db.execute(select(DocumentModel).where(DocumentModel.id == doc_id))).scalars().first()
+        if not source or not db_doc:
+            return False
+
+        columns = ["id", "document_id", "chunk_index", "text_content", "embedding", "page_number", "owner_id"]
+        await db.execute(insert(AccessDocumentChunk).from_select(columns, select(
+            func.gen_random_uuid(),
+            literal(db_doc.id, AccessDocumentChunk.document_id.type),
+            AccessDocumentChunk.chunk_index,
+            AccessDocumentChunk.text_content,
+            AccessDocumentChunk.embedding,
+            AccessDocumentChunk.page_number,
+            literal(db_doc.user_id, AccessDocumentChunk.owner_id.type),
+        ).where(AccessDocumentChunk.document_id == source.id)))
+        await db.execute(insert(DocumentPage).from_select(["id", "document_id", "page_number", "text_content"], select(
+            func.gen_random_uuid(),
+            literal(db_doc.id, DocumentPage.document_id.type),
+            DocumentPage.page_number,
+            DocumentPage.text_content,
+        ).where(DocumentPage.document_id == source.id)))
+
+        db_doc.content_text = source.content_text
+        db_doc.pages = source.pages
+        db_doc.summary = source.summary
+        db_doc.status = "ready"
+        await db.commit()
+        print(f"Ingestion Copied: {db_doc.title} (from {source.id})")
+        return True
+
+    async def search(self, db: AsyncSession, query: str, doc_id: str = None, query_vector: list[float] = None, limit: int = 5, owner_id: uuid.UUID = None) -> list[SearchResult]:
+        """
+        Vector search over document chunks, optionally scoped to one document and/or one owner.
+        Filtering on owner_id / document_id also lets Postgres prune to a single partition
+        when document_chunks is hash-partitioned (CHUNK_PARTITIONS).
+        """
         print(f"Searching for: {query} (Doc: {doc_id})")
         
-        # 1. Embed Query
-        query_vector = self.embeddings.embed_query(query)
+        # 1. Embed Query (callers that already embedded the query can pass the vector in)
+        if query_vector is None:
+            query_vector = await self._embed_query(query)
         
         # 2. Vector Search
         # We need to select the Distance explicitly
         distance_col = AccessDocumentChunk.embedding.l2_distance(query_vector).label("distance")
         
-        query_obj = db.query(AccessDocumentChunk, DocumentModel, distance_col).join(DocumentModel)
+        stmt = select(AccessDocumentChunk, DocumentModel, distance_col).join(DocumentModel)
         
         if doc_id:
-            query_obj = query_obj.filter(AccessDocumentChunk.document_id == doc_id)
+            stmt = stmt.where(AccessDocumentChunk.document_id == doc_id)
+        if owner_id:
+            stmt = stmt.where(AccessDocumentChunk.owner_id == owner_id)
             
-        results = query_obj.order_by(distance_col).limit(5).all()
+        results = (await db.execute(stmt.order_by(distance_col).limit(limit))).all()
 
         search_results = []
         for chunk, doc, distance in results:
@@ -161,17 +265,88 @@ class RagService:
             
         return search_results
 
-    async def chat(self, db: Session, doc_id: str, query: str) -> str:
+    async def _document_version(self, db: AsyncSession, doc_id: str) -> str:
+        """
+        Version stamp for cache scoping. Changes whenever the document is (re)ingested.
+        """
+        result = await db.execute(
+            select(DocumentModel.status, DocumentModel.pages, DocumentModel.created_at).where(
+                DocumentModel.id == doc_id
+            )
+        )
+        row = result.first()
+        if not row:
+            return "missing"
+        status, pages, created_at = row
+        return f"{status}:{pages}:{created_at.isoformat() if created_at else ''}"
+
+    async def chat(self, db: AsyncSession, doc_id: str, query: str, user_id: uuid.UUID = None, deadline: Deadline = None) -> dict:
         """
         Context-aware chat with a specific document.
+        When user_id is given, the conversation is remembered server-side per (user, document)
+        and follow-up questions are condensed into standalone questions for retrieval.
+        The whole request runs inside a latency budget (deadline); if generation cannot finish
+        in time, the retrieved passages are returned as an extractive answer ("degraded": True).
+        Returns {"answer": str, "cached": bool, "degraded": bool, "standalone_query": str, "usage": {...token counts}}.
         """
-        # 1. Retrieve Context
-        results = await self.search(db, query, doc_id)
-        context_text = "\n\n".join([f"[Page {r.page}] {r.snippet}" for r in results])
-        
-        if not results and len(query.split()) > 3:
-             # Only generic answer if query is long enough to be meaningful but no context found
-             pass
+        if deadline is None:
+            deadline = Deadline(settings.CHAT_LATENCY_BUDGET_SECONDS, name="chat")
+
+        session = await chat_memory.get_session(db, user_id, doc_id) if user_id else None
+        history = chat_memory.has_history(session)
+
+        # Follow-ups ("what about page 3?") are rewritten so retrieval and caching see a full question.
+        # Condensing may only use part of the budget; on overrun we retrieve with the raw query.
+        standalone_query = query
+        if history:
+            try:
+                standalone_query = await deadline.run(
+                    "condense", self._condense_question(session, query), fraction=0.25
+                )
+            except DeadlineExceeded:
+                pass
+
+        result = await self._answer(
+            db, doc_id, query, standalone_query, session if history else None, deadline, owner_id=user_id
+        )
+        result["standalone_query"] = standalone_query
+        result.setdefault("degraded", False)
+
+        failed = result.pop("error", False)
+        if user_id and not failed and not result["degraded"]:
+            await chat_memory.record_turn(
+                db, user_id, doc_id, query, result["answer"],
+                # Folding old turns is an LLM call too: within the budget, or chat_memory keeps a truncated transcript
+                summarize=lambda previous, turns: deadline.run("summary", self._summarize_turns(previous, turns))
+            )
+        return result
+
+    async def _answer(self, db: AsyncSession, doc_id: str, query: str, standalone_query: str, session, deadline: Deadline, owner_id: uuid.UUID = None) -> dict:
+        started = time.perf_counter()
+
+        # 0. Semantic Answer Cache (same doc + version, similar standalone question)
+        try:
+            query_vector = await deadline.run("embedding", self._embed_query(standalone_query))
+        except DeadlineExceeded:
+            return self._timeout_answer()
+        version = None
+        if settings.ANSWER_CACHE_ENABLED:
+            version = await self._document_version(db, doc_id)
+            cached = answer_cache.lookup(doc_id, version, query_vector)
+            if cached is not None:
+                metrics.observe("chat.cached_latency", time.perf_counter() - started)
+                return {**cached, "cached": True, "usage": self._usage(0, 0, 0, 0)}
+
+        # 1. Retrieve Context, packed into a fixed token budget by relevance
+        try:
+            results = await deadline.run("retrieval", self.search(
+                db, standalone_query, doc_id, query_vector=query_vector,
+                limit=settings.CHAT_RETRIEVAL_CANDIDATES, owner_id=owner_id
+            ))
+        except DeadlineExceeded:
+            return self._timeout_answer()
+        packed = self.context_packer.pack(results)
+        context_text = packed.text
 
         # 2. System Prompt
         system_prompt = (
@@ -184,20 +359,135 @@ class RagService:
             "- Keep answers concise (under 3 sentences) unless asked for details.\n"
             "- Cite page numbers if possible (e.g., 'According to Page 2...')."
         )
-        
-        # 3. Chat Interaction
+
+        # 3. Chat Interaction (bounded memory: rolling summary + recent verbatim turns)
+        messages = [SystemMessage(content=system_prompt)]
+        if session is not None:
+            if session.summary:
+                messages.append(SystemMessage(content=f"Summary of the earlier conversation: {session.summary}"))
+            for turn in session.turns or []:
+                messages.append(HumanMessage(content=turn["question"]))
+                messages.append(AIMessage(content=turn["answer"]))
+        messages.append(HumanMessage(content=f"Context:\n{context_text}\n\nQuestion: {query}"))
+
+        try:
+            response = await deadline.run("generation", self._invoke_llm(messages))
+        except DeadlineExceeded:
+            # Out of time: answer extractively from the passages we already have
+            return self._extractive_answer(packed, started)
+        except Exception as e:
+            # Errors are never cached or remembered
+            usage = self._usage(0, 0, packed.tokens, len(packed.results))
+            if "402" in str(e):
+                return {"answer": "I apologize, but I cannot answer right now due to insufficient AI credits.", "cached": False, "usage": usage, "error": True}
+            return {"answer": f"I encountered an error: {str(e)}", "cached": False, "usage": usage, "error": True}
+
+        # Prefer provider-reported usage, fall back to local tiktoken counts
+        usage_metadata = getattr(response, "usage_metadata", None) or {}
+        prompt_tokens = usage_metadata.get("input_tokens") or sum(
+            self.context_packer.count_tokens(m.content) for m in messages
+        )
+        completion_tokens = usage_metadata.get("output_tokens") or self.context_packer.count_tokens(response.content)
+        metrics.increment("chat.prompt_tokens", prompt_tokens)
+        metrics.increment("chat.completion_tokens", completion_tokens)
+
+        result = {"answer": response.content}
+        # Answers that drew on the conversation history only hold in that conversation
+        if version is not None and session is None:
+            answer_cache.store(doc_id, version, standalone_query, query_vector, result)
+        metrics.observe("chat.uncached_latency", time.perf_counter() - started)
+        return {
+            **result,
+            "cached": False,
+            "usage": self._usage(prompt_tokens, completion_tokens, packed.tokens, len(packed.results))
+        }
+
+    async def _condense_question(self, session, query: str) -> str:
+        """
+        Rewrites a follow-up question into a standalone question using the chat memory.
+        """
         messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=f"Context:\n{context_text}\n\nQuestion: {query}")
+            SystemMessage(content=(
+                "Rewrite the user's latest message as a single standalone question that can be understood "
+                "without the conversation. Keep the original language. Return only the question."
+            )),
+            HumanMessage(content=f"Conversation:\n{chat_memory.transcript(session)}\n\nLatest message: {query}")
         ]
-        
         try:
-            response = self.llm.invoke(messages)
-            return response.content
+            response = await self._invoke_llm(messages)
+            condensed = response.content.strip()
+            return condensed or query
         except Exception as e:
-            if "402" in str(e):
-                return "I apologize, but I cannot answer right now due to insufficient AI credits."
-            return f"I encountered an error: {str(e)}"
+            print(f"Question condensing failed, using raw query: {e}")
+            return query
+
+    async def _summarize_turns(self, previous_summary: str | None, turns: list[dict]) -> str:
+        """
+        Folds older chat turns into the rolling conversation summary.
+        """
+        folded = "\n".join(f"User: {t['question']}\nAssistant: {t['answer']}" for t in turns)
+        messages = [
+            SystemMessage(content=(
+                "You maintain a running summary of a conversation about a document. "
+                f"Merge the new exchanges into the existing summary in under {settings.CHAT_MEMORY_SUMMARY_TOKENS // 2} words. "
+                "Keep facts, page references and open questions. Return only the summary."
+            )),
+            HumanMessage(content=f"Existing summary:\n{previous_summary or '(none)'}\n\nNew exchanges:\n{folded}")
+        ]
+        response = await self._invoke_llm(messages)
+        return response.content.strip()
+
+    def _extractive_answer(self, packed, started: float) -> dict:
+        """
+        Fallback when generation misses the deadline: the top passages with page citations.
+        """
+        metrics.increment("chat.degraded")
+        metrics.observe("chat.degraded_latency", time.perf_counter() - started)
+        citations = [
+            {
+                "page": r.page,
+                "snippet": self.context_packer.trim_to_sentences(r.snippet, 80) or r.snippet[:400],
+                "relevance": r.relevance
+            }
+            for r in packed.results[:3]
+        ]
+        if not citations:
+            answer = "I couldn't find information about that in this document in time. Please try again."
+        else:
+            passages = "\n".join(f"- According to Page {c['page']}: {c['snippet']}" for c in citations)
+            answer = (
+                "I couldn't put together a full answer in time, but these passages look most relevant:\n"
+                f"{passages}"
+            )
+        return {
+            "answer": answer,
+            "cached": False,
+            "degraded": True,
+            "citations": citations,
+            "usage": self._usage(0, 0, packed.tokens, len(packed.results))
+        }
+
+    def _timeout_answer(self) -> dict:
+        """
+        Fallback when not even retrieval finished inside the budget.
+        """
+        metrics.increment("chat.degraded")
+        return {
+            "answer": "The document assistant is taking too long to respond right now. Please try again in a moment.",
+            "cached": False,
+            "degraded": True,
+            "citations": [],
+            "usage": self._usage(0, 0, 0, 0)
+        }
+
+    @staticmethod
+    def _usage(prompt_tokens: int, completion_tokens: int, context_tokens: int, snippets: int) -> dict:
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "context_tokens": context_tokens,
+            "context_snippets": snippets
+        }
 
     async def simplify(self, text: str) -> str:
         # Use GPT-4o to simplify text
@@ -206,7 +496,7 @@ class RagService:
             HumanMessage(content=text)
         ]
         try:
-            response = self.llm.invoke(messages)
+            response = await self._invoke_llm(messages)
             return response.content
         except Exception as e:
             print(f"Simplify Error: {str(e)}")
@@ -0,0 +1,68 @@
+"""
+Singleflight - coalesces identical in-flight async calls.
+
+Concurrent callers that ask for the same key share one upstream call and all
+receive its result (or its exception). A caller being cancelled only detaches
+that caller; the shared call is cancelled once no caller is waiting on it.
+"""
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from app.core.metrics import metrics
+
+T = TypeVar("T")
+
+
+def fingerprint(*parts: Any) -> str:
+    """Stable SHA-256 fingerprint of JSON-serialisable request parts."""
+    payload = json.dumps(parts, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[str, _Call] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None or call.task.done():
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _t, k=key, c=call: self._forget(k, c))
+            metrics.increment(f"singleflight.{self.name}.calls")
+        else:
+            metrics.increment(f"singleflight.{self.name}.coalesced")
+
+        call.waiters += 1
+        try:
+            # shield() so one caller's cancellation does not cancel the shared call
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Last interested caller went away: stop the upstream call and
+                # make sure later callers start a fresh one.
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+llm_flight = SingleFlight("llm")
+embedding_flight = SingleFlight("embedding")
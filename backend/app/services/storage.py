@@ -1,75 +1,411 @@
+"""
+Storage Service - document files in Supabase Storage, or on local disk.
+
+All calls are awaitable and never block the event loop:
+
+- SupabaseStorage talks to the Storage REST API through one shared keep-alive
+  httpx.AsyncClient (STORAGE_MAX_CONNECTIONS pooled connections, connect /
+  read timeouts), retries connection errors, 429 and 5xx responses with
+  exponential backoff (STORAGE_RETRIES, STORAGE_RETRY_BACKOFF_SECONDS), and
+  runs at most STORAGE_MAX_CONCURRENCY transfers at a time. Tests can pass an
+  httpx transport (e.g. httpx.MockTransport) as an in-process stand-in.
+- LocalStorage writes under STORAGE_LOCAL_DIR (served at /uploads), for
+  development without Supabase credentials and for tests.
+
+STORAGE_BACKEND picks one (auto = Supabase when SUPABASE_URL / SUPABASE_KEY
+are set). Uploads are streamed: the UploadFile (already spooled to disk by
+Starlette above 1 MB) is read STORAGE_CHUNK_SIZE bytes at a time and hashed on
+the fly, so peak memory per upload is one chunk whatever the file size.
+Downloads are streamed to a temp file the same way, or kept in the local
+download cache (app/services/download_cache.py) by local_copy.
+
+Request / retry / error counts and transfer timings are on /metrics ("storage").
+"""
+import asyncio
+import hashlib
 import os
-import shutil
+import random
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import aiofiles
+import httpx
 from fastapi import UploadFile
-from supabase import create_client, Client
-import requests
+from starlette.concurrency import run_in_threadpool
+
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.download_cache import download_cache
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class StoredFile:
+    """Where an upload ended up, with its size and SHA-256 computed while streaming."""
+    __slots__ = ("path", "size", "sha256")
+
+    def __init__(self, path: str, size: int, sha256: str):
+        self.path = path
+        self.size = size
+        self.sha256 = sha256
+
+
+class UploadStream:
+    """Async iterator over an UploadFile in fixed-size chunks, hashing as it goes. Re-iterable (for retries)."""
+
+    def __init__(self, file: UploadFile, chunk_size: Optional[int] = None):
+        self.file = file
+        self.chunk_size = chunk_size or settings.STORAGE_CHUNK_SIZE
+        self.size = 0
+        self._digest = hashlib.sha256()
+
+    async def __aiter__(self):
+        await self.file.seek(0)
+        self.size, self._digest = 0, hashlib.sha256()
+        while True:
+            chunk = await self.file.read(self.chunk_size)
+            if not chunk:
+                break
+            self._digest.update(chunk)
+            self.size += len(chunk)
+            yield chunk
+
+    @property
+    def sha256(self) -> str:
+        return self._digest.hexdigest()
+
+    def stored(self, path: str) -> StoredFile:
+        metrics.increment("storage.uploads")
+        metrics.increment("storage.upload_bytes", self.size)
+        return StoredFile(path, self.size, self.sha256)
+
+
+class DiskUploadFile(UploadFile):
+    """
+    UploadFile over a file already on disk (an assembled resumable upload). Every read,
+    seek and close runs in the threadpool - Starlette only guarantees that for spooled
+    files that have rolled to disk, and these can be gigabytes.
+    """
+
+    async def read(self, size: int = -1) -> bytes:
+        return await run_in_threadpool(self.file.read, size)
+
+    async def seek(self, offset: int) -> None:
+        await run_in_threadpool(self.file.seek, offset)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.file.close)
+
+
+class Download:
+    """Outcome of a (possibly conditional) download."""
+    __slots__ = ("not_modified", "size", "etag", "sha256")
 
-class StorageService:
     def __init__(self):
-        self.url: str = os.environ.get("SUPABASE_URL")
-        self.key: str = os.environ.get("SUPABASE_KEY")
-        self.bucket_name = "documents"
-        
-        if self.url and self.key:
-            self.supabase: Client = create_client(self.url, self.key)
-        else:
-            print("Warning: SUPABASE_URL or SUPABASE_KEY not found. Storage will fail if attempted.")
-            self.supabase = None
-
-    async def upload_file(self, file: UploadFile, file_name: str) -> str:
-        if not self.supabase:
-            raise Exception("Supabase credentials not configured")
-
-        # Read file content
-        file_content = await file.read()
-        
-        # Upload to Supabase Storage
-        # Note: 'file_options' might be needed depending on lib version, but basic upload should work
-        try:
-            # Overwrite if exists, though UUID filename makes collision unlikely
-            res = self.supabase.storage.from_(self.bucket_name).upload(
-                path=file_name,
-                file=file_content,
-                file_options={"content-type": file.content_type}
+        self.not_modified = False
+        self.size = 0
+        self.etag: Optional[str] = None
+        self.sha256: Optional[str] = None
+
+
+class HttpPool:
+    """
+    One keep-alive httpx.AsyncClient per event loop (connections cannot move
+    between loops), a concurrency cap and retry with backoff.
+    """
+
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.transport = transport
+        self.max_concurrency = settings.STORAGE_MAX_CONCURRENCY
+        self.retries = settings.STORAGE_RETRIES
+        self.backoff_seconds = settings.STORAGE_RETRY_BACKOFF_SECONDS
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+        self.in_flight = 0
+
+    def _ensure(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                transport=self.transport,
+                timeout=httpx.Timeout(settings.STORAGE_TIMEOUT_SECONDS, connect=settings.STORAGE_CONNECT_TIMEOUT_SECONDS),
+                limits=httpx.Limits(
+                    max_connections=settings.STORAGE_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.STORAGE_MAX_CONNECTIONS,
+                ),
             )
-            
-            # Get Public URL
-            # The get_public_url method returns a string URL
-            public_url = self.supabase.storage.from_(self.bucket_name).get_public_url(file_name)
-            
-            # Reset file pointer for subsequent reads (like local verification if needed)
-            await file.seek(0)
-            
-            return public_url
-            
-        except Exception as e:
-            print(f"Supabase Upload Error: {e}")
-            raise e
-
-    def download_file_to_temp(self, url: str, file_ext: str) -> str:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+
+    def _delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        # Exponential backoff with full jitter
+        return random.uniform(0, self.backoff_seconds * 2 ** attempt)
+
+    async def run(self, label: str, attempt_fn):
         """
-        Downloads a file from a URL to a temporary local path.
-        Returns the local path.
+        Calls attempt_fn(client) under the concurrency cap, retrying transport
+        errors and RETRY_STATUSES. attempt_fn returns the final httpx.Response
+        (or raises httpx.HTTPStatusError); the body must be re-sendable.
+        """
+        self._ensure()
+        client, semaphore = self._client, self._semaphore
+        started = time.perf_counter()
+        async with semaphore:
+            self.in_flight += 1
+            try:
+                for attempt in range(self.retries + 1):
+                    metrics.increment("storage.requests")
+                    response = None
+                    try:
+                        response = await attempt_fn(client)
+                        if response.status_code not in RETRY_STATUSES:
+                            if response.is_error:  # 304 is a valid answer to a conditional download
+                                response.raise_for_status()
+                            return response
+                        error = httpx.HTTPStatusError(
+                            f"{label}: HTTP {response.status_code}", request=response.request, response=response
+                        )
+                    except httpx.TransportError as e:
+                        error = e
+                    except httpx.HTTPStatusError as e:
+                        response = e.response
+                        if response.status_code not in RETRY_STATUSES:
+                            metrics.increment("storage.errors")
+                            raise
+                        error = e
+                    if attempt == self.retries:
+                        metrics.increment("storage.errors")
+                        raise error
+                    metrics.increment("storage.retries")
+                    delay = self._delay(attempt, response)
+                    print(f"Storage {label} failed ({error!r}), retry {attempt + 1}/{self.retries} in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+            finally:
+                self.in_flight -= 1
+                metrics.observe(f"storage.{label}", time.perf_counter() - started)
+
+    async def download(
+        self,
+        url: str,
+        dest_path: str,
+        headers: Optional[dict] = None,
+        etag: Optional[str] = None,
+        size: Optional[int] = None,
+    ) -> "Download":
+        """
+        Streams url into dest_path (rewritten from scratch on each attempt).
+        With the etag / size of a copy we already have, the request is
+        conditional: a 304, or a response without ETag whose Content-Length
+        equals `size`, comes back as not_modified without reading the body.
+        """
+        result = Download()
+        request_headers = dict(headers or {})
+        if etag:
+            request_headers["If-None-Match"] = etag
+
+        async def attempt(client: httpx.AsyncClient) -> httpx.Response:
+            nonlocal result
+            result = Download()
+            async with client.stream("GET", url, headers=request_headers) as response:
+                if response.status_code >= 400:
+                    return response
+                result.etag = response.headers.get("ETag")
+                length = response.headers.get("Content-Length")
+                if response.status_code == 304 or (
+                    size is not None and result.etag is None and length is not None and int(length) == size
+                ):
+                    result.not_modified, result.etag, result.size = True, result.etag or etag, size
+                    return response
+                digest = hashlib.sha256()
+                async with aiofiles.open(dest_path, "wb") as out:
+                    async for chunk in response.aiter_bytes(settings.STORAGE_CHUNK_SIZE):
+                        await out.write(chunk)
+                        digest.update(chunk)
+                        result.size += len(chunk)
+                result.sha256 = digest.hexdigest()
+            return response
+
+        await self.run("download", attempt)
+        if not result.not_modified:
+            metrics.increment("storage.download_bytes", result.size)
+        return result
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class SupabaseStorage:
+    name = "supabase"
+
+    def __init__(self, url: str, key: str, bucket: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.url = url.rstrip("/")
+        self.key = key
+        self.bucket = bucket
+        self.http = HttpPool(transport)
+
+    def _headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.key}", "apikey": self.key}
+
+    async def upload(self, file: UploadFile, file_name: str) -> StoredFile:
+        """Streams the upload into the bucket. StoredFile.path is the public URL."""
+        stream = UploadStream(file)
+        headers = {
+            **self._headers(),
+            "Content-Type": file.content_type or "application/octet-stream",
+            # Object names are unique per upload, so overwriting makes a retried upload idempotent
+            "x-upsert": "true",
+        }
+        if file.size is not None:
+            # Known length: plain streamed body; otherwise httpx sends it chunked
+            headers["Content-Length"] = str(file.size)
+
+        url = f"{self.url}/storage/v1/object/{self.bucket}/{file_name}"
+        await self.http.run("upload", lambda client: client.post(url, content=stream, headers=headers))
+        return stream.stored(await self.public_url(file_name))
+
+    async def public_url(self, file_name: str) -> str:
+        return f"{self.url}/storage/v1/object/public/{self.bucket}/{file_name}"
+
+    async def delete(self, location: str) -> None:
+        file_name = location.rsplit("/", 1)[-1]
+        url = f"{self.url}/storage/v1/object/{self.bucket}/{file_name}"
+        await self.http.run("delete", lambda client: client.delete(url, headers=self._headers()))
+
+    async def download(self, location: str, dest_path: str, etag: Optional[str] = None, size: Optional[int] = None) -> Download:
+        # Our own bucket gets the service key (works for private buckets too)
+        headers = self._headers() if location.startswith(self.url) else None
+        return await self.http.download(location, dest_path, headers, etag, size)
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+
+class LocalStorage:
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.http = HttpPool()  # Only for documents stored remotely before switching to local
+
+    async def upload(self, file: UploadFile, file_name: str) -> StoredFile:
+        """Streams the upload to <root>/<file_name> (written to a .part file, then renamed)."""
+        path = await self.public_url(file_name)
+        stream = UploadStream(file)
+        partial = f"{path}.part"
+        started = time.perf_counter()
+        try:
+            async with aiofiles.open(partial, "wb") as out:
+                async for chunk in stream:
+                    await out.write(chunk)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.unlink(partial)
+            raise
+        metrics.observe("storage.upload", time.perf_counter() - started)
+        return stream.stored(path)
+
+    async def public_url(self, file_name: str) -> str:
+        # Relative path, served by the /uploads static mount
+        return f"{self.root}/{file_name}"
+
+    async def delete(self, location: str) -> None:
+        try:
+            os.unlink(location)
+        except FileNotFoundError:
+            pass
+
+    async def download(self, location: str, dest_path: str, etag: Optional[str] = None, size: Optional[int] = None) -> Download:
+        return await self.http.download(location, dest_path, etag=etag, size=size)
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+
+class StorageService:
+    def __init__(self, backend=None):
+        self.backend = backend or self._default_backend()
+
+    @staticmethod
+    def _default_backend():
+        configured = settings.STORAGE_BACKEND
+        has_supabase = bool(settings.SUPABASE_URL and settings.SUPABASE_KEY)
+        if configured == "supabase" or (configured == "auto" and has_supabase):
+            if not has_supabase:
+                raise RuntimeError("STORAGE_BACKEND=supabase needs SUPABASE_URL and SUPABASE_KEY")
+            return SupabaseStorage(settings.SUPABASE_URL, settings.SUPABASE_KEY, settings.SUPABASE_BUCKET)
+        if configured == "auto":
+            print("WARNING: Supabase not configured, using local storage (files will be lost on restart)")
+        return LocalStorage(settings.STORAGE_LOCAL_DIR)
+
+    async def upload(self, file: UploadFile, file_name: str) -> StoredFile:
+        return await self.backend.upload(file, file_name)
+
+    async def public_url(self, file_name: str) -> str:
+        return await self.backend.public_url(file_name)
+
+    async def delete(self, location: str) -> None:
+        """Removes a stored file (URL or local path, as returned by upload)."""
+        await self.backend.delete(location)
+        metrics.increment("storage.deletes")
+
+    async def download_to_temp(self, location: str, file_ext: str) -> str:
+        """
+        Downloads a stored file (URL) to a temporary local path.
+        Returns the local path; the caller deletes it.
         """
-        import tempfile
-        
-        # Create temp file
         fd, temp_path = tempfile.mkstemp(suffix=f".{file_ext}")
-        os.close(fd) # Close file descriptor, we'll write via requests
-        
+        os.close(fd)  # Written through aiofiles
         try:
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            
-            with open(temp_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-                    
+            await self.backend.download(location, temp_path)
             return temp_path
-        except Exception as e:
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-            raise e
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    @asynccontextmanager
+    async def local_copy(self, location: str, file_ext: str):
+        """
+        Yields a local path with the content of a stored file: the path itself
+        for local files, otherwise a download cache entry (revalidated against
+        the remote object) or, with the cache disabled, a temp file deleted on exit.
+        """
+        if not location.startswith(("http://", "https://")):
+            yield location
+        elif download_cache.enabled:
+            async with download_cache.open(
+                location, lambda dest, etag, size: self.backend.download(location, dest, etag, size)
+            ) as path:
+                yield path
+        else:
+            path = await self.download_to_temp(location, file_ext)
+            try:
+                yield path
+            finally:
+                os.unlink(path)
+
+    async def aclose(self) -> None:
+        await self.backend.aclose()
+
+    def stats(self) -> dict:
+        http = self.backend.http
+        return {
+            "backend": self.backend.name,
+            "in_flight": http.in_flight,
+            "max_concurrency": http.max_concurrency,
+            "max_connections": settings.STORAGE_MAX_CONNECTIONS,
+            "retries": http.retries,
+        }
+
 
 storage_service = StorageService()
+metrics.register_collector("storage", storage_service.stats)
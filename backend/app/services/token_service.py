@@ -0,0 +1,139 @@
+"""
+Refresh Token Service - rotating refresh tokens with server-side revocation.
+
+A login issues a short-lived JWT access token plus an opaque refresh token. Only
+the refresh token's SHA-256 is stored (the token itself is 256 random bits, so a
+fast hash is enough), under a unique index: POST /auth/refresh costs one indexed
+lookup instead of a bcrypt verification or a biometric lookup.
+
+Every refresh rotates the token. Tokens descending from one login share a
+family_id; presenting a token that was already rotated means it leaked (or a
+client replayed it), so the whole family is revoked. Logout revokes the family.
+
+Counters auth.logins / auth.refreshes and the "auth" collector on /metrics show
+how much re-authentication refresh tokens absorb.
+"""
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.models.models import RefreshToken, User
+
+
+def _hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _invalid() -> HTTPException:
+    return HTTPException(status_code=401, detail="Invalid or expired refresh token")
+
+
+class RefreshTokenService:
+    def __init__(self, expire_days: float):
+        self.expire_days = expire_days
+
+    @property
+    def expires_in(self) -> int:
+        return int(self.expire_days * 86400)
+
+    def _new(self, db: AsyncSession, user_id: uuid.UUID, family_id: uuid.UUID) -> Tuple[str, RefreshToken]:
+        token = secrets.token_urlsafe(32)
+        row = RefreshToken(
+            id=uuid.uuid4(),
+            user_id=user_id,
+            token_hash=_hash(token),
+            family_id=family_id,
+            expires_at=datetime.now(timezone.utc) + timedelta(days=self.expire_days),
+        )
+        db.add(row)
+        return token, row
+
+    async def issue(self, db: AsyncSession, user_id: uuid.UUID, method: str) -> str:
+        """New token family for a fresh login (method: password / biometric)."""
+        token, _ = self._new(db, user_id, family_id=uuid.uuid4())
+        await db.commit()
+        metrics.increment("auth.logins")
+        metrics.increment(f"auth.logins.{method}")
+        return token
+
+    async def rotate(self, db: AsyncSession, token: str) -> Tuple[uuid.UUID, str]:
+        """Exchanges a refresh token for its successor. Returns (user id, new refresh token)."""
+        row = (await db.execute(
+            select(RefreshToken, User.is_active)
+            .join(User, User.id == RefreshToken.user_id)
+            .where(RefreshToken.token_hash == _hash(token))
+        )).first()
+        if row is None:
+            raise _invalid()
+        current, is_active = row
+        user_id, family_id = current.user_id, current.family_id  # Still readable after a rollback
+
+        now = datetime.now(timezone.utc)
+        if current.replaced_by is not None:
+            await self._reuse_detected(db, user_id, family_id, now)
+        if current.revoked_at is not None or current.expires_at <= now or not is_active:
+            raise _invalid()
+
+        new_token, successor = self._new(db, user_id, family_id)
+        # Conditional on the token still being live, so two concurrent refreshes
+        # with the same token cannot both get a successor
+        rotated = await db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.id == current.id, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=now, replaced_by=successor.id)
+        )
+        if rotated.rowcount != 1:
+            await db.rollback()
+            await self._reuse_detected(db, user_id, family_id, now)
+        await db.commit()
+        metrics.increment("auth.refreshes")
+        return user_id, new_token
+
+    async def revoke(self, db: AsyncSession, token: str) -> bool:
+        """Logout: revokes the token's whole family. False if the token is unknown."""
+        family_id = (await db.execute(
+            select(RefreshToken.family_id).where(RefreshToken.token_hash == _hash(token))
+        )).scalar()
+        if family_id is None:
+            return False
+        await self._revoke_family(db, family_id, datetime.now(timezone.utc))
+        await db.commit()
+        return True
+
+    async def _reuse_detected(self, db: AsyncSession, user_id: uuid.UUID, family_id: uuid.UUID, now: datetime) -> None:
+        """A rotated token was presented again - it leaked or was replayed, so end the whole session."""
+        await self._revoke_family(db, family_id, now)
+        await db.commit()
+        metrics.increment("auth.refresh_reuse_detected")
+        print(f"Refresh token reuse detected for user {user_id}, family {family_id} revoked")
+        raise _invalid()
+
+    async def _revoke_family(self, db: AsyncSession, family_id: uuid.UUID, now: datetime) -> None:
+        await db.execute(
+            update(RefreshToken)
+            .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+            .values(revoked_at=now)
+        )
+
+    def stats(self) -> dict:
+        logins = metrics.get_counter("auth.logins")
+        refreshes = metrics.get_counter("auth.refreshes")
+        return {
+            "logins": logins,
+            "refreshes": refreshes,
+            # Share of sessions kept alive by a refresh instead of a full login
+            "refreshes_per_login": round(refreshes / logins, 3) if logins else None,
+            "reuse_detected": metrics.get_counter("auth.refresh_reuse_detected"),
+        }
+
+
+token_service = RefreshTokenService(expire_days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+metrics.register_collector("auth", token_service.stats)
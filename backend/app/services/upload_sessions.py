@@ -0,0 +1,313 @@
+"""
+Upload Sessions - resumable, chunked uploads for large files.
+
+A client creates a session with the file's name, size and target pipeline
+("document" or "transcription"). It then PUTs the file in pieces of
+UPLOAD_SESSION_CHUNK_SIZE bytes. Each PUT carries a Content-Range and the
+piece's SHA-256 (X-Chunk-SHA256). Pieces can arrive in any order and can be
+re-sent. Each body is streamed straight into its place in a preallocated
+file, so nothing is buffered in memory. Document uploads are rejected as soon
+as the chunks holding the file header or trailer fail validation
+(app/services/upload_validation.py). After a dropped connection, the
+client reads the session status and re-sends only the missing chunks.
+Finalizing checks that every chunk arrived, and optionally the whole-file
+SHA-256. It then hands the assembled file to the regular pipeline.
+
+On disk, under UPLOAD_SESSION_DIR/<session id>/:
+
+    session.json     owner, file name, size, chunk size, target, expiry
+    data             the file being assembled (sparse until complete)
+    chunks/<index>   SHA-256 of each verified chunk
+    lock             flock: shared while a chunk is written, exclusive while finalizing
+    chunks/<index>.lock  flock: exclusive while that chunk is written (a retry cannot
+                     interleave its bytes with the original's)
+
+All state is on disk, so any worker process on the host can serve any
+request of a session. Sessions not finalized within UPLOAD_SESSION_TTL_SECONDS
+are removed.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import aiofiles
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.download_cache import FileLock
+from app.services.upload_validation import HEAD_BYTES, TAIL_BYTES, upload_validator
+
+_CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+class UploadSession:
+    def __init__(self, path: str, meta: dict):
+        self.path = path
+        self.meta = meta
+
+    @property
+    def id(self) -> str:
+        return self.meta["id"]
+
+    @property
+    def size(self) -> int:
+        return self.meta["size"]
+
+    @property
+    def chunk_size(self) -> int:
+        return self.meta["chunk_size"]
+
+    @property
+    def chunk_count(self) -> int:
+        return -(-self.size // self.chunk_size)
+
+    @property
+    def data_path(self) -> str:
+        return os.path.join(self.path, "data")
+
+    def chunk_length(self, index: int) -> int:
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def chunk_marker(self, index: int) -> str:
+        return os.path.join(self.path, "chunks", str(index))
+
+    def lock(self, shared: bool = False) -> FileLock:
+        return FileLock(os.path.join(self.path, "lock"), shared)
+
+    def chunk_lock(self, index: int) -> FileLock:
+        return FileLock(os.path.join(self.path, "chunks", f"{index}.lock"))
+
+    def received(self) -> list:
+        return sorted(int(name) for name in os.listdir(os.path.join(self.path, "chunks")) if name.isdigit())
+
+    def status(self) -> dict:
+        received = set(self.received())
+        missing = [i for i in range(self.chunk_count) if i not in received]
+        return {
+            "id": self.id,
+            "target": self.meta["target"],
+            "filename": self.meta["filename"],
+            "size": self.size,
+            "chunk_size": self.chunk_size,
+            "chunk_count": self.chunk_count,
+            "received_bytes": sum(self.chunk_length(i) for i in received),
+            "missing": missing,
+            "complete": not missing,
+            "expires_at": self.meta["expires_at"],
+        }
+
+
+class UploadSessionService:
+    def __init__(self, root: str, chunk_size: int, max_bytes: int, ttl_seconds: int):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(root, exist_ok=True)
+
+    def create(self, user_id: uuid.UUID, filename: str, size: int, target: str, title: Optional[str] = None) -> UploadSession:
+        if size <= 0:
+            raise HTTPException(status_code=400, detail="File is empty")
+        if size > self.max_bytes:
+            raise HTTPException(status_code=413, detail=f"File too large (max {self.max_bytes} bytes)")
+        self.sweep()
+
+        session_id = str(uuid.uuid4())
+        path = os.path.join(self.root, session_id)
+        os.makedirs(os.path.join(path, "chunks"))
+        with open(os.path.join(path, "data"), "wb") as f:
+            f.truncate(size)  # Sparse: disk is only used as chunks arrive
+        meta = {
+            "id": session_id,
+            "user_id": str(user_id),
+            "filename": filename,
+            "title": title,
+            "target": target,
+            "size": size,
+            "chunk_size": self.chunk_size,
+            "expires_at": time.time() + self.ttl_seconds,
+        }
+        self._write_json(os.path.join(path, "session.json"), meta)
+        metrics.increment("upload_sessions.created")
+        return UploadSession(path, meta)
+
+    def get(self, session_id: str, user_id: uuid.UUID) -> Optional[UploadSession]:
+        """The caller's session, or None if it does not exist, belongs to someone else or has expired."""
+        try:
+            session_id = str(uuid.UUID(session_id))  # Also keeps the id from naming another path
+        except ValueError:
+            return None
+        path = os.path.join(self.root, session_id)
+        try:
+            with open(os.path.join(path, "session.json")) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta["user_id"] != str(user_id) or meta["expires_at"] < time.time():
+            return None
+        return UploadSession(path, meta)
+
+    def _chunk_index(self, session: UploadSession, content_range: Optional[str]) -> int:
+        match = _CONTENT_RANGE.match(content_range or "")
+        if not match:
+            raise HTTPException(status_code=400, detail="Content-Range header required: bytes <start>-<end>/<size>")
+        start, end, total = (int(g) for g in match.groups())
+        index = start // session.chunk_size
+        if (
+            total != session.size or start % session.chunk_size or index >= session.chunk_count
+            or end - start + 1 != session.chunk_length(index)
+        ):
+            raise HTTPException(
+                status_code=416,
+                detail=f"Range must cover exactly one chunk: {session.chunk_size}-byte chunks of a {session.size}-byte file",
+            )
+        return index
+
+    async def write_chunk(
+        self, session: UploadSession, content_range: Optional[str], chunk_sha256: Optional[str],
+        body: AsyncIterator[bytes]
+    ) -> dict:
+        """
+        Streams one chunk (a request body) into place and records it once its SHA-256 matches.
+        Re-sending a chunk overwrites it.
+        """
+        index = self._chunk_index(session, content_range)
+        expected = (chunk_sha256 or "").lower()
+        if not _SHA256.match(expected):
+            raise HTTPException(status_code=400, detail="X-Chunk-SHA256 header required (hex SHA-256 of the chunk)")
+
+        lock = session.lock(shared=True)
+        if not lock.try_acquire():
+            raise HTTPException(status_code=409, detail="Upload is being finalized")
+        chunk_lock = session.chunk_lock(index)
+        if not chunk_lock.try_acquire():
+            lock.release()
+            raise HTTPException(status_code=409, detail=f"Chunk {index} is already being written, retry once that request ends")
+        try:
+            marker = session.chunk_marker(index)
+            if os.path.exists(marker):
+                os.unlink(marker)  # The bytes are about to change: not received until verified again
+            length, offset = session.chunk_length(index), index * session.chunk_size
+            digest, written = hashlib.sha256(), 0
+            async with aiofiles.open(session.data_path, "r+b") as out:
+                await out.seek(offset)
+                async for piece in body:
+                    written += len(piece)
+                    if written > length:
+                        raise HTTPException(status_code=400, detail=f"Chunk {index} body is longer than its Content-Range")
+                    digest.update(piece)
+                    await out.write(piece)
+            if written != length:
+                raise HTTPException(status_code=400, detail=f"Chunk {index} body is shorter than its Content-Range")
+            if digest.hexdigest() != expected:
+                metrics.increment("upload_sessions.checksum_failures")
+                raise HTTPException(status_code=400, detail=f"Chunk {index} checksum mismatch, send it again")
+            self._write_json(marker, expected)
+        finally:
+            chunk_lock.release()
+            lock.release()
+        metrics.increment("upload_sessions.chunks")
+        metrics.increment("upload_sessions.bytes", length)
+        try:
+            self._check_content(session, index)
+        except HTTPException:
+            self.discard(session)  # Wrong or damaged file: no point receiving the rest
+            raise
+        return session.status()
+
+    def _check_content(self, session: UploadSession, index: int) -> None:
+        """Documents: header / trailer checks as soon as the chunks holding them are in."""
+        if session.meta["target"] != "document":
+            return
+        file_ext = session.meta["filename"].rsplit(".", 1)[-1].lower()
+        tail_start = max(0, session.size - TAIL_BYTES)
+        tail_chunks = range(tail_start // session.chunk_size, session.chunk_count)
+        with open(session.data_path, "rb") as f:
+            if index == 0:
+                upload_validator.check_head(f.read(min(HEAD_BYTES, session.chunk_length(0))), file_ext)
+            if index in tail_chunks and set(tail_chunks) <= set(session.received()):
+                f.seek(tail_start)
+                upload_validator.check_tail(f.read(), file_ext)
+
+    @asynccontextmanager
+    async def finalizing(self, session: UploadSession, sha256: Optional[str] = None):
+        """
+        Yields the path of the complete, verified file for the caller to hand on (it may move it).
+        The session is removed when the block succeeds; if the block raises, it stays and
+        finalizing can be retried.
+        """
+        lock = session.lock()
+        if not lock.try_acquire():
+            raise HTTPException(status_code=409, detail="Chunks are still being written or the upload is already being finalized")
+        try:
+            if not os.path.exists(session.data_path):
+                raise HTTPException(status_code=409, detail="Upload already finalized")
+            status = session.status()
+            if not status["complete"]:
+                raise HTTPException(status_code=409, detail=f"Missing chunks: {status['missing'][:20]}")
+            if sha256:
+                actual = await run_in_threadpool(self._file_sha256, session.data_path)
+                if actual != sha256.lower():
+                    raise HTTPException(status_code=400, detail="File checksum mismatch")
+            yield session.data_path
+            shutil.rmtree(session.path, ignore_errors=True)
+            metrics.increment("upload_sessions.finalized")
+        finally:
+            lock.release()
+
+    def discard(self, session: UploadSession) -> None:
+        shutil.rmtree(session.path, ignore_errors=True)
+
+    def sweep(self) -> int:
+        """Removes expired sessions. Returns how many."""
+        removed, now = 0, time.time()
+        for session_id in os.listdir(self.root):
+            path = os.path.join(self.root, session_id)
+            try:
+                with open(os.path.join(path, "session.json")) as f:
+                    expired = json.load(f)["expires_at"] < now
+            except (OSError, ValueError, KeyError):
+                # Half-created (or damaged) sessions go once they are older than the TTL
+                expired = os.path.getmtime(path) + self.ttl_seconds < now if os.path.exists(path) else False
+            if expired:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+        if removed:
+            metrics.increment("upload_sessions.expired", removed)
+        return removed
+
+    @staticmethod
+    def _file_sha256(path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(settings.STORAGE_CHUNK_SIZE), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _write_json(self, path: str, value) -> None:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.replace(tmp, path)
+
+    def stats(self) -> dict:
+        return {"dir": self.root, "sessions": len(os.listdir(self.root)), "chunk_size": self.chunk_size}
+
+
+upload_sessions = UploadSessionService(
+    root=settings.UPLOAD_SESSION_DIR,
+    chunk_size=settings.UPLOAD_SESSION_CHUNK_SIZE,
+    max_bytes=settings.UPLOAD_SESSION_MAX_BYTES,
+    ttl_seconds=settings.UPLOAD_SESSION_TTL_SECONDS,
+)
+metrics.register_collector("upload_sessions", upload_sessions.stats)
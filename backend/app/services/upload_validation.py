@@ -0,0 +1,108 @@
+"""
+Upload Validation - rejects bad document uploads before they are stored or ingested.
+
+Checks, cheapest first:
+
+1. size against DOCUMENT_MAX_BYTES
+2. the first bytes: a PDF must start with %PDF- (readers allow up to 1 KB of
+   leading junk); a text file must be UTF-8 without NUL bytes
+3. the PDF trailer: the last 1 KB must hold startxref and %%EOF
+4. the PDF structure (pypdf, in the threadpool): readable, not locked by a user
+   password, at most DOCUMENT_MAX_PAGES pages. The page count comes from the
+   page tree; no page content is parsed.
+
+Multipart uploads are checked from the request's spool file. Resumable uploads
+check the head and trailer as soon as the chunks holding them arrive, and run
+everything again when completed.
+
+Rejections are counted on /metrics ("uploads.rejected.<reason>").
+"""
+from typing import Optional
+
+from fastapi import HTTPException, UploadFile
+from pypdf import PasswordType, PdfReader
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+DOCUMENT_EXTENSIONS = (".pdf", ".txt")
+PDF_MAGIC = b"%PDF-"
+HEAD_BYTES = 8192  # Enough for the PDF header search and a meaningful UTF-8 / NUL sniff of text
+TAIL_BYTES = 1024
+
+
+class UploadValidator:
+    def __init__(self, max_bytes: int, max_pages: int):
+        self.max_bytes = max_bytes
+        self.max_pages = max_pages
+
+    def _reject(self, status_code: int, reason: str, detail: str):
+        metrics.increment(f"uploads.rejected.{reason}")
+        raise HTTPException(status_code=status_code, detail=detail)
+
+    def check_size(self, size: int) -> None:
+        if size == 0:
+            self._reject(400, "empty", "File is empty")
+        if size > self.max_bytes:
+            self._reject(413, "too_large", f"File too large (max {self.max_bytes} bytes)")
+
+    def check_head(self, head: bytes, file_ext: str) -> None:
+        """head: the first HEAD_BYTES of the file (or all of it, if shorter)."""
+        if file_ext == "pdf":
+            if PDF_MAGIC not in head[:1024]:
+                self._reject(415, "not_pdf", "File is not a PDF (no %PDF- header)")
+            return
+        if b"\x00" in head:
+            self._reject(415, "not_text", "File is not plain text (binary content)")
+        try:
+            head.decode("utf-8")
+        except UnicodeDecodeError as e:
+            if e.start < len(head) - 3:  # Not just a multi-byte character cut off by the sniff window
+                self._reject(415, "not_text", "Text files must be UTF-8")
+
+    def check_tail(self, tail: bytes, file_ext: str) -> None:
+        """tail: the last TAIL_BYTES of the file (or all of it, if shorter)."""
+        if file_ext == "pdf" and (b"%%EOF" not in tail or b"startxref" not in tail):
+            self._reject(422, "truncated_pdf", "PDF is truncated or damaged (no trailer)")
+
+    def check_pdf(self, stream) -> int:
+        """Opens the PDF structure from a binary file object (blocking). Returns the page count."""
+        try:
+            reader = PdfReader(stream, strict=False)
+            if reader.is_encrypted and reader.decrypt("") == PasswordType.NOT_DECRYPTED:
+                self._reject(422, "encrypted_pdf", "PDF is password protected")
+            pages = len(reader.pages)
+        except HTTPException:
+            raise
+        except Exception as e:
+            self._reject(422, "unreadable_pdf", f"PDF could not be read: {e}")
+        if pages == 0:
+            self._reject(422, "unreadable_pdf", "PDF has no pages")
+        if pages > self.max_pages:
+            self._reject(413, "too_many_pages", f"PDF has {pages} pages (max {self.max_pages})")
+        return pages
+
+    async def validate(self, file: UploadFile, file_ext: str) -> Optional[int]:
+        """
+        Runs every check on an upload. Returns the page count for PDFs (None for text).
+        Leaves the file positioned at the start.
+        """
+        file_ext = file_ext.lower()
+        size = file.size
+        if size is None:
+            size = await run_in_threadpool(lambda: file.file.seek(0, 2))
+        self.check_size(size)
+        await file.seek(0)
+        self.check_head(await file.read(HEAD_BYTES), file_ext)
+        pages = None
+        if file_ext == "pdf":
+            await file.seek(max(0, size - TAIL_BYTES))
+            self.check_tail(await file.read(TAIL_BYTES), file_ext)
+            await file.seek(0)
+            pages = await run_in_threadpool(self.check_pdf, file.file)
+        await file.seek(0)
+        return pages
+
+
+upload_validator = UploadValidator(max_bytes=settings.DOCUMENT_MAX_BYTES, max_pages=settings.DOCUMENT_MAX_PAGES)
@@ -0,0 +1,106 @@
+"""
+Benchmark: concurrent request throughput on ONE worker, sync Session vs AsyncSession.
+
+Both endpoints run the same "list my documents" query as the API, plus a
+pg_sleep() that stands in for network round-trip / query time. The "sync"
+endpoint reproduces the old pattern (blocking Session inside an async def);
+the "async" endpoint uses the AsyncSession dependency.
+
+Usage:
+    python bench_async_db.py [--requests 400] [--concurrency 50] [--latency-ms 20]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import os
+import time
+import uuid
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import FastAPI, Depends
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_db
+from app.db.session import SessionLocal, engine, async_engine
+from app.models.models import Document
+
+USER_ID = uuid.uuid4()  # No rows needed - the query shape is what matters
+LATENCY = 0.02
+
+app = FastAPI()
+
+
+@app.get("/sync")
+async def list_sync():
+    db = SessionLocal()
+    try:
+        db.execute(text("SELECT pg_sleep(:d)"), {"d": LATENCY})
+        docs = db.execute(
+            select(Document).where(Document.user_id == USER_ID).order_by(Document.created_at.desc())
+        ).scalars().all()
+        return {"count": len(docs)}
+    finally:
+        db.close()
+
+
+@app.get("/async")
+async def list_async(db: AsyncSession = Depends(get_db)):
+    await db.execute(text("SELECT pg_sleep(:d)"), {"d": LATENCY})
+    result = await db.execute(
+        select(Document).where(Document.user_id == USER_ID).order_by(Document.created_at.desc())
+    )
+    return {"count": len(result.scalars().all())}
+
+
+async def run(path: str, total: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        # Warm up the pools
+        await asyncio.gather(*[one() for _ in range(min(concurrency, 10))])
+        latencies.clear()
+
+        started = time.perf_counter()
+        await asyncio.gather(*[one() for _ in range(total)])
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "req_per_s": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def main(args):
+    global LATENCY
+    LATENCY = args.latency_ms / 1000
+
+    print(f"--- {args.requests} requests, concurrency {args.concurrency}, {args.latency_ms}ms simulated DB latency ---")
+    for label, path in (("sync Session (before)", "/sync"), ("AsyncSession (after)", "/async")):
+        result = await run(path, args.requests, args.concurrency)
+        print(f"{label:24s} {result['req_per_s']:8.1f} req/s   p50 {result['p50_ms']:7.1f}ms   p95 {result['p95_ms']:7.1f}ms")
+
+    await async_engine.dispose()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    asyncio.run(main(parser.parse_args()))
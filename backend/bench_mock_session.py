@@ -0,0 +1,179 @@
+"""
+Benchmark / smoke test for the in-memory database (USE_MOCK_DB, app/db/mock_session.py).
+
+1. Drives the real API in-process (httpx ASGITransport) through the auth, document,
+   search, chat and transcription endpoints - no Postgres, no network. Embeddings and
+   the LLM are replaced by deterministic fakes.
+2. Times the store directly: an indexed equality lookup vs a filter that has to scan,
+   and a brute-force vector search over N chunks.
+
+Usage:
+    python bench_mock_session.py [--users 20000] [--chunks 20000]
+"""
+import argparse
+import asyncio
+import hashlib
+import sys
+import os
+import time
+import uuid
+
+os.environ["USE_MOCK_DB"] = "true"
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+import numpy as np
+from langchain_core.messages import AIMessage
+from sqlalchemy import func, select
+
+from app.main import app
+from app.db.mock_session import MockAsyncSession, reset_mock_db
+from app.models.models import AccessDocumentChunk, Document, User
+from app.services.rag_service import rag_service
+
+API = "/api/v1"
+DIMENSIONS = 1536
+
+
+class FakeEmbeddings:
+    def _vector(self, text: str) -> list:
+        digest = hashlib.sha256(text.lower().encode()).digest()
+        v = np.frombuffer(digest * (DIMENSIONS // 32), dtype=np.uint8).astype(np.float32) - 127.5
+        return (v / np.linalg.norm(v)).tolist()
+
+    def embed_query(self, text: str) -> list:
+        return self._vector(text)
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> list:
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: list) -> list:
+        return [self._vector(t) for t in texts]
+
+
+class FakeLLM:
+    async def ainvoke(self, messages):
+        return AIMessage(content="Fake answer")
+
+    def invoke(self, messages):
+        return AIMessage(content="Fake answer")
+
+
+async def api_pass() -> bool:
+    rag_service.embeddings = FakeEmbeddings()
+    rag_service.llm = FakeLLM()
+
+    timings, ok = [], True
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def call(label, method, path, expect=200, **kwargs):
+            nonlocal ok
+            start = time.perf_counter()
+            response = await client.request(method, f"{API}{path}", **kwargs)
+            timings.append((label, (time.perf_counter() - start) * 1000, response.status_code))
+            if response.status_code != expect:
+                ok = False
+                print(f"❌ {label}: {response.status_code} {response.text[:200]}")
+            return response
+
+        password = "SecurePassword123!"
+        await call("register", "POST", "/auth/register", json={
+            "email": "bench@access.ai", "password": password, "confirm_password": password, "full_name": "Bench"
+        })
+        await call("register (duplicate)", "POST", "/auth/register", expect=400, json={
+            "email": "bench@access.ai", "password": password, "confirm_password": password, "full_name": "Bench"
+        })
+        login = await call("login", "POST", "/auth/login", json={"email": "bench@access.ai", "password": password})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        await call("me", "GET", "/auth/me", headers=headers)
+        text = "ACCESS.AI policy.\n\nAll features must meet WCAG 2.1 AA.\n\nCaptions are required for video."
+        upload = await call("upload", "POST", "/documents/", headers=headers,
+                            files={"file": ("policy.txt", text.encode(), "text/plain")})
+        doc_id = upload.json().get("id") or upload.json().get("document_id")
+        await call("list documents", "GET", "/documents/", headers=headers)
+        await call("get document", "GET", f"/documents/{doc_id}", headers=headers)
+        search = await call("search", "POST", "/documents/search", headers=headers, json={"query": "WCAG"})
+        if not search.json():
+            ok = False
+            print("❌ search returned no chunks")
+        await call("chat", "POST", f"/documents/{doc_id}/chat", headers=headers, json={"query": "Which standard?"})
+        await call("chat (follow-up)", "POST", f"/documents/{doc_id}/chat", headers=headers, json={"query": "And video?"})
+        await call("clear chat", "DELETE", f"/documents/{doc_id}/chat", headers=headers)
+        await call("list transcriptions", "GET", "/transcribe/list", headers=headers)
+        await call("missing transcription", "GET", f"/transcribe/{uuid.uuid4()}", expect=404, headers=headers)
+
+    print(f"{'endpoint':<24} {'status':>6} {'ms':>8}")
+    for label, ms, status in timings:
+        print(f"{label:<24} {status:>6} {ms:>8.2f}")
+    print(f"{'total':<24} {'':>6} {sum(t[1] for t in timings):>8.2f}")
+    return ok
+
+
+async def timed(db, stmt, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        (await db.execute(stmt)).all()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+async def store_bench(users: int, chunks: int) -> None:
+    reset_mock_db()
+    rng = np.random.default_rng(0)
+    async with MockAsyncSession() as db:
+        start = time.perf_counter()
+        db.add_all([User(email=f"user{i}@access.ai", password_hash="x", full_name=f"User {i}") for i in range(users)])
+        owner = User(email="owner@access.ai", password_hash="x", full_name="Owner")
+        db.add(owner)
+        await db.flush()
+        doc = Document(user_id=owner.id, title="bench.txt", file_path="bench.txt", file_type="txt")
+        db.add(doc)
+        await db.flush()
+        vectors = rng.standard_normal((chunks, DIMENSIONS), dtype=np.float32)
+        db.add_all([
+            AccessDocumentChunk(document_id=doc.id, owner_id=owner.id, chunk_index=i, text_content=f"chunk {i}",
+                                embedding=vectors[i])
+            for i in range(chunks)
+        ])
+        await db.commit()
+        print(f"\nLoaded {users} users and {chunks} chunks in {(time.perf_counter() - start):.2f}s")
+
+        target = f"user{users // 2}@access.ai"
+        indexed = await timed(db, select(User).where(User.email == target), 200)
+        scanned = await timed(db, select(User).where(func.lower(User.email) == target), 5)
+        print(f"User by email, hash index:  {indexed:8.3f} ms")
+        print(f"User by email, full scan:   {scanned:8.3f} ms")
+
+        query = rng.standard_normal(DIMENSIONS, dtype=np.float32)
+        distance = AccessDocumentChunk.embedding.l2_distance(query.tolist()).label("distance")
+        stmt = select(AccessDocumentChunk, Document, distance).join(Document) \
+            .where(AccessDocumentChunk.owner_id == owner.id).order_by(distance).limit(5)
+        print(f"Vector top-5 of {chunks}:   {await timed(db, stmt, 5):8.3f} ms")
+
+        expected = np.argsort(np.linalg.norm(vectors - query, axis=1))[:5].tolist()
+        got = [chunk.chunk_index for chunk, _, _ in (await db.execute(stmt)).all()]
+        print(f"Top-5 matches NumPy argsort: {'✅' if got == expected else '❌'}")
+
+
+async def main() -> bool:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--chunks", type=int, default=20000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    ok = await api_pass()
+    print(f"API pass: {'✅' if ok else '❌'} in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    await store_bench(args.users, args.chunks)
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
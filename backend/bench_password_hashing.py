@@ -0,0 +1,122 @@
+"""
+Benchmark: password hashing cost and login throughput.
+
+1. bcrypt verify time and verifies / second / core for a range of costs, to pick
+   PASSWORD_BCRYPT_ROUNDS.
+2. Concurrent POST /auth/login through the real app (in-process, in-memory DB)
+   at the configured cost: logins / second, per hashing worker, latency and the
+   hashing pool's queue statistics. Requests beyond PASSWORD_HASH_MAX_QUEUE get 503.
+3. Rehash-on-login: a user whose hash was made with another cost logs in and
+   comes out with a hash at the configured cost.
+
+Usage:
+    python bench_password_hashing.py [--logins 64] [--concurrency 16] [--rounds 10 11 12 13]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+os.environ["USE_MOCK_DB"] = "true"
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from passlib.context import CryptContext
+from sqlalchemy import select
+
+from app.main import app
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.password_hasher import password_hasher
+from app.db.mock_session import MockAsyncSession
+from app.models.models import User
+
+API = "/api/v1"
+PASSWORD = "SecurePassword123!"
+
+
+def cost_table(rounds: list) -> None:
+    print(f"{'rounds':>6} {'verify ms':>10} {'verifies/s/core':>16}")
+    for r in rounds:
+        context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=r)
+        password_hash = context.hash(PASSWORD)
+        samples = []
+        for _ in range(max(3, 2 ** (14 - r))):
+            start = time.perf_counter()
+            context.verify(PASSWORD, password_hash)
+            samples.append(time.perf_counter() - start)
+        ms = statistics.median(samples) * 1000
+        print(f"{r:>6} {ms:>10.1f} {1000 / ms:>16.1f}")
+
+
+async def login_storm(client, logins: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def login(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(f"{API}/auth/login", json={"email": f"storm{i % 8}@access.ai", "password": PASSWORD})
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login(i) for i in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    ok = statuses.get(200, 0)
+    cores = min(password_hasher.workers, os.cpu_count() or 1)
+    latencies.sort()
+    print(f"\n{logins} logins, concurrency {concurrency}, cost {settings.PASSWORD_BCRYPT_ROUNDS}, "
+          f"{password_hasher.workers} hashing workers on {os.cpu_count()} CPUs")
+    print(f"Statuses:          {statuses}")
+    print(f"Logins/s:          {ok / elapsed:.1f} ({ok / elapsed / cores:.1f} per core)")
+    print(f"Latency p50 / p95: {latencies[len(latencies) // 2] * 1000:.0f} / {latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms")
+    timings = metrics.snapshot()["timings"]
+    for name in ("password_hasher.wait", "password_hasher.hash"):
+        t = timings.get(name)
+        if t:
+            print(f"{name + ':':<27}avg {t['total_seconds'] / t['count'] * 1000:.0f} ms, max {t['max_seconds'] * 1000:.0f} ms")
+
+
+async def rehash_check(client) -> bool:
+    old_cost = 10 if settings.PASSWORD_BCRYPT_ROUNDS != 10 else 11
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=old_cost).hash(PASSWORD)
+    async with MockAsyncSession() as db:
+        db.add(User(email="legacy@access.ai", full_name="Legacy", password_hash=old_hash))
+        await db.commit()
+
+    response = await client.post(f"{API}/auth/login", json={"email": "legacy@access.ai", "password": PASSWORD})
+    async with MockAsyncSession() as db:
+        new_hash = (await db.execute(select(User.password_hash).where(User.email == "legacy@access.ai"))).scalar()
+    ok = response.status_code == 200 and new_hash.startswith(f"$2b${settings.PASSWORD_BCRYPT_ROUNDS:02d}$")
+    print(f"\nRehash on login: cost {old_cost} -> {new_hash[4:6]} {'✅' if ok else '❌'}")
+    return ok
+
+
+async def main() -> bool:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12, 13])
+    args = parser.parse_args()
+
+    cost_table(args.rounds)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=300) as client:
+        for i in range(8):
+            await client.post(f"{API}/auth/register", json={
+                "email": f"storm{i}@access.ai", "password": PASSWORD, "confirm_password": PASSWORD, "full_name": "Storm"
+            })
+        metrics.reset()
+        await login_storm(client, args.logins, args.concurrency)
+        return await rehash_check(client)
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
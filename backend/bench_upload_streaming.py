@@ -0,0 +1,117 @@
+"""
+Benchmark: peak Python memory while storing an upload.
+
+Builds an UploadFile the way Starlette does (SpooledTemporaryFile, rolled to
+disk above 1 MB) and stores it through StorageService:
+
+1. LocalStorage (aiofiles),
+2. SupabaseStorage against a throwaway HTTP server on
+   127.0.0.1 that reads and discards the request body,
+
+reporting tracemalloc's peak next to the file size. With streaming, the peak
+stays around STORAGE_CHUNK_SIZE whatever --mb is; reading the whole file first
+(as before) peaks at the file size, shown for comparison.
+
+Usage:
+    python bench_upload_streaming.py [--mb 64]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.core.config import settings
+from app.services.storage import LocalStorage, SupabaseStorage
+
+MB = 1024 * 1024
+
+
+def make_upload(size: int, block: bytes) -> UploadFile:
+    spooled = tempfile.SpooledTemporaryFile(max_size=MB)
+    for _ in range(size // len(block)):
+        spooled.write(block)
+    spooled.seek(0)
+    return UploadFile(spooled, size=size, filename="big.pdf", headers=Headers({"content-type": "application/pdf"}))
+
+
+async def discard_body(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Minimal HTTP/1.1 sink: reads a Content-Length or chunked body, answers 200."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    headers = {k.strip().lower(): v.strip() for k, _, v in
+               (line.partition(b":") for line in head.split(b"\r\n")[1:] if line)}
+    if b"content-length" in headers:
+        remaining = int(headers[b"content-length"])
+        while remaining:
+            remaining -= len(await reader.read(min(remaining, 256 * 1024)))
+    else:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}")
+    await writer.drain()
+    writer.close()
+
+
+async def measure(label: str, size: int, store):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = await store()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {size / MB:>6.0f} MB in {elapsed:5.2f}s, peak {peak / MB:7.2f} MB")
+    return result
+
+
+async def main() -> bool:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=64)
+    args = parser.parse_args()
+
+    size = args.mb * MB
+    block = os.urandom(MB)
+    expected = hashlib.sha256()
+    for _ in range(args.mb):
+        expected.update(block)
+    print(f"STORAGE_CHUNK_SIZE = {settings.STORAGE_CHUNK_SIZE / MB:.2f} MB\n")
+
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        upload = make_upload(size, block)
+        stored = await measure("LocalStorage", size, lambda: LocalStorage(tmp).upload(upload, "big.pdf"))
+        ok &= stored.size == size == os.path.getsize(stored.path) and stored.sha256 == expected.hexdigest()
+
+        server = await asyncio.start_server(discard_body, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        supabase = SupabaseStorage(f"http://127.0.0.1:{port}", "bench-key", "documents")
+        async with server:
+            # Warm the shared client first: its one-time setup (TLS context) is not per-upload memory
+            await supabase.upload(make_upload(MB, block), "warmup.pdf")
+            upload = make_upload(size, block)
+            stored = await measure("SupabaseStorage", size, lambda: supabase.upload(upload, "big.pdf"))
+            ok &= stored.size == size and stored.sha256 == expected.hexdigest()
+        await supabase.aclose()
+
+        upload = make_upload(size, block)
+        await measure("Whole file read (before)", size, upload.read)
+
+    print(f"\nSize and SHA-256 match: {'✅' if ok else '❌'}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,144 @@
+"""
+Check: batch uploads (POST /documents/batch, GET /documents/batches/{id}).
+
+Drives the API in-process on the in-memory database (USE_MOCK_DB), with local
+storage in a temp dir and fake embeddings that take a little time:
+
+- several files in one request: valid ones become documents, the rest are
+  listed as rejected; the response comes back with everything "processing"
+- a zip archive: members unpacked (directories / macOS metadata skipped,
+  non-PDF/TXT members rejected), equal members stored once
+- ingestion runs in the background, never more than BATCH_INGEST_CONCURRENCY
+  documents at a time, and the progress endpoint ends with everything ready
+- more than BATCH_MAX_FILES files -> 413; another user's batch -> 404
+- when the documents cannot be written, every blob reference taken for the
+  batch is given back (new content is collected again)
+
+Usage:
+    python check_batch_upload.py
+"""
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import zipfile
+
+STORAGE_DIR = tempfile.mkdtemp()
+os.environ["USE_MOCK_DB"] = "true"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["STORAGE_LOCAL_DIR"] = STORAGE_DIR
+os.environ["BATCH_INGEST_CONCURRENCY"] = "3"
+os.environ["BATCH_MAX_FILES"] = "30"
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from sqlalchemy import select
+
+from app.main import app
+from app.core.config import settings
+from app.db.mock_session import MockAsyncSession
+from app.models.models import Blob
+from app.services.rag_service import rag_service
+from bench_mock_session import FakeEmbeddings, FakeLLM
+from check_storage import report
+from check_upload_dedup import failing_document_insert, login
+
+API = "/api/v1"
+
+
+class SlowEmbeddings(FakeEmbeddings):
+    async def aembed_query(self, text: str) -> list:
+        await asyncio.sleep(0.005)
+        return await super().aembed_query(text)
+
+
+def policy(i: int) -> bytes:
+    return "\n\n".join(f"Policy {i}, section {s}: every document needs alt text." for s in range(40)).encode()
+
+
+async def main() -> bool:
+    rag_service.embeddings = SlowEmbeddings()
+    rag_service.llm = FakeLLM()
+    ingest, active, peak = rag_service.ingest_document, 0, 0
+
+    async def tracked_ingest(db, doc_id):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        try:
+            return await ingest(db, doc_id)
+        finally:
+            active -= 1
+    rag_service.ingest_document = tracked_ingest
+    ok = True
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check", timeout=120) as client:
+        alice, bob = await login(client, "alice@access.ai"), await login(client, "bob@access.ai")
+
+        files = [("files", (f"policy-{i}.txt", policy(i), "text/plain")) for i in range(3)]
+        files += [("files", ("fake.pdf", b"not a pdf at all", "application/pdf")),
+                  ("files", ("letter.docx", b"PK\x03\x04...", "application/octet-stream"))]
+        response = await client.post(f"{API}/documents/batch", headers=alice, files=files)
+        batch = response.json()
+        ok &= report("multi-file batch: 3 accepted, 2 rejected, all processing in the response",
+                     response.status_code == 200 and batch["total"] == 5 and batch["accepted"] == 3
+                     and batch["counts"]["processing"] == 3 and sorted(r["filename"] for r in batch["rejected"]) == ["fake.pdf", "letter.docx"])
+        progress = (await client.get(f"{API}/documents/batches/{batch['id']}", headers=alice)).json()
+        ok &= report("background ingestion finished: all ready", progress["done"] and progress["counts"]["ready"] == 3)
+
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            for i in range(12):
+                zf.writestr(f"department/policy-{i}.txt", policy(100 + i))
+            zf.writestr("department/copy-of-policy-0.txt", policy(100))
+            zf.writestr("department/", "")
+            zf.writestr("__MACOSX/department/._policy-0.txt", b"\0\0")
+            zf.writestr("department/.DS_Store", b"\0\0")
+            zf.writestr("department/logo.png", b"\x89PNG")
+        stored_before = len(os.listdir(STORAGE_DIR))
+        peak = 0
+        response = await client.post(f"{API}/documents/batch", headers=alice,
+                                     files={"files": ("policies.zip", archive.getvalue(), "application/zip")})
+        batch = response.json()
+        ok &= report("zip batch: 13 documents, logo.png rejected, metadata skipped",
+                     batch["accepted"] == 13 and batch["total"] == 14 and [r["filename"] for r in batch["rejected"]] == ["logo.png"])
+        ok &= report("equal members stored once", len(os.listdir(STORAGE_DIR)) - stored_before == 12)
+        progress = (await client.get(f"{API}/documents/batches/{batch['id']}", headers=alice)).json()
+        ok &= report(f"all ready, at most {peak} ingesting at once (cap {settings.BATCH_INGEST_CONCURRENCY})",
+                     progress["done"] and progress["counts"]["ready"] == 13 and 1 < peak <= settings.BATCH_INGEST_CONCURRENCY)
+        results = (await client.post(f"{API}/documents/search", headers=alice, json={"query": "alt text"})).json()
+        ok &= report("batch documents are searchable", len(results) > 0)
+
+        response = await client.get(f"{API}/documents/batches/{batch['id']}", headers=bob)
+        ok &= report("another user's batch -> 404", response.status_code == 404)
+
+        files = [("files", (f"p{i}.txt", policy(i), "text/plain")) for i in range(settings.BATCH_MAX_FILES + 1)]
+        response = await client.post(f"{API}/documents/batch", headers=alice, files=files)
+        ok &= report(f"more than BATCH_MAX_FILES ({settings.BATCH_MAX_FILES}) -> 413", response.status_code == 413)
+
+        response = await client.post(f"{API}/documents/batch", headers=alice,
+                                     files={"files": ("broken.zip", b"PK\x03\x04 not really", "application/zip")})
+        ok &= report("corrupt zip -> 400", response.status_code == 400)
+
+        async def ref_counts() -> dict:
+            async with MockAsyncSession() as db:
+                return {b.sha256: b.ref_count for b in (await db.execute(select(Blob))).scalars().all()}
+
+        refs_before, stored_before = await ref_counts(), sorted(os.listdir(STORAGE_DIR))
+        files = [("files", (f"new-{i}.txt", policy(200 + i), "text/plain")) for i in range(3)]
+        files += [("files", ("again-policy-0.txt", policy(0), "text/plain"))]  # Already stored: reference taken, then given back
+        with failing_document_insert(), contextlib.suppress(RuntimeError):
+            await client.post(f"{API}/documents/batch", headers=alice, files=files)
+        ok &= report("documents INSERT fails: blob references given back, new files collected",
+                     await ref_counts() == refs_before and sorted(os.listdir(STORAGE_DIR)) == stored_before)
+
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,136 @@
+"""
+Check: per-page document text (document_pages) and GET /documents/{id}/pages.
+
+Drives the API in-process on the in-memory database (USE_MOCK_DB), with local
+storage in a temp dir, small text pages and a small page range cap:
+
+- GET /documents/{id} leaves out the full text unless ?include_text=true
+- a text file is stored as pages that add up to the original, each cut at a
+  paragraph break; chunks cite those page numbers
+- range reads return just the pages asked for, capped at DOCUMENT_PAGES_MAX_RANGE;
+  bad ranges -> 400 / 422, other users' documents -> 404
+- a duplicate upload (content-hash dedup) gets its own copy of the pages, and
+  deleting a document deletes its pages
+- documents ingested before per-page storage are served as one page from content_text
+
+Usage:
+    python check_document_pages.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+
+os.environ["USE_MOCK_DB"] = "true"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["STORAGE_LOCAL_DIR"] = tempfile.mkdtemp()
+os.environ["TEXT_PAGE_CHARS"] = "600"
+os.environ["DOCUMENT_PAGES_MAX_RANGE"] = "4"
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from sqlalchemy import select
+
+from app.main import app
+from app.db.mock_session import MockAsyncSession
+from app.models.models import AccessDocumentChunk, Document, DocumentPage
+from app.services.rag_service import rag_service
+from bench_mock_session import FakeEmbeddings, FakeLLM
+from check_storage import report
+from check_upload_dedup import login
+
+API = "/api/v1"
+TEXT = "".join(f"Section {i}. Screen readers announce headings, lists and tables in order.\n\n" * 3 for i in range(20))
+
+
+async def upload(client: httpx.AsyncClient, headers: dict, name: str) -> str:
+    response = await client.post(f"{API}/documents/", headers=headers, files={"file": (name, TEXT.encode(), "text/plain")})
+    return response.json()["id"]
+
+
+async def page_rows(doc_id: str) -> list:
+    async with MockAsyncSession() as db:
+        return (await db.execute(
+            select(DocumentPage.page_number, DocumentPage.text_content)
+            .where(DocumentPage.document_id == doc_id).order_by(DocumentPage.page_number)
+        )).all()
+
+
+async def main() -> bool:
+    rag_service.embeddings = FakeEmbeddings()
+    rag_service.llm = FakeLLM()
+    ok = True
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check") as client:
+        alice, bob = await login(client, "alice@access.ai"), await login(client, "bob@access.ai")
+        doc_id = await upload(client, alice, "guide.txt")
+
+        doc = (await client.get(f"{API}/documents/{doc_id}", headers=alice)).json()
+        ok &= report(f"GET /documents/{{id}}: no text by default ({doc['pages']} pages)", doc["content_text"] is None)
+        full = (await client.get(f"{API}/documents/{doc_id}", headers=alice, params={"include_text": "true"})).json()
+        ok &= report("?include_text=true returns the whole text",
+                     all(line in full["content_text"] for line in TEXT.split("\n\n")))
+
+        rows = await page_rows(doc_id)
+        ok &= report(f"text file stored as {len(rows)} pages adding up to the original",
+                     len(rows) == doc["pages"] > 1 and "".join(r.text_content for r in rows) == TEXT)
+        ok &= report("pages end at paragraph breaks, within TEXT_PAGE_CHARS",
+                     all(r.text_content.endswith("\n\n") and len(r.text_content) <= 600 for r in rows))
+        async with MockAsyncSession() as db:
+            cited = {r[0] for r in (await db.execute(
+                select(AccessDocumentChunk.page_number).where(AccessDocumentChunk.document_id == doc_id)
+            )).all()}
+        ok &= report("chunks cite the stored page numbers", cited == set(range(1, len(rows) + 1)))
+
+        response = await client.get(f"{API}/documents/{doc_id}/pages", headers=alice, params={"from": 2, "to": 3})
+        body = response.json()
+        ok &= report("?from=2&to=3 returns pages 2 and 3",
+                     response.status_code == 200 and [p["page_number"] for p in body["pages"]] == [2, 3]
+                     and body["pages"][0]["text"] == rows[1].text_content and body["to"] == 3
+                     and body["page_count"] == len(rows))
+
+        body = (await client.get(f"{API}/documents/{doc_id}/pages", headers=alice, params={"to": 100})).json()
+        ok &= report("range capped at DOCUMENT_PAGES_MAX_RANGE (4)",
+                     [p["page_number"] for p in body["pages"]] == [1, 2, 3, 4] and body["from"] == 1 and body["to"] == 4)
+
+        body = (await client.get(f"{API}/documents/{doc_id}/pages", headers=alice, params={"from": len(rows) + 1})).json()
+        ok &= report("range past the last page: no pages", body["pages"] == [] and body["to"] is None)
+
+        statuses = [
+            (await client.get(f"{API}/documents/{doc_id}/pages", headers=alice, params={"from": 3, "to": 2})).status_code,
+            (await client.get(f"{API}/documents/{doc_id}/pages", headers=alice, params={"from": 0})).status_code,
+            (await client.get(f"{API}/documents/{doc_id}/pages", headers=bob)).status_code,
+        ]
+        ok &= report(f"to < from / from = 0 / another user's document -> {statuses}", statuses == [400, 422, 404])
+
+        copy_id = await upload(client, bob, "guide-copy.txt")
+        copied = await page_rows(copy_id)
+        ok &= report("duplicate upload gets its own copy of the pages",
+                     [tuple(r) for r in copied] == [tuple(r) for r in rows])
+
+        await client.delete(f"{API}/documents/{doc_id}", headers=alice)
+        ok &= report("deleting a document deletes its pages (the copy keeps its own)",
+                     await page_rows(doc_id) == [] and len(await page_rows(copy_id)) == len(rows))
+
+        # A document ingested before document_pages existed: joined text only
+        async with MockAsyncSession() as db:
+            bob_id = (await db.execute(select(Document.user_id).where(Document.id == copy_id))).scalar()
+            legacy = Document(title="old.pdf", file_path="old.pdf", file_type="pdf", status="ready", pages=7,
+                              content_text="Old text, all pages joined.", user_id=bob_id)
+            db.add(legacy)
+            await db.commit()
+            legacy_id = str(legacy.id)
+        body = (await client.get(f"{API}/documents/{legacy_id}/pages", headers=bob)).json()
+        full = (await client.get(f"{API}/documents/{legacy_id}", headers=bob, params={"include_text": "true"})).json()
+        ok &= report("legacy document: served as one page from content_text",
+                     body["page_count"] == 1 and body["pages"] == [{"page_number": 1, "text": "Old text, all pages joined."}]
+                     and full["content_text"] == "Old text, all pages joined.")
+
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,188 @@
+"""
+Check: local download cache for remote objects (app/services/download_cache.py).
+
+- Repeat use of an object reads the local copy: one conditional request
+  (If-None-Match -> 304), no body transferred.
+- A changed object (new ETag) is downloaded again; without ETags the stored
+  size is compared against Content-Length instead.
+- Equal content under two URLs is stored once.
+- Over the byte budget the least recently used objects are evicted, never one
+  that is in use.
+- Several worker processes opening the same URL at once download it once
+  (flock), against a real HTTP server on 127.0.0.1.
+
+Usage:
+    python check_download_cache.py
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from app.core.metrics import metrics
+from app.services.download_cache import DownloadCache
+from app.services.storage import HttpPool, SupabaseStorage
+from check_storage import URL, FakeSupabase, report
+
+WORKERS = 4
+
+
+def object_count(cache: DownloadCache) -> int:
+    return len(os.listdir(os.path.join(cache.root, "objects")))
+
+
+async def single_process(root: str) -> bool:
+    fake = FakeSupabase()
+    backend = SupabaseStorage(URL, "service-key", "documents", transport=httpx.MockTransport(fake.handler))
+    cache = DownloadCache(root, max_bytes=10 * 1024 * 1024)
+
+    def fetch(url):
+        return lambda dest, etag, size: backend.download(url, dest, etag, size)
+
+    ok = True
+    data = os.urandom(2 * 1024 * 1024)
+    fake.objects["documents/a.pdf"] = data
+    url = f"{URL}/storage/v1/object/public/documents/a.pdf"
+
+    async with cache.open(url, fetch(url)) as path:
+        with open(path, "rb") as f:
+            ok &= report("first use downloads", f.read() == data and fake.bodies_sent == 1)
+    for _ in range(3):
+        async with cache.open(url, fetch(url)) as path:
+            with open(path, "rb") as f:
+                same = f.read() == data
+    ok &= report("repeat use reads the local copy (304, no body)", same and fake.bodies_sent == 1
+                 and metrics.get_counter("download_cache.hits") == 3)
+
+    changed = os.urandom(1024 * 1024)
+    fake.objects["documents/a.pdf"] = changed
+    async with cache.open(url, fetch(url)) as path:
+        with open(path, "rb") as f:
+            ok &= report("changed object (new ETag) is downloaded again", f.read() == changed and fake.bodies_sent == 2)
+
+    fake.objects["documents/copy.pdf"] = changed
+    copy_url = f"{URL}/storage/v1/object/public/documents/copy.pdf"
+    async with cache.open(copy_url, fetch(copy_url)) as path:
+        ok &= report("equal content under another URL is stored once",
+                     os.path.basename(path) == hashlib.sha256(changed).hexdigest() and object_count(cache) == 2)
+
+    fake.send_etag = False
+    fake.objects["documents/n.pdf"] = data
+    n_url = f"{URL}/storage/v1/object/public/documents/n.pdf"
+    async with cache.open(n_url, fetch(n_url)):
+        pass
+    downloaded = metrics.get_counter("storage.download_bytes")
+    async with cache.open(n_url, fetch(n_url)) as path:
+        with open(path, "rb") as f:
+            ok &= report("without ETag: same size -> local copy, body not read",
+                         f.read() == data and metrics.get_counter("storage.download_bytes") == downloaded)
+    fake.objects["documents/n.pdf"] = data + b"more"
+    async with cache.open(n_url, fetch(n_url)) as path:
+        ok &= report("without ETag: size changed -> downloaded again", os.path.getsize(path) == len(data) + 4)
+    fake.send_etag = True
+
+    # Budget for three 1 MB objects; the one in use must survive eviction even though it is the oldest
+    small = DownloadCache(os.path.join(root, "small"), max_bytes=3 * 1024 * 1024)
+    urls = []
+    for i in range(3):
+        fake.objects[f"documents/e{i}.pdf"] = os.urandom(1024 * 1024)
+        urls.append(f"{URL}/storage/v1/object/public/documents/e{i}.pdf")
+    for u in urls:
+        async with small.open(u, fetch(u)):
+            await asyncio.sleep(0.01)
+    async with small.open(urls[0], fetch(urls[0])) as in_use:
+        for i in (3, 4):
+            fake.objects[f"documents/e{i}.pdf"] = os.urandom(1024 * 1024)
+            u = f"{URL}/storage/v1/object/public/documents/e{i}.pdf"
+            async with small.open(u, fetch(u)):
+                await asyncio.sleep(0.01)
+        ok &= report("in-use object is not evicted", os.path.exists(in_use))
+    stats = small.stats()
+    ok &= report(f"LRU eviction keeps the cache within budget ({stats['bytes']} / {stats['max_bytes']} bytes)",
+                 stats["bytes"] <= stats["max_bytes"] and metrics.get_counter("download_cache.evictions") >= 2
+                 and os.path.exists(in_use))
+
+    await backend.aclose()
+    return ok
+
+
+# --- Several processes, real HTTP server ---
+
+BODY = os.urandom(4 * 1024 * 1024)
+ETAG = f'"{hashlib.md5(BODY).hexdigest()}"'
+
+
+class Handler(BaseHTTPRequestHandler):
+    full_responses = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        with Handler.lock:
+            Handler.full_responses += 1
+        self.send_response(200)
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def worker(root: str, url: str, barrier, results) -> None:
+    async def run():
+        http = HttpPool()
+        cache = DownloadCache(root, max_bytes=100 * 1024 * 1024)
+        async with cache.open(url, lambda dest, etag, size: http.download(url, dest, etag=etag, size=size)) as path:
+            with open(path, "rb") as f:
+                results.put(hashlib.sha256(f.read()).hexdigest())
+        await http.aclose()
+
+    barrier.wait()
+    asyncio.run(run())
+
+
+def multi_process(root: str) -> bool:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/doc.pdf"
+
+    ctx = multiprocessing.get_context("spawn")
+    barrier, results = ctx.Barrier(WORKERS), ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(root, url, barrier, results)) for _ in range(WORKERS)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(60)
+    server.shutdown()
+    # BODY is only this process's (spawned workers re-import the module), so compare digests here
+    correct = [results.get(timeout=5) == hashlib.sha256(BODY).hexdigest() for _ in range(WORKERS)]
+    return report(f"{WORKERS} processes opening the same URL at once: {Handler.full_responses} full download(s)",
+                  all(correct) and Handler.full_responses == 1)
+
+
+def main() -> bool:
+    with tempfile.TemporaryDirectory() as root:
+        ok = asyncio.run(single_process(os.path.join(root, "single")))
+        ok &= multi_process(os.path.join(root, "multi"))
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
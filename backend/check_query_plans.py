@@ -0,0 +1,121 @@
+"""
+EXPLAIN check for hot queries.
+
+Runs EXPLAIN on the query shapes used by document_service, rag_service,
+transcribe.py, deps.py and auth.py with sequential scans disabled, so the
+planner picks an index whenever a usable one exists. Any remaining Seq Scan
+means a hot query has no supporting index: the script prints it and exits 1.
+
+Usage:
+    python check_query_plans.py
+"""
+import sys
+import os
+import json
+import uuid
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import event, select, text
+from app.db.session import engine
+from app.models.models import User, Document, AccessDocumentChunk, Transcription, FormSubmission, ChatSession
+
+SAMPLE_ID = uuid.uuid4()
+SAMPLE_VECTOR = [0.0] * 1536
+
+
+def hot_queries():
+    distance = AccessDocumentChunk.embedding.l2_distance(SAMPLE_VECTOR).label("distance")
+    return {
+        # deps.get_current_user
+        "deps.current_user": select(User).where(User.id == SAMPLE_ID),
+        # auth.register_user / login_access_token
+        "auth.user_by_email": select(User).where(User.email == "someone@example.com"),
+        # auth.biometric_login (1:N identification + mock fallback)
+        "auth.user_by_face_signature": select(User).where(User.face_id_digest == "0" * 64),
+        "auth.first_biometric_user": select(User).where(User.face_id_registered == True).limit(1),
+        # document_service.get_documents / get_document
+        "documents.list": select(Document).where(Document.user_id == SAMPLE_ID).order_by(Document.created_at.desc()),
+        "documents.get": select(Document).where(Document.id == SAMPLE_ID, Document.user_id == SAMPLE_ID),
+        # rag_service.search (document-scoped chat retrieval)
+        "rag.search_document": select(AccessDocumentChunk, Document, distance).join(Document)
+            .where(AccessDocumentChunk.document_id == SAMPLE_ID, AccessDocumentChunk.owner_id == SAMPLE_ID)
+            .order_by(distance).limit(8),
+        # rag_service.search (owner-scoped, POST /documents/search)
+        "rag.search_owner": select(AccessDocumentChunk, Document, distance).join(Document)
+            .where(AccessDocumentChunk.owner_id == SAMPLE_ID).order_by(distance).limit(5),
+        # chat_memory.get_session
+        "chat_memory.session": select(ChatSession).where(
+            ChatSession.user_id == SAMPLE_ID, ChatSession.document_id == SAMPLE_ID
+        ),
+        # transcribe.list_transcriptions / get_transcription
+        "transcribe.list": select(Transcription).where(Transcription.user_id == SAMPLE_ID)
+            .order_by(Transcription.created_at.desc()),
+        "transcribe.get": select(Transcription).where(
+            Transcription.id == SAMPLE_ID, Transcription.user_id == SAMPLE_ID
+        ),
+        # form submissions per user
+        "forms.list": select(FormSubmission).where(FormSubmission.user_id == SAMPLE_ID)
+            .order_by(FormSubmission.created_at.desc()),
+    }
+
+
+def explain(conn, stmt) -> list:
+    """
+    Executes stmt with an EXPLAIN prefix, so parameters go through the normal
+    SQLAlchemy bind processing (UUIDs, pgvector) instead of being hand-rendered.
+    """
+    captured = {}
+
+    def add_explain(conn, cursor, statement, parameters, context, executemany):
+        return "EXPLAIN (FORMAT JSON) " + statement, parameters
+
+    def grab_plan(conn, cursor, statement, parameters, context, executemany):
+        captured["plan"] = cursor.fetchall()[0][0]
+
+    event.listen(engine, "before_cursor_execute", add_explain, retval=True)
+    event.listen(engine, "after_cursor_execute", grab_plan)
+    try:
+        conn.execute(stmt)
+    finally:
+        event.remove(engine, "before_cursor_execute", add_explain)
+        event.remove(engine, "after_cursor_execute", grab_plan)
+
+    plan = captured["plan"]
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+def seq_scans(node: dict) -> list:
+    found = []
+    if node.get("Node Type") == "Seq Scan":
+        found.append(node.get("Relation Name"))
+    for child in node.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def check() -> bool:
+    print("--- Hot query plan check (enable_seqscan = off) ---")
+    failures = 0
+    with engine.connect() as conn:
+        conn.execute(text("SET enable_seqscan = off"))
+        for name, stmt in hot_queries().items():
+            plan = explain(conn, stmt)
+            scans = seq_scans(plan[0]["Plan"])
+            if scans:
+                failures += 1
+                print(f"❌ {name}: sequential scan on {', '.join(scans)}")
+            else:
+                print(f"✅ {name}")
+        conn.rollback()
+
+    if failures:
+        print(f"\n{failures} hot queries fall back to a sequential scan. Run python migrate.py upgrade.")
+        return False
+    print("\nAll hot queries are index-backed.")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if check() else 1)
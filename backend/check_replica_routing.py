@@ -0,0 +1,121 @@
+"""
+Read-replica routing check.
+
+Drives the real app in-process (httpx ASGITransport) and checks which engine
+served GET /documents/ in each situation:
+  1. fresh user, replica caught up           -> replica
+  2. right after the user commits a write    -> primary (read-your-writes), write visible
+  3. after the read-your-writes window       -> replica, write visible once replicated
+  4. replica lag above REPLICA_MAX_LAG       -> primary
+
+Needs DATABASE_REPLICA_URL. A streaming replica of DATABASE_URL is the real
+setup; pointing DATABASE_REPLICA_URL at the primary itself works as a stand-in
+(lag is then always 0).
+
+Usage:
+    DATABASE_REPLICA_URL=postgresql://...:5433/accessai python check_replica_routing.py
+"""
+import asyncio
+import sys
+import os
+import uuid
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from sqlalchemy import delete
+
+from app.main import app
+from app.core.metrics import metrics
+from app.db.replica import replica_router, current_user_id
+from app.db.session import AsyncSessionLocal
+from app.models.models import Document, User
+
+API = "/api/v1"
+
+
+def routed_to() -> dict:
+    return {
+        "replica": metrics.get_counter("db.reads.replica"),
+        "primary (read-your-writes)": metrics.get_counter("db.reads.primary_read_your_writes"),
+        "primary (replica lagging)": metrics.get_counter("db.reads.primary_replica_lagging"),
+    }
+
+
+async def list_documents(client, headers) -> tuple:
+    before = routed_to()
+    response = await client.get(f"{API}/documents/", headers=headers)
+    response.raise_for_status()
+    after = routed_to()
+    target = next((name for name in after if after[name] > before[name]), "primary (no replica)")
+    return target, [d["title"] for d in response.json()]
+
+
+async def main() -> bool:
+    if not replica_router.enabled:
+        print("❌ DATABASE_REPLICA_URL is not set")
+        return False
+
+    replica_router.read_your_writes_seconds = 1.0
+    ok = True
+
+    def check(label, condition):
+        nonlocal ok
+        ok = ok and condition
+        print(f"{'✅' if condition else '❌'} {label}")
+
+    email = f"replica{uuid.uuid4().hex[:8]}@access.ai"
+    password = "SecurePassword123!"
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check") as client:
+        register = await client.post(f"{API}/auth/register", json={
+            "email": email, "password": password, "confirm_password": password, "full_name": "Replica Check"
+        })
+        register.raise_for_status()
+        user_id = register.json()["id"]
+        login = await client.post(f"{API}/auth/login", json={"email": email, "password": password})
+        login.raise_for_status()
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+        lag = await replica_router.measure_lag()
+        print(f"Replica lag: {lag}s")
+        await asyncio.sleep(0.5)  # Let the registration replicate
+
+        target, _ = await list_documents(client, headers)
+        check(f"fresh user -> {target}", target == "replica")
+
+        # A write attributed to this user (what an upload does through get_current_user)
+        token = current_user_id.set(user_id)
+        try:
+            async with AsyncSessionLocal() as db:
+                db.add(Document(user_id=uuid.UUID(user_id), title="replica-check.txt", file_path="x", file_type="txt"))
+                await db.commit()
+        finally:
+            current_user_id.reset(token)
+
+        target, titles = await list_documents(client, headers)
+        check(f"after a write -> {target}, write visible: {'replica-check.txt' in titles}",
+              target == "primary (read-your-writes)" and "replica-check.txt" in titles)
+
+        await asyncio.sleep(1.2)
+        target, titles = await list_documents(client, headers)
+        check(f"after the window -> {target}, write visible: {'replica-check.txt' in titles}",
+              target == "replica" and "replica-check.txt" in titles)
+
+        replica_router.lag_seconds = replica_router.max_lag_seconds + 1
+        target, _ = await list_documents(client, headers)
+        check(f"replica lagging -> {target}", target == "primary (replica lagging)")
+
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Document).where(Document.user_id == uuid.UUID(user_id)))
+        await db.execute(delete(User).where(User.id == uuid.UUID(user_id)))
+        await db.commit()
+
+    print(f"\nReplica stats: {metrics.snapshot()['db_replica']}")
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,163 @@
+"""
+Check: resumable chunked uploads (app/services/upload_sessions.py, /api/v1/uploads).
+
+Drives the API in-process on the in-memory database (USE_MOCK_DB), with local
+storage and the session dir in temp dirs and small chunks:
+
+- chunks arrive out of order; status lists what is missing; completing early -> 409
+- a corrupted chunk (bad SHA-256) or a cut-off body (dropped connection) is not
+  recorded and can simply be sent again
+- misaligned ranges -> 416, oversized files -> 413, other users' sessions -> 404
+- a chunk already being written (a retry racing the original) -> 409
+- completing checks the whole-file SHA-256 and hands the file to the document
+  pipeline (ready, searchable) or the transcription pipeline (record + background job)
+
+Usage:
+    python check_resumable_upload.py
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+
+os.environ["USE_MOCK_DB"] = "true"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["STORAGE_LOCAL_DIR"] = tempfile.mkdtemp()
+os.environ["UPLOAD_SESSION_DIR"] = tempfile.mkdtemp()
+os.environ["UPLOAD_SESSION_CHUNK_SIZE"] = str(64 * 1024)
+os.environ["UPLOAD_SESSION_MAX_BYTES"] = str(10 * 1024 * 1024)
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+
+from app.main import app
+from app.api import transcribe
+from app.core.config import settings
+from app.services.upload_sessions import upload_sessions
+from app.services.rag_service import rag_service
+from bench_mock_session import FakeEmbeddings, FakeLLM
+from check_storage import report
+from check_upload_dedup import login
+
+API = "/api/v1"
+CHUNK = settings.UPLOAD_SESSION_CHUNK_SIZE
+
+
+def content_range(index: int, data: bytes) -> str:
+    start = index * CHUNK
+    return f"bytes {start}-{min(start + CHUNK, len(data)) - 1}/{len(data)}"
+
+
+def piece(index: int, data: bytes) -> bytes:
+    return data[index * CHUNK:(index + 1) * CHUNK]
+
+
+async def put(client, headers, upload_id, index, data, body=None, sha=None):
+    body = piece(index, data) if body is None else body
+    return await client.put(f"{API}/uploads/{upload_id}", headers={
+        **headers,
+        "Content-Range": content_range(index, data),
+        "X-Chunk-SHA256": sha or hashlib.sha256(piece(index, data)).hexdigest(),
+    }, content=body)
+
+
+async def main() -> bool:
+    rag_service.embeddings = FakeEmbeddings()
+    rag_service.llm = FakeLLM()
+    queued = []
+    transcribe.process_transcription_task = lambda *args: queued.append(args)  # No Whisper here
+    ok = True
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check") as client:
+        alice, bob = await login(client, "alice@access.ai"), await login(client, "bob@access.ai")
+
+        text = "".join(f"Paragraph {i}: resumable uploads keep large files moving.\n\n" for i in range(6000)).encode()
+        created = (await client.post(f"{API}/uploads/", headers=alice, json={
+            "filename": "manual.txt", "size": len(text), "target": "document"
+        })).json()
+        upload_id, count = created["id"], created["chunk_count"]
+        ok &= report(f"session created: {count} chunks of {created['chunk_size']} bytes",
+                     count == -(-len(text) // CHUNK) and created["missing"] == list(range(count)))
+
+        for index in reversed(range(1, count)):
+            await put(client, alice, upload_id, index, text)
+        status = (await client.get(f"{API}/uploads/{upload_id}", headers=alice)).json()
+        ok &= report("out-of-order chunks recorded, status lists the missing one",
+                     status["missing"] == [0] and status["received_bytes"] == len(text) - CHUNK)
+
+        response = await client.post(f"{API}/uploads/{upload_id}/complete", headers=alice)
+        ok &= report("completing with a missing chunk -> 409", response.status_code == 409)
+
+        response = await put(client, alice, upload_id, 0, text, body=b"x" + piece(0, text)[1:])
+        status = (await client.get(f"{API}/uploads/{upload_id}", headers=alice)).json()
+        ok &= report("corrupted chunk rejected (400), still missing", response.status_code == 400 and status["missing"] == [0])
+
+        response = await put(client, alice, upload_id, 0, text, body=piece(0, text)[:1000])
+        ok &= report("cut-off chunk body rejected (400)", response.status_code == 400)
+
+        response = await client.put(f"{API}/uploads/{upload_id}", headers={
+            **alice, "Content-Range": f"bytes 10-{CHUNK + 9}/{len(text)}", "X-Chunk-SHA256": "0" * 64
+        }, content=b"x" * CHUNK)
+        ok &= report("misaligned range -> 416", response.status_code == 416)
+
+        response = await client.get(f"{API}/uploads/{upload_id}", headers=bob)
+        ok &= report("another user's upload -> 404", response.status_code == 404)
+
+        session = upload_sessions.get(upload_id, (await client.get(f"{API}/auth/me", headers=alice)).json()["id"])
+        writer = session.chunk_lock(0)
+        writer.try_acquire()  # The original request, still streaming chunk 0
+        response = await put(client, alice, upload_id, 0, text)
+        writer.release()
+        status = (await client.get(f"{API}/uploads/{upload_id}", headers=alice)).json()
+        ok &= report("chunk already being written -> 409, still missing", response.status_code == 409 and status["missing"] == [0])
+
+        response = await client.post(f"{API}/uploads/", headers=alice, json={
+            "filename": "huge.pdf", "size": settings.UPLOAD_SESSION_MAX_BYTES + 1, "target": "document"
+        })
+        ok &= report("file over UPLOAD_SESSION_MAX_BYTES -> 413", response.status_code == 413)
+
+        await put(client, alice, upload_id, 0, text)  # Resent after the "dropped connection"
+        response = await client.post(f"{API}/uploads/{upload_id}/complete", headers=alice, json={"sha256": "0" * 64})
+        ok &= report("whole-file checksum mismatch -> 400, upload kept",
+                     response.status_code == 400
+                     and (await client.get(f"{API}/uploads/{upload_id}", headers=alice)).status_code == 200)
+
+        response = await client.post(f"{API}/uploads/{upload_id}/complete", headers=alice,
+                                     json={"sha256": hashlib.sha256(text).hexdigest()})
+        doc = response.json()
+        stored = await client.get(f"{API}/documents/{doc.get('id')}", headers=alice)
+        with open(doc.get("file_path", ""), "rb") as f:
+            same = f.read() == text
+        ok &= report("complete -> document pipeline: stored byte-for-byte, ready",
+                     response.status_code == 200 and same and stored.json()["status"] == "ready")
+        results = (await client.post(f"{API}/documents/search", headers=alice, json={"query": "resumable"})).json()
+        ok &= report("uploaded document is searchable", any(r["document_id"] == doc["id"] for r in results))
+        ok &= report("session removed after completion",
+                     (await client.get(f"{API}/uploads/{upload_id}", headers=alice)).status_code == 404
+                     and os.listdir(settings.UPLOAD_SESSION_DIR) == [])
+
+        audio = os.urandom(3 * CHUNK + 17)
+        created = (await client.post(f"{API}/uploads/", headers=bob, json={
+            "filename": "meeting.mp3", "size": len(audio), "target": "transcription", "title": "Weekly"
+        })).json()
+        for index in range(created["chunk_count"]):
+            await put(client, bob, created["id"], index, audio)
+        response = await client.post(f"{API}/uploads/{created['id']}/complete", headers=bob)
+        listed = (await client.get(f"{API}/transcribe/list", headers=bob)).json()
+        path = listed[0]["audio_file_path"] if listed else ""
+        with open(path, "rb") as f:
+            same = f.read() == audio
+        ok &= report("complete -> transcription pipeline: record created, audio moved into place, job queued",
+                     response.json().get("status") == "processing" and same and listed[0]["title"] == "Weekly"
+                     and len(queued) == 1 and queued[0][2] == path)
+        os.unlink(path)
+
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -0,0 +1,155 @@
+"""
+Check: async storage backends against in-process stand-ins (no network, no Supabase).
+
+- SupabaseStorage over httpx.MockTransport emulating the Storage REST API:
+  upload / public URL / download round trip, retry with backoff after
+  injected 503s and dropped connections, no retry on 4xx, and the
+  STORAGE_MAX_CONCURRENCY cap under parallel uploads.
+- LocalStorage: upload and public path.
+
+Usage:
+    python check_storage.py
+"""
+import asyncio
+import hashlib
+import io
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("STORAGE_RETRY_BACKOFF_SECONDS", "0.01")
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.services.storage import LocalStorage, StorageService, SupabaseStorage
+
+URL = "http://supabase.test"
+
+
+class FakeSupabase:
+    """
+    Objects kept in a dict; `fail` queues failures (status code or "drop") for the next
+    requests. Downloads carry an ETag and honour If-None-Match unless send_etag is off.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.fail = []
+        self.active = 0
+        self.max_active = 0
+        self.bodies_sent = 0
+        self.send_etag = True
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+            if self.fail:
+                failure = self.fail.pop(0)
+                if failure == "drop":
+                    raise httpx.ConnectError("connection reset", request=request)
+                return httpx.Response(failure, json={"error": "injected"})
+            path = request.url.path
+            if request.method == "POST" and path.startswith("/storage/v1/object/"):
+                if request.headers.get("apikey") != "service-key":
+                    return httpx.Response(401, json={"error": "unauthorized"})
+                self.objects[path.split("/", 4)[4]] = await request.aread()
+                return httpx.Response(200, json={"Key": path})
+            if request.method == "GET" and path.startswith("/storage/v1/object/public/"):
+                data = self.objects.get(path.split("/", 5)[5])
+                if data is None:
+                    return httpx.Response(404)
+                if not self.send_etag:
+                    self.bodies_sent += 1
+                    return httpx.Response(200, content=data)
+                etag = f'"{hashlib.md5(data).hexdigest()}"'
+                if request.headers.get("If-None-Match") == etag:
+                    return httpx.Response(304, headers={"ETag": etag})
+                self.bodies_sent += 1
+                return httpx.Response(200, content=data, headers={"ETag": etag})
+            return httpx.Response(400)
+        finally:
+            self.active -= 1
+
+
+def make_upload(data: bytes, name: str = "doc.pdf") -> UploadFile:
+    return UploadFile(io.BytesIO(data), size=len(data), filename=name, headers=Headers({"content-type": "application/pdf"}))
+
+
+def report(label: str, ok: bool) -> bool:
+    print(f"{'✅' if ok else '❌'} {label}")
+    return ok
+
+
+async def main() -> bool:
+    fake = FakeSupabase()
+    storage = StorageService(SupabaseStorage(URL, "service-key", "documents", transport=httpx.MockTransport(fake.handler)))
+    data = os.urandom(3 * settings.STORAGE_CHUNK_SIZE + 123)
+    ok = True
+
+    stored = await storage.upload(make_upload(data), "a.pdf")
+    ok &= report("upload streams the whole file, size and sha256 match",
+                 fake.objects["documents/a.pdf"] == data and stored.size == len(data)
+                 and stored.sha256 == hashlib.sha256(data).hexdigest())
+    ok &= report("public URL", stored.path == await storage.public_url("a.pdf") == f"{URL}/storage/v1/object/public/documents/a.pdf")
+
+    path = await storage.download_to_temp(stored.path, "pdf")
+    with open(path, "rb") as f:
+        ok &= report("download round trip", f.read() == data)
+    os.unlink(path)
+
+    retries = metrics.get_counter("storage.retries")
+    fake.fail = [503, "drop"]
+    stored = await storage.upload(make_upload(data), "b.pdf")
+    ok &= report("upload retried after 503 + dropped connection, body re-sent in full",
+                 metrics.get_counter("storage.retries") - retries == 2 and fake.objects["documents/b.pdf"] == data
+                 and stored.sha256 == hashlib.sha256(data).hexdigest())
+
+    fake.fail = [502]
+    path = await storage.download_to_temp(stored.path, "pdf")
+    with open(path, "rb") as f:
+        ok &= report("download retried after 502", f.read() == data)
+    os.unlink(path)
+
+    retries = metrics.get_counter("storage.retries")
+    fake.fail = [403]
+    try:
+        await storage.upload(make_upload(data), "c.pdf")
+        ok &= report("4xx is not retried", False)
+    except httpx.HTTPStatusError as e:
+        ok &= report("4xx is not retried", e.response.status_code == 403 and metrics.get_counter("storage.retries") == retries)
+
+    fake.fail = [503] * (settings.STORAGE_RETRIES + 1)
+    try:
+        await storage.download_to_temp(f"{URL}/storage/v1/object/public/documents/a.pdf", "pdf")
+        ok &= report("gives up after STORAGE_RETRIES", False)
+    except httpx.HTTPStatusError:
+        ok &= report("gives up after STORAGE_RETRIES", True)
+
+    fake.max_active = 0
+    await asyncio.gather(*(storage.upload(make_upload(b"x" * 1000), f"p{i}.pdf") for i in range(40)))
+    ok &= report(f"40 parallel uploads, at most {fake.max_active} in flight (cap {settings.STORAGE_MAX_CONCURRENCY})",
+                 0 < fake.max_active <= settings.STORAGE_MAX_CONCURRENCY)
+    await storage.aclose()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        local = StorageService(LocalStorage(tmp))
+        stored = await local.upload(make_upload(data), "l.pdf")
+        with open(stored.path, "rb") as f:
+            ok &= report("LocalStorage upload", stored.path == f"{tmp}/l.pdf" and f.read() == data
+                         and not os.path.exists(f"{tmp}/l.pdf.part"))
+
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
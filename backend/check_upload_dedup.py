@@ -0,0 +1,168 @@
+"""
+Check: content-addressed upload deduplication (app/services/blob_service.py).
+
+Drives the API in-process on the in-memory database (USE_MOCK_DB) with local
+storage in a temp dir and counting fake embeddings:
+
+- a second upload of the same bytes (another user) stores nothing, makes no
+  embedding calls and gets its own copy of the chunks (searchable by its owner)
+- blobs.ref_count follows the documents; deleting the document the chunks were
+  copied from hands that role to a remaining duplicate
+- deleting the last reference removes the blob row and the stored file
+- a document of another user cannot be deleted
+- when the documents row cannot be written, the blob reference is given back
+  (and a blob nothing else references is collected)
+
+Usage:
+    python check_upload_dedup.py
+"""
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+
+STORAGE_DIR = tempfile.mkdtemp()
+os.environ["USE_MOCK_DB"] = "true"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["STORAGE_LOCAL_DIR"] = STORAGE_DIR
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from sqlalchemy import select
+
+from app.main import app
+from app.db.mock_session import MockAsyncSession
+from app.core.metrics import metrics
+from app.models.models import AccessDocumentChunk, Blob, Document
+from app.services.rag_service import rag_service
+from bench_mock_session import FakeEmbeddings, FakeLLM
+from check_storage import report
+
+API = "/api/v1"
+TEXT = "\n\n".join(f"Section {i}. Accessible documents need captions, alt text and structure." * 8 for i in range(12))
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    calls = 0
+
+    async def aembed_query(self, text: str) -> list:
+        CountingEmbeddings.calls += 1
+        return await super().aembed_query(text)
+
+
+async def login(client: httpx.AsyncClient, email: str) -> dict:
+    password = "SecurePassword123!"
+    await client.post(f"{API}/auth/register", json={
+        "email": email, "password": password, "confirm_password": password, "full_name": "Dedup"
+    })
+    response = await client.post(f"{API}/auth/login", json={"email": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@contextlib.contextmanager
+def failing_document_insert():
+    """Makes every INSERT INTO documents fail, as a lost connection or constraint violation would."""
+    execute = MockAsyncSession.execute
+
+    async def failing(self, statement, params=None):
+        if str(statement).lstrip().startswith("INSERT INTO documents"):
+            raise RuntimeError("simulated documents INSERT failure")
+        return await execute(self, statement, params)
+
+    MockAsyncSession.execute = failing
+    try:
+        yield
+    finally:
+        MockAsyncSession.execute = execute
+
+
+async def upload(client: httpx.AsyncClient, headers: dict, name: str = "policy.txt") -> str:
+    response = await client.post(f"{API}/documents/", headers=headers,
+                                 files={"file": (name, TEXT.encode(), "text/plain")})
+    return response.json()["id"]
+
+
+async def db_state(doc_ids: list) -> tuple:
+    async with MockAsyncSession() as db:
+        blobs = (await db.execute(select(Blob))).scalars().all()
+        chunks = [
+            len((await db.execute(select(AccessDocumentChunk.id).where(AccessDocumentChunk.document_id == d))).all())
+            for d in doc_ids
+        ]
+        docs = [(await db.execute(select(Document).where(Document.id == d))).scalars().first() for d in doc_ids]
+    return blobs, chunks, docs
+
+
+def stored_files() -> list:
+    return [name for name in os.listdir(STORAGE_DIR) if not name.endswith(".part")]
+
+
+async def main() -> bool:
+    rag_service.embeddings = CountingEmbeddings()
+    rag_service.llm = FakeLLM()
+    ok = True
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check") as client:
+        alice, bob = await login(client, "alice@access.ai"), await login(client, "bob@access.ai")
+
+        first = await upload(client, alice)
+        embedded = CountingEmbeddings.calls
+        uploads = metrics.get_counter("storage.uploads")
+        second = await upload(client, bob, name="copy-of-policy.txt")
+        blobs, chunks, docs = await db_state([first, second])
+        ok &= report(f"first upload embedded {chunks[0]} chunks", embedded == chunks[0] > 1 and docs[0].status == "ready")
+        ok &= report("duplicate upload: nothing stored, no embedding calls",
+                     CountingEmbeddings.calls == embedded and metrics.get_counter("storage.uploads") == uploads
+                     and len(stored_files()) == 1)
+        ok &= report("duplicate is ready with its own copy of text and chunks",
+                     docs[1].status == "ready" and chunks[1] == chunks[0] and docs[1].content_text == docs[0].content_text
+                     and docs[1].file_path == docs[0].file_path)
+        ok &= report("one blob, ref_count 2", len(blobs) == 1 and blobs[0].ref_count == 2
+                     and str(blobs[0].ingested_document_id) == first)
+
+        results = (await client.post(f"{API}/documents/search", headers=bob, json={"query": "captions"})).json()
+        ok &= report("duplicate's chunks are searchable by its owner", bool(results) and all(r["document_id"] == second for r in results))
+
+        response = await client.delete(f"{API}/documents/{first}", headers=bob)
+        ok &= report("deleting another user's document -> 404", response.status_code == 404)
+
+        response = await client.delete(f"{API}/documents/{first}", headers=alice)
+        blobs, chunks, docs = await db_state([first, second])
+        ok &= report("delete: ref_count 1, chunks gone, file kept, duplicate now holds the chunk set",
+                     response.status_code == 200 and docs[0] is None and chunks[0] == 0 and blobs[0].ref_count == 1
+                     and str(blobs[0].ingested_document_id) == second and len(stored_files()) == 1)
+
+        embedded = CountingEmbeddings.calls  # The search embedded its query
+        third = await upload(client, alice)
+        blobs, chunks, docs = await db_state([second, third])
+        ok &= report("re-upload copies from the remaining duplicate",
+                     CountingEmbeddings.calls == embedded and chunks[1] == chunks[0] and blobs[0].ref_count == 2)
+
+        await client.delete(f"{API}/documents/{second}", headers=bob)
+        await client.delete(f"{API}/documents/{third}", headers=alice)
+        blobs, _, _ = await db_state([])
+        ok &= report("last reference deleted: blob row and stored file collected",
+                     blobs == [] and stored_files() == [] and metrics.get_counter("blobs.collected") == 1)
+
+        with failing_document_insert(), contextlib.suppress(RuntimeError):
+            await upload(client, alice)
+        blobs, _, _ = await db_state([])
+        ok &= report("documents INSERT fails on new content: blob and stored file collected",
+                     blobs == [] and stored_files() == [])
+
+        await upload(client, alice)
+        with failing_document_insert(), contextlib.suppress(RuntimeError):
+            await upload(client, bob)
+        blobs, _, _ = await db_state([])
+        ok &= report("documents INSERT fails on a duplicate: its reference is given back",
+                     len(blobs) == 1 and blobs[0].ref_count == 1 and len(stored_files()) == 1)
+
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
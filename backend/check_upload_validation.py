@@ -0,0 +1,140 @@
+"""
+Check: upload validation before storage (app/services/upload_validation.py).
+
+Drives POST /documents/ and the resumable upload API in-process on the
+in-memory database (USE_MOCK_DB), with local storage in a temp dir:
+
+- renamed files (PNG as .pdf, binary or Latin-1 as .txt) -> 415
+- truncated PDF (no trailer) / user-password PDF / unreadable PDF -> 422
+- more than DOCUMENT_MAX_PAGES pages or DOCUMENT_MAX_BYTES bytes -> 413
+- valid PDFs (also owner-password-only ones) and UTF-8 text pass
+- rejected uploads leave nothing in storage and no documents row
+- resumable uploads are rejected (and discarded) on the first chunk with a bad
+  header or the chunk holding a bad trailer, before the rest is sent
+
+Usage:
+    python check_upload_validation.py
+"""
+import asyncio
+import hashlib
+import io
+import os
+import sys
+import tempfile
+
+STORAGE_DIR = tempfile.mkdtemp()
+os.environ["USE_MOCK_DB"] = "true"
+os.environ["STORAGE_BACKEND"] = "local"
+os.environ["STORAGE_LOCAL_DIR"] = STORAGE_DIR
+os.environ["UPLOAD_SESSION_DIR"] = tempfile.mkdtemp()
+os.environ["UPLOAD_SESSION_CHUNK_SIZE"] = str(64 * 1024)
+os.environ["DOCUMENT_MAX_PAGES"] = "5"
+os.environ["DOCUMENT_MAX_BYTES"] = str(1024 * 1024)
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import httpx
+from pypdf import PdfWriter
+
+from app.main import app
+from app.core.config import settings
+from app.services.rag_service import rag_service
+from bench_mock_session import FakeEmbeddings, FakeLLM
+from check_resumable_upload import put
+from check_storage import report
+from check_upload_dedup import login
+
+API = "/api/v1"
+
+
+def pdf(pages: int = 1, user_password: str | None = None, owner_password: str | None = None) -> bytes:
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=612, height=792)
+    if user_password is not None:
+        writer.encrypt(user_password=user_password, owner_password=owner_password, algorithm="AES-128")
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+async def main() -> bool:
+    rag_service.embeddings = FakeEmbeddings()
+    rag_service.llm = FakeLLM()
+    ok = True
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://check") as client:
+        headers = await login(client, "alice@access.ai")
+
+        async def upload(name: str, data: bytes) -> int:
+            response = await client.post(f"{API}/documents/", headers=headers, files={"file": (name, data, "application/pdf")})
+            return response.status_code
+
+        png = b"\x89PNG\r\n\x1a\n" + os.urandom(2000)
+        padded = pdf() + b" " * (2 * settings.DOCUMENT_MAX_BYTES)
+        rejected = [
+            ("PNG renamed to .pdf", "photo.pdf", png, 415),
+            ("binary renamed to .txt", "blob.txt", os.urandom(4000), 415),
+            ("Latin-1 text", "notes.txt", "Café, crème brûlée, señor".encode("latin-1") * 50, 415),
+            ("truncated PDF (no trailer)", "cut.pdf", pdf(3)[:-200], 422),
+            ("PDF with a user password", "locked.pdf", pdf(user_password="secret", owner_password="owner"), 422),
+            ("header but unreadable body", "junk.pdf", b"%PDF-1.7\n" + os.urandom(3000) + b"\nstartxref\n0\n%%EOF\n", 422),
+            (f"{settings.DOCUMENT_MAX_PAGES + 1} pages", "long.pdf", pdf(settings.DOCUMENT_MAX_PAGES + 1), 413),
+            ("over DOCUMENT_MAX_BYTES", "big.pdf", padded, 413),
+        ]
+        for label, name, data, expected in rejected:
+            status = await upload(name, data)
+            ok &= report(f"{label} -> {status}", status == expected)
+        ok &= report("nothing stored for rejected uploads", os.listdir(STORAGE_DIR) == [])
+        ok &= report("no documents rows for rejected uploads",
+                     (await client.get(f"{API}/documents/", headers=headers)).json() == [])
+
+        accepted = [
+            ("valid PDF", "ok.pdf", pdf(settings.DOCUMENT_MAX_PAGES)),
+            ("owner-password-only PDF (opens without a password)", "restricted.pdf", pdf(2, user_password="", owner_password="o")),
+            ("UTF-8 text", "notes.txt", "Café, crème brûlée, señor. ".encode() * 50),
+        ]
+        for label, name, data in accepted:
+            ok &= report(f"{label} accepted", await upload(name, data) == 200)
+
+        # Resumable: a bad header is caught on chunk 0, before the rest is sent
+        data = png + os.urandom(200 * 1024)
+        created = (await client.post(f"{API}/uploads/", headers=headers, json={
+            "filename": "scan.pdf", "size": len(data), "target": "document"
+        })).json()
+        response = await put(client, headers, created["id"], 0, data)
+        gone = (await client.get(f"{API}/uploads/{created['id']}", headers=headers)).status_code == 404
+        ok &= report("resumable: non-PDF first chunk -> 415, upload discarded", response.status_code == 415 and gone)
+
+        # ... and a bad trailer as soon as the chunks holding the last 1 KB are in
+        good = pdf(2)
+        data = good[:-100] + b"\0" * (200 * 1024)  # Same size as a damaged download of a large PDF would be
+        created = (await client.post(f"{API}/uploads/", headers=headers, json={
+            "filename": "report.pdf", "size": len(data), "target": "document"
+        })).json()
+        last = created["chunk_count"] - 1
+        response = await put(client, headers, created["id"], last, data)
+        ok &= report("resumable: last chunk without a PDF trailer -> 422", response.status_code == 422)
+
+        response = await client.post(f"{API}/uploads/", headers=headers, json={
+            "filename": "huge.pdf", "size": settings.DOCUMENT_MAX_BYTES + 1, "target": "document"
+        })
+        ok &= report("resumable: document over DOCUMENT_MAX_BYTES refused at creation (413)", response.status_code == 413)
+
+        data = good
+        created = (await client.post(f"{API}/uploads/", headers=headers, json={
+            "filename": "good.pdf", "size": len(data), "target": "document"
+        })).json()
+        for index in range(created["chunk_count"]):
+            await put(client, headers, created["id"], index, data)
+        response = await client.post(f"{API}/uploads/{created['id']}/complete", headers=headers,
+                                     json={"sha256": hashlib.sha256(data).hexdigest()})
+        ok &= report("resumable: valid PDF completes", response.status_code == 200)
+
+    return ok
+
+
+if __name__ == "__main__":
+    sys.exit(0 if asyncio.run(main()) else 1)
@@ -1,35 +1,25 @@
 """
 Database initialization script.
-Enables pgvector extension and creates all tables.
+Brings the schema to the latest version by applying pending migrations
+(migrations/versions, recorded in schema_migrations). Same as `python migrate.py upgrade`.
 """
-from sqlalchemy import create_engine, text
-from app.core.config import settings
-from app.db.base import Base
-from app.models import models  # Import models to register them with Base
+from app.db.migrator import MigrationRunner
 import sys
 
 def init_database():
-    """Initialize the database with pgvector extension and create all tables."""
+    """Initialize the database: pgvector extension, tables and indexes."""
     try:
         print("🔄 Connecting to database...")
-        engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
-        
-        # Enable pgvector extension
-        print("🔄 Enabling pgvector extension...")
-        with engine.connect() as connection:
-            # Must commit immediately for extension
-            connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
-            connection.commit()
-            print("✅ pgvector extension enabled successfully")
-        
-        # Create all tables
-        print("🔄 Creating database tables...")
-        Base.metadata.create_all(bind=engine)
-        print("✅ All tables created successfully")
-        
+        runner = MigrationRunner()
+
+        print("🔄 Applying migrations...")
+        applied = runner.upgrade()
+        print(f"✅ {len(applied)} migration(s) applied")
+        runner.engine.dispose()
+
         print("\n✨ Database initialization complete!")
         return True
-        
+
     except Exception as e:
         print(f"\n❌ Database initialization failed: {str(e)}")
         import traceback
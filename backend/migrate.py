@@ -0,0 +1,86 @@
+"""
+Schema migration CLI.
+
+Usage:
+    python migrate.py status
+    python migrate.py upgrade [VERSION]      # default: latest
+    python migrate.py downgrade VERSION      # revert everything newer than VERSION (0 = all)
+    python migrate.py new NAME               # create migrations/versions/NNNN_name.py
+
+See app/db/migrator.py and migrations/versions/ for how migrations are written.
+"""
+import argparse
+import os
+import re
+import sys
+
+# Add current directory to path so 'app' can be imported
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.db.migrator import MigrationRunner, MIGRATIONS_DIR
+
+TEMPLATE = '''"""
+{description}
+"""
+
+# Set to False for CREATE INDEX CONCURRENTLY / op.backfill (statements commit as they run)
+transactional = True
+
+
+def upgrade(op):
+    pass
+
+
+def downgrade(op):
+    pass
+'''
+
+
+def new_migration(name: str) -> str:
+    slug = re.sub(r"\W+", "_", name.strip().lower()).strip("_")
+    versions = [int(p.name[:4]) for p in MIGRATIONS_DIR.glob("[0-9]*.py")]
+    path = MIGRATIONS_DIR / f"{max(versions, default=0) + 1:04d}_{slug}.py"
+    path.write_text(TEMPLATE.format(description=name.strip()))
+    return str(path)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Versioned schema migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status")
+    up = sub.add_parser("upgrade")
+    up.add_argument("version", type=int, nargs="?")
+    down = sub.add_parser("downgrade")
+    down.add_argument("version", type=int)
+    new = sub.add_parser("new")
+    new.add_argument("name")
+    args = parser.parse_args()
+
+    if args.command == "new":
+        print(f"Created {new_migration(args.name)}")
+        return 0
+
+    runner = MigrationRunner()
+    try:
+        if args.command == "status":
+            for row in runner.status():
+                applied_at = row["applied_at"].isoformat(timespec="seconds") if row["applied_at"] else ""
+                print(f"{row['version']:04d}  {row['state']:8s} {row['name']:40s} {applied_at}")
+        elif args.command == "upgrade":
+            done = runner.upgrade(args.version)
+            print(f"✅ {len(done)} migration(s) applied" if done else "✅ Schema is up to date")
+        elif args.command == "downgrade":
+            done = runner.downgrade(args.version)
+            print(f"✅ {len(done)} migration(s) reverted")
+    except Exception as e:
+        print(f"❌ Migration failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+    finally:
+        runner.engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""
+Baseline schema: pgvector, users, documents, document_chunks, form_submissions, transcriptions.
+
+Idempotent, so it also adopts databases created by the old init_db.py /
+migrate_*.py scripts: missing tables are created and the columns those
+scripts added (documents.status/pages/summary, form_submissions.status,
+transcriptions.title/segments/key_concepts/processed/source_url) are added
+where absent.
+"""
+
+
+def upgrade(op):
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id UUID PRIMARY KEY,
+            email VARCHAR NOT NULL,
+            password_hash VARCHAR NOT NULL,
+            full_name VARCHAR NOT NULL,
+            email_verified BOOLEAN,
+            is_active BOOLEAN,
+            disability_type VARCHAR,
+            accessibility_preferences JSONB,
+            biometric_registered BOOLEAN,
+            face_id_registered BOOLEAN,
+            face_id_data TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            updated_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    op.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_users_email ON users (email)")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id UUID PRIMARY KEY,
+            user_id UUID REFERENCES users (id),
+            title VARCHAR NOT NULL,
+            file_path VARCHAR NOT NULL,
+            file_type VARCHAR NOT NULL,
+            content_text TEXT,
+            embedding VECTOR(1536),
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+    """)
+    # Previously migrate_documents.py
+    op.add_column("documents", "status", "VARCHAR DEFAULT 'processing'")
+    op.add_column("documents", "pages", "INTEGER")
+    op.add_column("documents", "summary", "TEXT")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS document_chunks (
+            id UUID PRIMARY KEY,
+            document_id UUID REFERENCES documents (id) ON DELETE CASCADE,
+            chunk_index INTEGER NOT NULL,
+            text_content TEXT NOT NULL,
+            embedding VECTOR(1536),
+            page_number INTEGER
+        )
+    """)
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS form_submissions (
+            id UUID PRIMARY KEY,
+            user_id UUID REFERENCES users (id),
+            form_name VARCHAR NOT NULL,
+            original_file_path VARCHAR,
+            extracted_data JSONB,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+    """)
+    # Previously migrate_forms.py
+    op.add_column("form_submissions", "status", "VARCHAR DEFAULT 'pending'")
+
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS transcriptions (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            user_id UUID REFERENCES users (id),
+            audio_file_path VARCHAR NOT NULL,
+            transcript_text TEXT NOT NULL,
+            summary TEXT,
+            action_items JSONB DEFAULT '[]',
+            sentiment_score FLOAT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+    """)
+    # Previously migrate_transcriptions.py / migrate_source_url.py
+    op.add_column("transcriptions", "title", "VARCHAR")
+    op.add_column("transcriptions", "source_url", "VARCHAR")
+    op.add_column("transcriptions", "segments", "JSONB DEFAULT '[]'")
+    op.add_column("transcriptions", "key_concepts", "JSONB DEFAULT '[]'")
+    op.add_column("transcriptions", "processed", "BOOLEAN DEFAULT FALSE")
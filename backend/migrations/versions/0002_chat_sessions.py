@@ -0,0 +1,23 @@
+"""
+chat_sessions table (document chat memory).
+"""
+
+
+def upgrade(op):
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            user_id UUID NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            document_id UUID NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+            summary TEXT,
+            turns JSONB DEFAULT '[]',
+            turn_count INTEGER DEFAULT 0,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            CONSTRAINT uq_chat_sessions_user_document UNIQUE (user_id, document_id)
+        )
+    """)
+
+
+def downgrade(op):
+    op.execute("DROP TABLE IF EXISTS chat_sessions")
@@ -0,0 +1,33 @@
+"""
+Secondary indexes for hot list / join / lookup queries (see check_query_plans.py).
+
+Built with CREATE INDEX CONCURRENTLY so tables stay writable during the build.
+"""
+
+# CONCURRENTLY cannot run inside a transaction block
+transactional = False
+
+INDEXES = [
+    # Document list: WHERE user_id = ? ORDER BY created_at DESC
+    ("ix_documents_user_id_created_at", "documents (user_id, created_at DESC)"),
+    # Transcription list: WHERE user_id = ? ORDER BY created_at DESC
+    ("ix_transcriptions_user_id_created_at", "transcriptions (user_id, created_at DESC)"),
+    # RAG retrieval / chunk cascade: WHERE document_id = ?
+    ("ix_document_chunks_document_id", "document_chunks (document_id, chunk_index)"),
+    # Form history: WHERE user_id = ? ORDER BY created_at DESC
+    ("ix_form_submissions_user_id_created_at", "form_submissions (user_id, created_at DESC)"),
+    # Biometric 1:N identification: WHERE face_id_data = ?
+    ("ix_users_face_id_data", "users USING hash (face_id_data) WHERE face_id_data IS NOT NULL"),
+    # Biometric fallback: first user WHERE face_id_registered
+    ("ix_users_face_id_registered", "users (id) WHERE face_id_registered = true"),
+]
+
+
+def upgrade(op):
+    for name, definition in INDEXES:
+        op.create_index_concurrently(name, definition)
+
+
+def downgrade(op):
+    for name, _ in reversed(INDEXES):
+        op.drop_index_concurrently(name)
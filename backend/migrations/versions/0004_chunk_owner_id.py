@@ -0,0 +1,26 @@
+"""
+document_chunks.owner_id: denormalised documents.user_id, backfilled in batches.
+
+Lets search filter chunks by tenant without a join, and is the partition key
+used by 0005_partition_document_chunks.
+"""
+
+transactional = False
+
+
+def upgrade(op):
+    op.add_column("document_chunks", "owner_id", "UUID")
+
+    op.backfill(
+        "document_chunks",
+        "owner_id = (SELECT d.user_id FROM documents d WHERE d.id = document_chunks.document_id)",
+        # Chunks of documents without an owner stay NULL; excluding them keeps the loop finite
+        "owner_id IS NULL AND document_id IN (SELECT id FROM documents WHERE user_id IS NOT NULL)",
+    )
+
+    op.create_index_concurrently("ix_document_chunks_owner_id", "document_chunks (owner_id)")
+
+
+def downgrade(op):
+    op.drop_index_concurrently("ix_document_chunks_owner_id")
+    op.execute("ALTER TABLE document_chunks DROP COLUMN IF EXISTS owner_id")
@@ -0,0 +1,147 @@
+"""
+Hash-partition document_chunks by CHUNK_PARTITION_KEY (owner_id or document_id)
+into CHUNK_PARTITIONS partitions, each with its own HNSW index.
+
+Online move: a partitioned copy is created, a trigger mirrors live writes into it,
+existing rows are copied in throttled batches, indexes are built concurrently per
+partition, and the two tables are swapped in one short transaction.
+
+No-op while CHUNK_PARTITIONS = 0. To change the layout later, update the settings and run
+    python migrate.py downgrade 4 && python migrate.py upgrade
+(downgrade moves the rows back into a single table the same way).
+
+Chunks without a document are not carried over; chunks of documents without an
+owner get the nil UUID as owner_id (partition keys cannot be NULL).
+"""
+from app.core.config import settings
+
+transactional = False
+
+NIL_UUID = "00000000-0000-0000-0000-000000000000"
+COLUMNS = ["id", "document_id", "chunk_index", "text_content", "embedding", "page_number", "owner_id"]
+INDEX_NAMES = ["document_chunks_pkey", "ix_document_chunks_document_id", "ix_document_chunks_owner_id"]
+
+
+def _is_partitioned(op) -> bool:
+    return op.execute("SELECT relkind FROM pg_class WHERE relname = 'document_chunks'").scalar() == "p"
+
+
+def _partitions(count: int) -> list:
+    return [f"document_chunks_p{i}" for i in range(count)]
+
+
+def _create_target(op, partitions: int, key: str) -> None:
+    # Leftovers from an interrupted run
+    op.execute("DROP TRIGGER IF EXISTS document_chunks_mirror ON document_chunks")
+    op.execute("DROP FUNCTION IF EXISTS document_chunks_mirror()")
+    op.execute("DROP TABLE IF EXISTS document_chunks_new CASCADE")
+
+    # Free the index names for the new table (a rename does not block reads or writes)
+    for index in INDEX_NAMES:
+        op.execute(f"ALTER INDEX IF EXISTS {index} RENAME TO {index}_old")
+
+    layout = f"CONSTRAINT document_chunks_pkey PRIMARY KEY (id, {key})) PARTITION BY HASH ({key})" \
+        if partitions else "CONSTRAINT document_chunks_pkey PRIMARY KEY (id))"
+    op.execute(f"""
+        CREATE TABLE document_chunks_new (
+            id UUID NOT NULL,
+            document_id UUID NOT NULL,
+            chunk_index INTEGER NOT NULL,
+            text_content TEXT NOT NULL,
+            embedding VECTOR(1536),
+            page_number INTEGER,
+            owner_id UUID {"NOT NULL" if partitions else ""},
+            CONSTRAINT document_chunks_document_id_fkey
+                FOREIGN KEY (document_id) REFERENCES documents (id) ON DELETE CASCADE,
+        {layout}
+    """)
+    for i, name in enumerate(_partitions(partitions)):
+        op.execute(f"""
+            CREATE TABLE {name} PARTITION OF document_chunks_new
+            FOR VALUES WITH (MODULUS {partitions}, REMAINDER {i})
+        """)
+
+
+def _mirror_writes(op) -> None:
+    """Replays every INSERT / UPDATE / DELETE on document_chunks into document_chunks_new."""
+    columns = ", ".join(COLUMNS)
+    values = ", ".join(f"NEW.{c}" for c in COLUMNS[:-1]) + f", COALESCE(NEW.owner_id, '{NIL_UUID}')"
+    op.execute(f"""
+        CREATE FUNCTION document_chunks_mirror() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                DELETE FROM document_chunks_new WHERE id = OLD.id;
+            END IF;
+            IF TG_OP <> 'DELETE' AND NEW.document_id IS NOT NULL THEN
+                INSERT INTO document_chunks_new ({columns}) VALUES ({values}) ON CONFLICT DO NOTHING;
+            END IF;
+            RETURN NULL;
+        END $$
+    """)
+    op.execute("""
+        CREATE TRIGGER document_chunks_mirror AFTER INSERT OR UPDATE OR DELETE ON document_chunks
+        FOR EACH ROW EXECUTE FUNCTION document_chunks_mirror()
+    """)
+
+
+def _build_indexes(op, partitions: int) -> None:
+    if partitions:
+        names = _partitions(partitions)
+        op.create_partitioned_index_concurrently(
+            "ix_document_chunks_document_id", "document_chunks_new", names, "(document_id, chunk_index)"
+        )
+        op.create_partitioned_index_concurrently(
+            "ix_document_chunks_owner_id", "document_chunks_new", names, "(owner_id)"
+        )
+        # ANN index per partition: a tenant's search only walks its own partition's graph
+        for name in names:
+            op.create_index_concurrently(f"{name}_embedding_hnsw", f"{name} USING hnsw (embedding vector_l2_ops)")
+    else:
+        op.create_index_concurrently("ix_document_chunks_document_id", "document_chunks_new (document_id, chunk_index)")
+        op.create_index_concurrently("ix_document_chunks_owner_id", "document_chunks_new (owner_id)")
+
+
+def _swap(op) -> None:
+    with op.atomic():
+        op.execute("LOCK TABLE document_chunks IN ACCESS EXCLUSIVE MODE")
+        op.execute("DROP TRIGGER document_chunks_mirror ON document_chunks")
+        op.execute("DROP FUNCTION document_chunks_mirror()")
+        op.execute("ALTER TABLE document_chunks RENAME TO document_chunks_old")
+        op.execute("ALTER TABLE document_chunks_new RENAME TO document_chunks")
+    # Nothing references the old table any more
+    op.execute("DROP TABLE document_chunks_old")
+
+
+def _move(op, partitions: int, key: str) -> None:
+    _create_target(op, partitions, key)
+    _mirror_writes(op)
+
+    select_list = COLUMNS[:-1] + [f"COALESCE(owner_id, '{NIL_UUID}') AS owner_id"]
+    op.copy_in_batches(
+        "document_chunks", "document_chunks_new", COLUMNS,
+        select_list=select_list, where="document_id IS NOT NULL"
+    )
+
+    _build_indexes(op, partitions)
+    _swap(op)
+    op.execute("ANALYZE document_chunks")
+
+
+def upgrade(op):
+    partitions = settings.CHUNK_PARTITIONS
+    key = settings.CHUNK_PARTITION_KEY
+    if partitions <= 0:
+        print("  CHUNK_PARTITIONS = 0, document_chunks stays a single table")
+        return
+    if key not in ("owner_id", "document_id"):
+        raise ValueError(f"CHUNK_PARTITION_KEY must be owner_id or document_id, not {key!r}")
+    if _is_partitioned(op):
+        print("  document_chunks is already partitioned")
+        return
+    _move(op, partitions, key)
+
+
+def downgrade(op):
+    if not _is_partitioned(op):
+        return
+    _move(op, 0, None)
@@ -0,0 +1,27 @@
+"""
+refresh_tokens table (rotating refresh tokens, see app/services/token_service.py).
+"""
+
+
+def upgrade(op):
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS refresh_tokens (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            user_id UUID NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            token_hash VARCHAR(64) NOT NULL,
+            family_id UUID NOT NULL,
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            revoked_at TIMESTAMP WITH TIME ZONE,
+            replaced_by UUID,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+            CONSTRAINT refresh_tokens_token_hash_key UNIQUE (token_hash)
+        )
+    """)
+    # Family revocation: WHERE family_id = ?
+    op.execute("CREATE INDEX IF NOT EXISTS ix_refresh_tokens_family_id ON refresh_tokens (family_id)")
+    # User delete cascade
+    op.execute("CREATE INDEX IF NOT EXISTS ix_refresh_tokens_user_id ON refresh_tokens (user_id)")
+
+
+def downgrade(op):
+    op.execute("DROP TABLE IF EXISTS refresh_tokens")
@@ -0,0 +1,55 @@
+"""
+users.face_id_digest: SHA-256 hex of the biometric signature, unique.
+
+Biometric 1:N identification looks users up by digest: a fixed-length btree key
+instead of the raw, unbounded face_id_data text (whose hash index from
+0003_hot_query_indexes is dropped here). Existing rows are backfilled in
+batches; digest = security.face_signature_digest(face_id_data).
+
+If several users share a signature only the earliest registered one gets the
+digest (the unique index could not be built otherwise); the others are listed
+and must re-register their device.
+"""
+
+transactional = False
+
+DIGEST = "encode(sha256(convert_to(face_id_data, 'UTF8')), 'hex')"
+
+
+def upgrade(op):
+    op.add_column("users", "face_id_digest", "VARCHAR(64)")
+
+    duplicates = op.execute(f"""
+        SELECT u.id, u.email FROM users u
+        WHERE u.face_id_data IS NOT NULL AND EXISTS (
+            SELECT 1 FROM users older
+            WHERE older.face_id_data = u.face_id_data
+              AND (older.created_at, older.id) < (u.created_at, u.id)
+        )
+    """).fetchall()
+    for user_id, email in duplicates:
+        print(f"  users: {email} ({user_id}) shares a face signature with an earlier user, left without a digest")
+
+    op.backfill(
+        "users",
+        f"face_id_digest = {DIGEST}",
+        # Later duplicates stay NULL; excluding them keeps the loop finite
+        """face_id_digest IS NULL AND face_id_data IS NOT NULL AND NOT EXISTS (
+            SELECT 1 FROM users older
+            WHERE older.face_id_data = users.face_id_data
+              AND (older.created_at, older.id) < (users.created_at, users.id)
+        )""",
+    )
+
+    op.create_index_concurrently(
+        "ix_users_face_id_digest",
+        "users (face_id_digest) WHERE face_id_digest IS NOT NULL",
+        unique=True,
+    )
+    op.drop_index_concurrently("ix_users_face_id_data")
+
+
+def downgrade(op):
+    op.create_index_concurrently("ix_users_face_id_data", "users USING hash (face_id_data) WHERE face_id_data IS NOT NULL")
+    op.drop_index_concurrently("ix_users_face_id_digest")
+    op.execute("ALTER TABLE users DROP COLUMN IF EXISTS face_id_digest")
@@ -0,0 +1,34 @@
+"""
+blobs table + documents.blob_sha256: content-addressed upload deduplication
+(see app/services/blob_service.py).
+
+Existing documents keep blob_sha256 NULL - their files were never hashed - and
+are stored / deleted per document as before.
+"""
+
+# CONCURRENTLY cannot run inside a transaction block
+transactional = False
+
+
+def upgrade(op):
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 VARCHAR(64) PRIMARY KEY,
+            file_path VARCHAR NOT NULL,
+            file_type VARCHAR NOT NULL,
+            size BIGINT NOT NULL,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            ingested_document_id UUID,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+    """)
+    # New column, all NULL: nothing for the foreign key to reject
+    op.add_column("documents", "blob_sha256", "VARCHAR(64) REFERENCES blobs (sha256)")
+    # Blob reference lookups: WHERE blob_sha256 = ?
+    op.create_index_concurrently("ix_documents_blob_sha256", "documents (blob_sha256)")
+
+
+def downgrade(op):
+    op.drop_index_concurrently("ix_documents_blob_sha256")
+    op.execute("ALTER TABLE documents DROP COLUMN IF EXISTS blob_sha256")
+    op.execute("DROP TABLE IF EXISTS blobs")
@@ -0,0 +1,29 @@
+"""
+upload_batches table + documents.batch_id: batch uploads with aggregate progress
+(POST /documents/batch, GET /documents/batches/{id}).
+"""
+
+# CONCURRENTLY cannot run inside a transaction block
+transactional = False
+
+
+def upgrade(op):
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS upload_batches (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            user_id UUID NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+            total INTEGER NOT NULL,
+            rejected JSONB DEFAULT '[]',
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        )
+    """)
+    # New column, all NULL: nothing for the foreign key to reject
+    op.add_column("documents", "batch_id", "UUID REFERENCES upload_batches (id)")
+    # Batch progress: WHERE batch_id = ?
+    op.create_index_concurrently("ix_documents_batch_id", "documents (batch_id)")
+
+
+def downgrade(op):
+    op.drop_index_concurrently("ix_documents_batch_id")
+    op.execute("ALTER TABLE documents DROP COLUMN IF EXISTS batch_id")
+    op.execute("DROP TABLE IF EXISTS upload_batches")
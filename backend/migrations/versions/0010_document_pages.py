@@ -0,0 +1,23 @@
+"""
+document_pages table: extracted text stored per page, read by page range
+(GET /documents/{id}/pages). New documents no longer fill documents.content_text.
+
+Existing documents are left as they are: their text was stored joined, without
+page boundaries, so it is served as a single page from content_text.
+"""
+
+
+def upgrade(op):
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS document_pages (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            document_id UUID NOT NULL REFERENCES documents (id) ON DELETE CASCADE,
+            page_number INTEGER NOT NULL,
+            text_content TEXT NOT NULL,
+            CONSTRAINT uq_document_pages_document_page UNIQUE (document_id, page_number)
+        )
+    """)
+
+
+def downgrade(op):
+    op.execute("DROP TABLE IF EXISTS document_pages")
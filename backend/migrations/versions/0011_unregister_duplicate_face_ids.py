@@ -0,0 +1,24 @@
+"""
+Clear face_id_registered for users that 0007_face_id_digest left without a digest.
+
+Their signature duplicated an earlier user's, so they have no face_id_digest and
+biometric login has nothing to verify them against (it answers 401). Clearing
+the flag makes the account state say so; they register their device again.
+Users registered since 0007 never have face_id_data, so the condition below
+only matches those duplicates.
+"""
+
+
+def upgrade(op):
+    result = op.execute("""
+        UPDATE users SET face_id_registered = false
+        WHERE face_id_registered AND face_id_digest IS NULL AND face_id_data IS NOT NULL
+        RETURNING id, email
+    """)
+    for user_id, email in result.fetchall():
+        print(f"  users: {email} ({user_id}) has no face signature digest, must re-register their device")
+
+
+def downgrade(op):
+    # Which users had the flag is not recorded; re-registering sets it again
+    pass
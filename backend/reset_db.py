@@ -1,22 +1,27 @@
 from app.db.session import engine
+from app.db.migrator import MigrationRunner
 from app.models.models import Base
 from sqlalchemy import text
 
 def reset_db():
     print("WARNING: This will DROP ALL TABLES in the public schema.")
     print("Connecting...")
-    
+
     try:
-        # 1. Drop all tables
+        # 1. Drop all tables (and the migration history with them)
         print("Dropping all tables...")
         Base.metadata.drop_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE IF EXISTS schema_migrations"))
         print("Tables dropped.")
-        
-        # 2. Create all tables
+
+        # 2. Re-create the schema from the migrations
         print("Re-creating tables...")
-        Base.metadata.create_all(bind=engine)
+        runner = MigrationRunner()
+        runner.upgrade()
+        runner.engine.dispose()
         print("Tables created successfully!")
-        
+
         # 3. Verify
         with engine.connect() as conn:
             result = conn.execute(text("SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'"))
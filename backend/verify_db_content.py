@@ -18,7 +18,7 @@ def verify_content():
             print(f"- User: {u.email} (ID: {u.id})")
             print(f"  Biometric: {u.biometric_registered}")
             print(f"  Face ID Reg: {u.face_id_registered}")
-            print(f"  Face Token: {u.face_id_data[:20] if u.face_id_data else 'None'}...")
+            print(f"  Face Digest: {u.face_id_digest[:20] if u.face_id_digest else 'None'}...")
         
         # Check Documents (If any)
         docs = db.query(models.Document).all()
@@ -42,6 +42,8 @@ interface SmartReaderProps {
     initialPage?: number;
 }
 
+const PAGE_WINDOW = 10;
+
 interface ChatMessage {
     role: 'user' | 'assistant';
     text: string;
@@ -51,16 +53,8 @@ export function SmartReader({ doc, isOpen, onClose, initialPage = 1 }: SmartRead
     // --- Local Document State ---
     const [fullDoc, setFullDoc] = useState<APIDocument>(doc);
 
-    // Refetch full content on open if needed
     useEffect(() => {
-        if (isOpen && doc.id) {
-            // logic to ensure we have content_text
-            if (!doc.content_text) {
-                endpoints.getDocument(doc.id).then(d => setFullDoc(d || doc)).catch(e => console.error(e));
-            } else {
-                setFullDoc(doc);
-            }
-        }
+        if (isOpen) setFullDoc(doc);
     }, [isOpen, doc]);
 
     // --- Visual Settings ---
@@ -73,35 +67,33 @@ export function SmartReader({ doc, isOpen, onClose, initialPage = 1 }: SmartRead
     const [isSimplified, setIsSimplified] = useState(false);
 
     // --- Pagination ---
+    // Page text is loaded on demand, a few pages around the current one at a time
     const [numPages, setNumPages] = useState<number | null>(null);
     const [pageNumber, setPageNumber] = useState<number>(initialPage);
-    const [virtualPages, setVirtualPages] = useState<string[]>([]);
-
-    // Heuristic Pagination Logic
-    const paginateContent = (text: string) => {
-        if (!text) return [];
-        const charsPerPage = 3000;
-        const pages: string[] = [];
-        let remaining = text;
-        while (remaining.length > 0) {
-            if (remaining.length <= charsPerPage) { pages.push(remaining); break; }
-            let splitIndex = remaining.lastIndexOf('\n\n', charsPerPage);
-            if (splitIndex === -1) splitIndex = remaining.lastIndexOf('\n', charsPerPage);
-            if (splitIndex === -1) splitIndex = remaining.lastIndexOf('.', charsPerPage);
-            if (splitIndex === -1) splitIndex = charsPerPage;
-            pages.push(remaining.slice(0, splitIndex + 1));
-            remaining = remaining.slice(splitIndex + 1);
-        }
-        return pages;
-    };
+    const [loadedPages, setLoadedPages] = useState<Record<number, string>>({});
+    const currentPage = loadedPages[pageNumber];
 
     useEffect(() => {
-        if (fullDoc.content_text) {
-            const pages = paginateContent(fullDoc.content_text);
-            setVirtualPages(pages);
-            setNumPages(pages.length);
-        }
-    }, [fullDoc.content_text]);
+        setLoadedPages({});
+        setNumPages(null);
+    }, [doc.id]);
+
+    useEffect(() => {
+        if (!isOpen || !doc.id || currentPage !== undefined) return;
+        if (numPages !== null && pageNumber > numPages) return;
+        const from = Math.max(1, pageNumber - 1);
+        endpoints.getDocumentPages(doc.id, from, from + PAGE_WINDOW - 1)
+            .then(res => {
+                setNumPages(res.page_count);
+                if (res.pages.length) {
+                    setLoadedPages(prev => ({
+                        ...prev,
+                        ...Object.fromEntries(res.pages.map(p => [p.page_number, p.text]))
+                    }));
+                }
+            })
+            .catch(e => console.error(e));
+    }, [isOpen, doc.id, pageNumber, currentPage, numPages]);
 
     // Sync page number if initialPage changes
     useEffect(() => {
@@ -113,9 +105,9 @@ export function SmartReader({ doc, isOpen, onClose, initialPage = 1 }: SmartRead
     const [isSimplifying, setIsSimplifying] = useState(false);
 
     useEffect(() => {
-        if (isSimplified && fullDoc.id && !simplifiedCache[fullDoc.id]) {
+        if (isSimplified && fullDoc.id && !simplifiedCache[fullDoc.id] && currentPage !== undefined) {
             setIsSimplifying(true);
-            const textToSimplify = virtualPages[pageNumber - 1] || fullDoc.content_text || "";
+            const textToSimplify = currentPage;
 
             endpoints.simplify(textToSimplify)
                 .then(data => {
@@ -124,7 +116,7 @@ export function SmartReader({ doc, isOpen, onClose, initialPage = 1 }: SmartRead
                 .catch(err => toast.error("Simplification failed"))
                 .finally(() => setIsSimplifying(false));
         }
-    }, [isSimplified, fullDoc.id, pageNumber, virtualPages]);
+    }, [isSimplified, fullDoc.id, pageNumber, currentPage]);
 
     // --- TTS ---
     const { speak, cancel: cancelSpeech, isSpeaking: isTtsSpeaking } = useTextToSpeech();
@@ -134,7 +126,7 @@ export function SmartReader({ doc, isOpen, onClose, initialPage = 1 }: SmartRead
         } else {
             const currentSimplified = fullDoc ? simplifiedCache[fullDoc.id] : '';
             const textToRead = isSimplified ? (currentSimplified || "Simplifying...") : (
-                virtualPages[pageNumber - 1] || fullDoc?.content_text || "No content."
+                currentPage || "No content."
             );
             const cleanText = textToRead.replace(/[*•#]/g, '').trim();
             speak(cleanText);
@@ -393,8 +385,8 @@ export function SmartReader({ doc, isOpen, onClose, initialPage = 1 }: SmartRead
                                         </>
                                     ) : (
                                         <div className="whitespace-pre-line">
-                                            {virtualPages[pageNumber - 1] ?
-                                                virtualPages[pageNumber - 1].replace(/([^\n])\n([^\n])/g, '$1 $2').replace(/\n\n/g, '\n\n').replace(/^• /gm, '• ')
+                                            {currentPage ?
+                                                currentPage.replace(/([^\n])\n([^\n])/g, '$1 $2').replace(/\n\n/g, '\n\n').replace(/^• /gm, '• ')
                                                 : <span className="text-muted-foreground italic">End of document.</span>}
                                         </div>
                                     )}
@@ -408,7 +400,7 @@ export function SmartReader({ doc, isOpen, onClose, initialPage = 1 }: SmartRead
                             </div>
 
                             {/* Floating Pagination */}
-                            {!isSimplified && !fullDoc.content_text && (
+                            {!isSimplified && currentPage === undefined && (numPages === null || pageNumber <= numPages) && (
                                 <div className="absolute inset-0 flex items-center justify-center bg-white/50 backdrop-blur-sm z-10">
                                     <AccessLoader size="lg" text="Loading document content..." />
                                 </div>
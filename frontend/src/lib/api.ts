@@ -27,7 +27,15 @@ export interface Document {
     pages?: number;
     summary?: string;
     file_path?: string;  // Changed from 'url' to match backend
-    content_text?: string;
+    content_text?: string;  // Only with getDocument(id, true)
+}
+
+export interface DocumentPages {
+    document_id: string;
+    page_count: number;  // 0 while the document is processing
+    from: number;
+    to: number | null;  // Last page returned
+    pages: { page_number: number; text: string }[];
 }
 
 export interface SearchResult {
@@ -56,8 +64,14 @@ export const endpoints = {
         return response.data;
     },
 
-    getDocument: async (id: string) => {
-        const response = await api.get<Document>(`/documents/${id}`);
+    getDocument: async (id: string, includeText: boolean = false) => {
+        const response = await api.get<Document>(`/documents/${id}`, { params: includeText ? { include_text: true } : {} });
+        return response.data;
+    },
+
+    // Page text, a range at a time (the server caps how many pages one call returns)
+    getDocumentPages: async (id: string, from: number, to: number) => {
+        const response = await api.get<DocumentPages>(`/documents/${id}/pages`, { params: { from, to } });
         return response.data;
     },
 